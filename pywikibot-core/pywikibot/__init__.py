@@ -14,14 +14,10 @@ import datetime
 import math
 import re
 import sys
-import threading
 import json
 
 if sys.version_info[0] > 2:
-    from queue import Queue
     long = int
-else:
-    from Queue import Queue
 
 from warnings import warn
 
@@ -31,7 +27,7 @@ from warnings import warn
 
 from pywikibot import config2 as config
 from pywikibot.bot import (
-    output, warning, error, critical, debug, stdout, exception,
+    output, warning, error, critical, debug, debug_enabled, stdout, exception,
     input, input_choice, input_yn, inputChoice, handle_args, showHelp, ui, log,
     calledModuleName, Bot, CurrentPageBot, WikidataBot, QuitKeyboardInterrupt,
     # the following are flagged as deprecated on usage
@@ -53,6 +49,7 @@ from pywikibot.tools import UnicodeMixin, redirect_func
 from pywikibot.i18n import translate
 from pywikibot.data.api import UploadWarning
 from pywikibot.diff import PatchManager
+from pywikibot.savequeue import SaveExecutor, _PutQueue
 import pywikibot.textlib as textlib
 import pywikibot.tools
 
@@ -72,6 +69,7 @@ __all__ = ('config', 'ui', 'UnicodeMixin', 'translate',
            'ItemPage', 'PropertyPage', 'Claim', 'TimeStripper',
            'html2unicode', 'url2unicode', 'unicode2html',
            'stdout', 'output', 'warning', 'error', 'critical', 'debug',
+           'debug_enabled',
            'exception', 'input_choice', 'input', 'input_yn', 'inputChoice',
            'handle_args', 'handleArgs', 'showHelp', 'ui', 'log',
            'calledModuleName', 'Bot', 'CurrentPageBot', 'WikidataBot',
@@ -669,17 +667,13 @@ def stopme():
         debug(u"stopme() called", _logger)
 
         def remaining():
-            remainingPages = page_put_queue.qsize() - 1
-            # -1 because we added a None element to stop the queue
-
             remainingSeconds = datetime.timedelta(
-                seconds=(remainingPages * config.put_throttle))
-            return (remainingPages, remainingSeconds)
+                seconds=round(_save_executor.eta()))
+            return (_save_executor.pending(), remainingSeconds)
 
-        page_put_queue.put((None, [], {}))
         stopped = True
 
-        if page_put_queue.qsize() > 1:
+        if _save_executor.pending():
             num, sec = remaining()
             format_values = dict(num=num, sec=sec)
             output(u'\03{lightblue}'
@@ -687,9 +681,11 @@ def stopme():
                    u'Estimated time remaining: %(sec)s'
                    u'\03{default}' % format_values)
 
-        while(_putthread.isAlive()):
+        _save_executor.shutdown()
+        while True:
             try:
-                _putthread.join(1)
+                if _save_executor.join(1):
+                    break
             except KeyboardInterrupt:
                 if input_yn('There are %i pages remaining in the queue. '
                             'Estimated time remaining: %s\nReally exit?'
@@ -707,39 +703,26 @@ import atexit
 atexit.register(stopme)
 
 
-# Create a separate thread for asynchronous page saves (and other requests)
-def async_manager():
-    """Daemon; take requests from the queue and execute them in background."""
-    while True:
-        (request, args, kwargs) = page_put_queue.get()
-        if request is None:
-            break
-        request(*args, **kwargs)
+def async_request(request, *args, **kwargs):
+    """
+    Execute a request in the background thread of its site.
 
+    The requests to a site are executed in the order they were put, waiting
+    while config.max_queue_size requests to the site are queued.
 
-def async_request(request, *args, **kwargs):
-    """Put a request on the queue, and start the daemon if necessary."""
-    if not _putthread.isAlive():
-        try:
-            page_put_queue.mutex.acquire()
-            try:
-                _putthread.start()
-            except (AssertionError, RuntimeError):
-                pass
-        finally:
-            page_put_queue.mutex.release()
-    page_put_queue.put((request, args, kwargs))
-
-# queue to hold pending requests
-page_put_queue = Queue(config.max_queue_size)
-# set up the background thread
-_putthread = threading.Thread(target=async_manager)
-# identification for debugging purposes
-_putthread.setName('Put-Thread')
-_putthread.setDaemon(True)
+    @return: the future of the result of the request
+    @rtype: L{pywikibot.savequeue.SaveFuture}
+    """
+    return _save_executor.submit(request, *args, **kwargs)
+
+# executes the requests of async_request, one thread per site
+_save_executor = SaveExecutor()
 
 wrapper = pywikibot.tools.ModuleDeprecationWrapper(__name__)
 wrapper._add_deprecated_attr('ImagePage', FilePage)
+wrapper._add_deprecated_attr(
+    'page_put_queue', _PutQueue(_save_executor),
+    replacement_name='pywikibot.async_request')
 wrapper._add_deprecated_attr(
     'PageNotFound', pywikibot.exceptions.DeprecatedPageNotFoundError,
     warning_message=('{0}.{1} is deprecated, and no longer '
@@ -23,6 +23,7 @@ import logging.handlers
 import os
 import re
 import sys
+import threading
 import time
 import warnings
 import webbrowser
@@ -39,8 +40,9 @@ import pywikibot
 
 from pywikibot import backports
 from pywikibot import config
+from pywikibot import metrics
 from pywikibot import version
-from pywikibot.tools import deprecated
+from pywikibot.tools import deprecated, prefetch_map
 
 if sys.version_info[0] > 2:
     unicode = str
@@ -391,22 +393,63 @@ def writelogheader():
 # the user console. debug() takes a required second argument, which is a
 # string indicating the debugging layer.
 
+# All functions accept the keyword argument args, the values which are
+# formatted into the text with the % operator. They are only formatted if
+# the message is logged, so debug messages don't cost much when debugging
+# is disabled. For messages which are expensive to create otherwise, use
+# debug_enabled() to check whether they are logged.
+
+# the logger of each layer
+_loggers = {}
+
+
+def _get_logger(layer):
+    """Return the logger of the layer."""
+    try:
+        return _loggers[layer]
+    except KeyError:
+        logger = _loggers[layer] = logging.getLogger(
+            'pywiki.' + layer if layer else 'pywiki')
+        return logger
+
+
+def debug_enabled(layer):
+    """
+    Return whether debug messages of the layer are logged.
+
+    Use it to skip creating debug messages which are expensive::
+
+        if pywikibot.debug_enabled(_logger):
+            pywikibot.debug(pprint.pformat(data), _logger)
+
+    @param layer: the name of the layer, like the one passed to debug()
+    @rtype: bool
+    """
+    if not _handlers_initialized:
+        init_handlers()
+    return _get_logger(layer).isEnabledFor(DEBUG)
+
+
 def logoutput(text, decoder=None, newline=True, _level=INFO, _logger="",
               **kwargs):
     """Format output and send to the logging module.
 
     Helper function used by all the user-output convenience functions.
 
+    Nothing is formatted if the logger doesn't handle messages of the level.
+
+    @kwarg args: the values formatted into text with the % operator
+    @kwtype args: tuple, dict or object
     """
-    if _logger:
-        logger = logging.getLogger("pywiki." + _logger)
-    else:
-        logger = logging.getLogger("pywiki")
+    logger = _get_logger(_logger)
 
     # make sure logging system has been initialized
     if not _handlers_initialized:
         init_handlers()
 
+    if not logger.isEnabledFor(_level):
+        return
+
     # frame 0 is logoutput() in this module,
     # frame 1 is the convenience function (output(), etc.)
     # frame 2 is whatever called the convenience function
@@ -432,6 +475,9 @@ def logoutput(text, decoder=None, newline=True, _level=INFO, _logger="",
             except UnicodeDecodeError:
                 text = text.decode('iso8859-1')
 
+    if 'args' in kwargs:
+        text = text % kwargs.pop('args')
+
     logger.log(_level, text, extra=context, **kwargs)
 
 
@@ -494,6 +540,8 @@ def debug(text, layer, decoder=None, newline=True, **kwargs):
     """Output a debug record to the log file.
 
     @param layer: The name of the logger that text will be sent to.
+    @kwarg args: the values formatted into text with the % operator, only
+        if debugging of the layer is enabled
     """
     logoutput(text, decoder, newline, DEBUG, layer, **kwargs)
 
@@ -689,6 +737,7 @@ def handle_args(args=None, do_help=True):
         moduleName = "terminal-interface"
     nonGlobalArgs = []
     username = None
+    profile = None
     do_help = None if do_help else False
     for arg in args:
         if do_help is not False and arg == '-help':
@@ -719,6 +768,12 @@ def handle_args(args=None, do_help=True):
                    % config.cosmetic_changes)
         elif arg == '-simulate':
             config.simulate = True
+        elif arg == '-profile':
+            profile = 'cprofile'
+        elif arg.startswith('-profile:'):
+            profile = arg[len('-profile:'):]
+        elif arg.startswith('-metrics:'):
+            config.metrics_file = arg[len('-metrics:'):]
         #
         #  DEBUG control:
         #
@@ -782,6 +837,17 @@ def handle_args(args=None, do_help=True):
     init_handlers()
     writeToCommandLogFile()
 
+    try:
+        metrics.install_signal_handler()
+    except ValueError:
+        # not called in the main thread
+        pass
+    if profile in ('cprofile', 'sample'):
+        metrics.start_profiling(
+            profile, config.datafilepath('logs', '%s.prof' % moduleName))
+    elif profile:
+        warning('Unknown profiling mode %s' % profile)
+
     if config.verbose_output:
         # Please don't change the regular expression here unless you really
         # have to - some git versions (like 1.7.0.4) seem to treat lines
@@ -876,10 +942,19 @@ Global arguments available for all bots:
                   debugging of new code (if given, doesn't do any real
                   changes, but only shows what would have been changed).
 
+-metrics:xyz      Write the statistics of the run to the file xyz as JSON at
+                  exit and when the process receives SIGUSR1.
+
+-profile          Profile the bot with cProfile; the statistics are written
+                  to '%s.prof' in the logs subdirectory.
+
+-profile:sample   Profile all threads of the bot by sampling; the functions
+                  found most often are written to the log and the statistics.
+
 -<config var>:n   You may use all given numeric config variables as option and
                   modify it with command line.
 
-''' % module_name
+''' % (module_name, module_name)
     try:
         module = __import__('%s' % module_name)
         helpText = module.__doc__
@@ -946,6 +1021,15 @@ class Bot(object):
 
     If the subclass does not set a generator, or does not override
     treat() or run(), NotImplementedError is raised.
+
+    The pages are passed to treat_batch() in groups of treat_batch_size
+    pages, which calls treat() for each of them. If treat_workers is more
+    than 1, that many pages are treated at the same time in threads, which
+    is faster when treat() mostly waits for the wiki. The current_page is
+    then kept for each thread and the interaction with the user is done by
+    one thread after the other. When treat() raises an exception in one
+    thread, the other threads quit before they ask the user or save a page
+    and the exception is raised when they are finished.
     """
 
     # Bot configuration.
@@ -956,17 +1040,39 @@ class Bot(object):
         'always': False,  # ask for confirmation when putting a page?
     }
 
+    # The number of pages which are treated at the same time in threads,
+    # if 1 they are treated one after another.
+    treat_workers = 1
+    # The number of pages of the generator passed together to treat_batch()
+    treat_batch_size = 1
+
     _current_page = None
 
     def __init__(self, **kwargs):
         """
         Only accept options defined in availableOptions.
 
+        @kwarg treat_workers: the number of pages treated at the same time,
+            default is the treat_workers attribute of the class
+        @kwtype treat_workers: int
+        @kwarg treat_batch_size: the number of pages passed together to
+            treat_batch(), default is the attribute of the class
+        @kwtype treat_batch_size: int
         @param kwargs: bot options
         @type kwargs: dict
         """
         if 'generator' in kwargs:
             self.generator = kwargs.pop('generator')
+        if 'treat_workers' in kwargs:
+            self.treat_workers = kwargs.pop('treat_workers')
+        if 'treat_batch_size' in kwargs:
+            self.treat_batch_size = kwargs.pop('treat_batch_size')
+
+        # the page of each thread and the lock of output and user input
+        self._local = threading.local()
+        self._interaction_lock = threading.RLock()
+        # set when treat() raised an exception in one of the threads
+        self._treat_stopped = threading.Event()
 
         self.setOptions(**kwargs)
         self._site = None
@@ -1007,8 +1113,8 @@ class Bot(object):
 
     @property
     def current_page(self):
-        """Return the current working page as a property."""
-        return self._current_page
+        """Return the current working page of this thread as a property."""
+        return getattr(self._local, 'page', self._current_page)
 
     @current_page.setter
     def current_page(self, page):
@@ -1018,26 +1124,41 @@ class Bot(object):
         to the standard output (highlighted in purple) and logged
         with a VERBOSE level.
 
-        This also prevents the same title from being printed twice.
+        This also prevents the same title from being printed twice. When
+        pages are treated in threads, the title is printed again when the
+        output is about another page than the one printed last.
 
         @param page: the working page
         @type  page: pywikibot.Page
         """
-        if page != self._current_page:
-            self._current_page = page
-            msg = u'Working on %r' % page.title()
-            if config.colorized_output:
-                log(msg)
-                stdout(u'\n\n>>> \03{lightpurple}%s\03{default} <<<'
-                       % page.title())
-            else:
-                stdout(msg)
+        self._local.page = page
+        with self._interaction_lock:
+            if page != self._current_page:
+                self._current_page = page
+                msg = u'Working on %r' % page.title()
+                if config.colorized_output:
+                    log(msg)
+                    stdout(u'\n\n>>> \03{lightpurple}%s\03{default} <<<'
+                           % page.title())
+                else:
+                    stdout(msg)
+
+    def _check_treat_stopped(self):
+        """Quit if treat() raised an exception in another thread."""
+        if self._treat_stopped.is_set():
+            raise QuitKeyboardInterrupt
 
     def user_confirm(self, question):
         """Obtain user response if bot option 'always' not enabled."""
+        self._check_treat_stopped()
         if self.getOption('always'):
             return True
 
+        with self._interaction_lock:
+            self._check_treat_stopped()
+            return self._user_confirm(question)
+
+    def _user_confirm(self, question):
         choice = pywikibot.input_choice(question,
                                         [('Yes', 'y'),
                                          ('No', 'N'),
@@ -1078,18 +1199,23 @@ class Bot(object):
                              % page.title(asLink=True))
             return
 
-        self.current_page = page
+        with self._interaction_lock:
+            self._check_treat_stopped()
+            self.current_page = page
 
-        show_diff = kwargs.pop('show_diff', True)
+            show_diff = kwargs.pop('show_diff', True)
 
-        if show_diff:
-            pywikibot.showDiff(oldtext, newtext)
+            if show_diff:
+                pywikibot.showDiff(oldtext, newtext)
+
+            if 'comment' in kwargs:
+                pywikibot.output(u'Comment: %s' % kwargs['comment'])
 
-        if 'comment' in kwargs:
-            pywikibot.output(u'Comment: %s' % kwargs['comment'])
+            if not self.user_confirm('Do you want to accept these changes?'):
+                return
 
         page.text = newtext
-        self._save_page(page, page.save, **kwargs)
+        self._save_page(page, page.save, confirmed=True, **kwargs)
 
     def _save_page(self, page, func, *args, **kwargs):
         """
@@ -1105,8 +1231,11 @@ class Bot(object):
         @kwarg ignore_save_related_errors: if True, errors related to
         page save will be reported and ignored (default: False)
         @kwtype ignore_save_related_errors: bool
+        @kwarg confirmed: if True, the user already accepted the changes
+        @kwtype confirmed: bool
         """
-        if not self.user_confirm('Do you want to accept these changes?'):
+        if (not kwargs.pop('confirmed', False) and
+                not self.user_confirm('Do you want to accept these changes?')):
             return
 
         if 'async' not in kwargs and self.getOption('always'):
@@ -1116,6 +1245,7 @@ class Bot(object):
                                                 False)
         ignore_server_errors = kwargs.pop('ignore_server_errors', False)
 
+        self._check_treat_stopped()
         try:
             func(*args, **kwargs)
             self._save_counter += 1
@@ -1151,6 +1281,73 @@ class Bot(object):
         raise NotImplementedError('Method %s.treat() not implemented.'
                                   % self.__class__.__name__)
 
+    def treat_batch(self, pages):
+        """
+        Process a group of pages of the generator, all on the same site.
+
+        Subclasses can override it to retrieve data of all pages at once
+        before calling the method of this class.
+
+        @param pages: the next pages of the generator
+        @type pages: list
+        """
+        self._treat_all(self.treat, pages)
+
+    def _treat_all(self, function, pages):
+        """Call function for each page, in threads if treat_workers > 1."""
+        running = set()
+
+        def timed(page):
+            self._check_treat_stopped()
+            running.add(threading.current_thread())
+            try:
+                with metrics.Timer('bot.treat'):
+                    return function(page)
+            except BaseException:
+                self._treat_stopped.set()
+                raise
+            finally:
+                running.discard(threading.current_thread())
+
+        self._treat_stopped.clear()
+
+        if self.treat_workers > 1:
+            results = prefetch_map(timed, pages, self.treat_workers,
+                                   ordered=False)
+        else:
+            results = (timed(page) for page in pages)
+        try:
+            for result in results:
+                self._treat_counter += 1
+                if (sys.version_info[0] == 2 and
+                        self._treat_counter == sys.maxint):
+                    # Warn the user that the bot may not function correctly
+                    pywikibot.error(
+                        '\n%s: page count reached Python 2 sys.maxint '
+                        '(%d).\nPython 3 should be used to process very '
+                        'large batches' % (self.__class__.__name__,
+                                           sys.maxint))
+        except BaseException:
+            # e.g. a KeyboardInterrupt in this thread: stop the threads
+            # still treating pages before run reports the quit
+            self._treat_stopped.set()
+            for thread in list(running):
+                while thread.isAlive():
+                    thread.join(0.25)
+            raise
+
+    def _batches(self):
+        """Yield lists of treat_batch_size pages of the same site."""
+        size = max(self.treat_batch_size, self.treat_workers)
+        batch = []
+        for page in self.generator:
+            if batch and (len(batch) >= size or page.site != batch[0].site):
+                yield batch
+                batch = []
+            batch.append(page)
+        if batch:
+            yield batch
+
     @property
     def site(self):
         """Site that the bot is using."""
@@ -1205,28 +1402,16 @@ class Bot(object):
             log('Bot is managing the %s.site property in run()'
                 % self.__class__.__name__)
 
-        maxint = 0
-        if sys.version_info[0] == 2:
-            maxint = sys.maxint
-
         try:
-            for page in self.generator:
+            for pages in self._batches():
                 # When in auto update mode, set the site when it changes,
                 # so subclasses can hook onto changes to site.
                 if (auto_update_site and
-                        (not self._site or page.site != self.site)):
-                    self.site = page.site
-
-                # Process the page
-                self.treat(page)
+                        (not self._site or pages[0].site != self.site)):
+                    self.site = pages[0].site
 
-                self._treat_counter += 1
-                if maxint and self._treat_counter == maxint:
-                    # Warn the user that the bot may not function correctly
-                    pywikibot.error(
-                        '\n%s: page count reached Python 2 sys.maxint (%d).\n'
-                        'Python 3 should be used to process very large batches'
-                        % (self.__class__.__name__, sys.maxint))
+                # Process the pages
+                self.treat_batch(pages)
         except QuitKeyboardInterrupt:
             pywikibot.output('\nUser quit %s bot run...' %
                              self.__class__.__name__)
@@ -1287,6 +1472,16 @@ class ExistingPageBot(CurrentPageBot):
 
     """A CurrentPageBot class which only treats existing pages."""
 
+    def treat_batch(self, pages):
+        """Retrieve the pages which weren't loaded together and treat them."""
+        # the pages of PreloadingGenerator are retrieved already
+        missing = [page for page in pages if not hasattr(page, '_revid') and
+                   getattr(page, '_pageid', None) != 0]
+        if len(missing) > 1:
+            for page in missing[0].site.preloadpages(missing):
+                pass
+        super(ExistingPageBot, self).treat_batch(pages)
+
     def treat(self, page):
         """Treat page if it exists and handle NoPage from it."""
         if not page.exists():
@@ -1482,45 +1677,51 @@ class WikidataBot(Bot):
             source.setTarget(self.source_values.get(site.family.name).get(site.code))
             return source
 
+    def treat_batch(self, pages):
+        """Treat each page with its item."""
+        self._treat_all(self._treat_with_item, pages)
+
+    def _treat_with_item(self, page):
+        """Get the item of page and call treat with both if possible."""
+        if not page.exists():
+            pywikibot.output('%s doesn\'t exist.' % page)
+        # FIXME: Hack because 'is_data_repository' doesn't work if
+        #        site is the APISite. See T85483
+        data_site = page.site.data_repository()
+        if (data_site.family == page.site.family and
+                data_site.code == page.site.code):
+            is_item = page.namespace() == data_site.item_namespace.id
+        else:
+            is_item = False
+        if self.use_from_page is not True and is_item:
+            item = pywikibot.ItemPage(data_site, page.title())
+            item.get()
+        elif self.use_from_page is False:
+            pywikibot.error('{0} is not in the item namespace but '
+                            'must be an item.'.format(page))
+            return
+        else:
+            try:
+                item = pywikibot.ItemPage.fromPage(page)
+            except pywikibot.NoPage:
+                item = None
+        if not item:
+            if not hasattr(self, 'treat_missing_item'):
+                pywikibot.output(
+                    '%s doesn\'t have a wikidata item.' % page)
+                # TODO: Add an option to create the item
+                return
+        self.treat(page, item)
+
     def run(self):
         """Process all pages in generator."""
         if not hasattr(self, 'generator'):
             raise NotImplementedError('Variable %s.generator not set.'
                                       % self.__class__.__name__)
 
-        treat_missing_item = hasattr(self, 'treat_missing_item')
-
         try:
-            for page in self.generator:
-                if not page.exists():
-                    pywikibot.output('%s doesn\'t exist.' % page)
-                # FIXME: Hack because 'is_data_repository' doesn't work if
-                #        site is the APISite. See T85483
-                data_site = page.site.data_repository()
-                if (data_site.family == page.site.family and
-                        data_site.code == page.site.code):
-                    is_item = page.namespace() == data_site.item_namespace.id
-                else:
-                    is_item = False
-                if self.use_from_page is not True and is_item:
-                    item = pywikibot.ItemPage(data_site, page.title())
-                    item.get()
-                elif self.use_from_page is False:
-                    pywikibot.error('{0} is not in the item namespace but '
-                                    'must be an item.'.format(page))
-                    continue
-                else:
-                    try:
-                        item = pywikibot.ItemPage.fromPage(page)
-                    except pywikibot.NoPage:
-                        item = None
-                if not item:
-                    if not treat_missing_item:
-                        pywikibot.output(
-                            '%s doesn\'t have a wikidata item.' % page)
-                        # TODO: Add an option to create the item
-                        continue
-                self.treat(page, item)
+            for pages in self._batches():
+                self.treat_batch(pages)
         except QuitKeyboardInterrupt:
             pywikibot.output('\nUser quit %s bot run...' %
                              self.__class__.__name__)
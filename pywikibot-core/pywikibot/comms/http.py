@@ -60,7 +60,7 @@ else:
     import cookielib
     from urllib2 import quote
 
-from pywikibot import config
+from pywikibot import config, metrics
 from pywikibot.exceptions import (
     FatalServerError, Server504Error, Server414Error
 )
@@ -82,11 +82,14 @@ _logger = "comm.http"
 
 # global variables
 
-numthreads = 1
+numthreads = max(1, config.http_threads)
 threads = []
 
-connection_pool = threadedhttp.ConnectionPool()
+connection_pool = threadedhttp.ConnectionPool(
+    max_inflight=config.http_connections_per_host)
 http_queue = Queue.Queue()
+queue_statistics = threadedhttp.QueueStatistics()
+metrics.registry.add_source('http_queue', queue_statistics.as_dict)
 
 cookie_jar = threadedhttp.LockableCookieJar(
     config.datafilepath("pywikibot.lwp"))
@@ -101,7 +104,8 @@ else:
 # Build up HttpProcessors
 pywikibot.log(u'Starting %(numthreads)i threads...' % locals())
 for i in range(numthreads):
-    proc = threadedhttp.HttpProcessor(http_queue, cookie_jar, connection_pool)
+    proc = threadedhttp.HttpProcessor(http_queue, cookie_jar, connection_pool,
+                                      queue_statistics)
     proc.setDaemon(True)
     threads.append(proc)
     proc.start()
@@ -125,6 +129,7 @@ def _flush():
         time.sleep(.1)
 
     pywikibot.log(u"All threads finished.")
+    pywikibot.log(u'HTTP queue statistics: %r' % queue_statistics)
 atexit.register(_flush)
 
 # export cookie_jar to global namespace
@@ -253,6 +258,25 @@ def request(site=None, uri=None, method='GET', body=None, headers=None,
         r = fetch(uri, method, body, headers, **kwargs)
         return r.content
 
+    r = fetch_from_site(site, uri, method, body, headers, **kwargs)
+    return r.content
+
+
+def fetch_from_site(site, uri, method='GET', body=None, headers=None,
+                    **kwargs):
+    """
+    Blocking request to Site with default error handling.
+
+    Unlike L{request} the response is not decoded, so the caller can use
+    the raw response body.
+
+    @param site: The Site to connect to
+    @type site: L{pywikibot.site.BaseSite}
+    @param uri: the URI to retrieve, relative from and including the
+        document root '/'
+    @type uri: str
+    @rtype: L{threadedhttp.HttpRequest}
+    """
     baseuri = site.base_url(uri)
 
     kwargs.setdefault("disable_ssl_certificate_validation",
@@ -266,8 +290,7 @@ def request(site=None, uri=None, method='GET', body=None, headers=None,
 
     headers['user-agent'] = user_agent(site, format_string)
 
-    r = fetch(baseuri, method, body, headers, **kwargs)
-    return r.content
+    return fetch(baseuri, method, body, headers, **kwargs)
 
 
 def error_handling_callback(request):
@@ -312,7 +335,8 @@ def _enqueue(uri, method="GET", body=None, headers=None, **kwargs):
 
     Note: multiple async requests do not automatically run concurrently,
     as they are limited by the number of http threads in L{numthreads},
-    which is set to 1 by default.
+    which is set by config.http_threads and is 1 by default.  Requests to
+    one host are additionally limited by config.http_connections_per_host.
 
     @see: L{httplib2.Http.request} for parameters.
 
@@ -344,6 +368,7 @@ def _enqueue(uri, method="GET", body=None, headers=None, **kwargs):
 
     request = threadedhttp.HttpRequest(
         uri, method, body, headers, callbacks, **kwargs)
+    queue_statistics.record_enqueue(request, http_queue.qsize())
     http_queue.put(request)
     return request
 
@@ -365,6 +390,11 @@ def fetch(uri, method="GET", body=None, headers=None,
     request = _enqueue(uri, method, body, headers, **kwargs)
     request._join()  # wait for it
     assert(request._data)  # if there's no data in the answer we're in trouble
+    metrics.increment('http.requests')
+    if body:
+        metrics.increment('http.bytes_sent', len(body))
+    if not request.exception:
+        metrics.increment('http.bytes_received', len(request.raw))
     # Run the error handling callback in the callers thread so exceptions
     # may be caught.
     if default_error_handling:
@@ -10,7 +10,7 @@ This class extends httplib2, adding support for:
 """
 from __future__ import unicode_literals
 
-# (C) Pywikibot team, 2007-2014
+# (C) Pywikibot team, 2007-2015
 # (C) Httplib 2 team, 2006
 # (C) Metaweb Technologies, Inc., 2007
 #
@@ -23,9 +23,11 @@ __docformat__ = 'epytext'
 
 # standard python libraries
 import codecs
+import collections
 import re
 import sys
 import threading
+import time
 
 if sys.version_info[0] > 2:
     from http import cookiejar as cookielib
@@ -49,28 +51,39 @@ import httplib2
 
 class ConnectionPool(object):
 
-    """A thread-safe connection pool."""
+    """A thread-safe connection pool.
 
-    def __init__(self, maxnum=5):
+    Besides pooling connections, the pool can limit the number of requests
+    which are in flight for one identifier at the same time.  Requests
+    exceeding that limit are deferred and handed back once a slot for that
+    identifier is released.
+    """
+
+    def __init__(self, maxnum=5, max_inflight=None):
         """
         Constructor.
 
         @param maxnum: Maximum number of connections per identifier.
                        The pool drops excessive connections added.
+        @param max_inflight: Maximum number of requests per identifier which
+                       may be processed at the same time. No limit if None.
+        @type max_inflight: int or None
 
         """
         pywikibot.debug(u"Creating connection pool.", _logger)
         self.connections = {}
         self.lock = threading.Lock()
         self.maxnum = maxnum
+        self.max_inflight = max_inflight
+        self.inflight = collections.defaultdict(int)
+        self.deferred = collections.defaultdict(collections.deque)
 
     def __del__(self):
         """Destructor to close all connections in the pool."""
         self.lock.acquire()
         try:
-            pywikibot.debug(u"Closing connection pool (%s connections)"
-                            % len(self.connections),
-                            _logger)
+            pywikibot.debug(u"Closing connection pool (%s connections)",
+                            _logger, args=len(self.connections))
             for key in self.connections:
                 for connection in self.connections[key]:
                     connection.close()
@@ -93,9 +106,8 @@ class ConnectionPool(object):
         try:
             if identifier in self.connections:
                 if len(self.connections[identifier]) > 0:
-                    pywikibot.debug(u"Retrieved connection from '%s' pool."
-                                    % identifier,
-                                    _logger)
+                    pywikibot.debug(u"Retrieved connection from '%s' pool.",
+                                    _logger, args=identifier)
                     return self.connections[identifier].pop()
             return None
         finally:
@@ -116,14 +128,122 @@ class ConnectionPool(object):
             if len(self.connections[identifier]) != self.maxnum:
                 self.connections[identifier].append(connection)
             else:
-                pywikibot.debug(u"closing %s connection %r"
-                                % (identifier, connection),
-                                _logger)
+                pywikibot.debug(u"closing %s connection %r", _logger,
+                                args=(identifier, connection))
                 connection.close()
                 del connection
         finally:
             self.lock.release()
 
+    def acquire_slot(self, identifier, item=None):
+        """Reserve a request slot for identifier.
+
+        If the limit of requests in flight for that identifier has been
+        reached, the item is deferred until L{release_slot} hands it back.
+
+        @param identifier: The pool identifier
+        @param item: The request which needs the slot
+        @return: Whether the slot was reserved
+        @rtype: bool
+
+        """
+        with self.lock:
+            if (self.max_inflight is not None and
+                    self.inflight[identifier] >= self.max_inflight):
+                self.deferred[identifier].append(item)
+                return False
+            self.inflight[identifier] += 1
+            return True
+
+    def release_slot(self, identifier):
+        """Release a request slot reserved for identifier.
+
+        @param identifier: The pool identifier
+        @return: A request deferred by L{acquire_slot} if there is one,
+            which must be processed by the caller, None otherwise
+
+        """
+        with self.lock:
+            self.inflight[identifier] -= 1
+            if not self.inflight[identifier]:
+                del self.inflight[identifier]
+            if self.deferred.get(identifier):
+                item = self.deferred[identifier].popleft()
+                if not self.deferred[identifier]:
+                    del self.deferred[identifier]
+                return item
+            return None
+
+
+class QueueStatistics(object):
+
+    """Thread-safe counters about requests waiting in a HTTP queue.
+
+    The counters are intended to help sizing the number of HTTP threads and
+    the limit of requests per host.
+    """
+
+    def __init__(self):
+        """Constructor."""
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Reset all counters."""
+        with self.lock:
+            self.enqueued = 0
+            self.started = 0
+            self.deferred = 0
+            self.max_depth = 0
+            self.total_wait = 0.0
+            self.max_wait = 0.0
+
+    def record_enqueue(self, request, depth):
+        """Record that request was queued when the queue had depth items."""
+        request._enqueued = time.time()
+        with self.lock:
+            self.enqueued += 1
+            if depth > self.max_depth:
+                self.max_depth = depth
+
+    def record_deferred(self, request):
+        """Record that request was deferred by a host limit."""
+        with self.lock:
+            self.deferred += 1
+
+    def record_start(self, request):
+        """Record that processing of request has started."""
+        enqueued = getattr(request, '_enqueued', None)
+        wait = time.time() - enqueued if enqueued else 0.0
+        with self.lock:
+            self.started += 1
+            self.total_wait += wait
+            if wait > self.max_wait:
+                self.max_wait = wait
+
+    @property
+    def mean_wait(self):
+        """Return the mean time in seconds a request waited to start."""
+        if not self.started:
+            return 0.0
+        return self.total_wait / self.started
+
+    def as_dict(self):
+        """Return a snapshot of the counters."""
+        with self.lock:
+            return {
+                'enqueued': self.enqueued,
+                'started': self.started,
+                'deferred': self.deferred,
+                'max_depth': self.max_depth,
+                'total_wait': self.total_wait,
+                'max_wait': self.max_wait,
+                'mean_wait': self.mean_wait,
+            }
+
+    def __repr__(self):
+        return '{0}({1!r})'.format(self.__class__.__name__, self.as_dict())
+
 
 class LockableCookieJar(cookielib.LWPCookieJar):
 
@@ -218,11 +338,9 @@ class Http(httplib2.Http):
         # Redirect hack: we want to regulate redirects
         follow_redirects = self.follow_redirects
         self.follow_redirects = False
-        pywikibot.debug(u"%r" % (
-            (uri.replace("%7C", "|"), method, body,
-             headers, max_redirects,
-             connection_type),
-        ), _logger)
+        pywikibot.debug(u"%r", _logger,
+                        args=((uri.replace("%7C", "|"), method, body,
+                               headers, max_redirects, connection_type),))
         try:
             if authority in config.authenticate:
                 self.add_credentials(*config.authenticate[authority])
@@ -285,9 +403,9 @@ class Http(httplib2.Http):
              fragment) = httplib2.parse_uri(location)
             if authority is None:
                 response['location'] = urljoin(uri, location)
-                pywikibot.debug(u"Relative redirect: changed [%s] to [%s]"
-                                % (location, response['location']),
-                                _logger)
+                pywikibot.debug(u"Relative redirect: changed [%s] to [%s]",
+                                _logger,
+                                args=(location, response['location']))
         if response.status == 301 and method in ["GET", "HEAD"]:
             response['-x-permanent-redirect-url'] = response['location']
             if "content-location" not in response:
@@ -505,7 +623,7 @@ class HttpProcessor(threading.Thread):
 
     """Thread object to spawn multiple HTTP connection threads."""
 
-    def __init__(self, queue, cookiejar, connection_pool):
+    def __init__(self, queue, cookiejar, connection_pool, statistics=None):
         """
         Constructor.
 
@@ -514,11 +632,16 @@ class HttpProcessor(threading.Thread):
         @param cookiejar: The C{LockableCookieJar} cookie object to share among
                requests.
         @param connection_pool: The C{ConnectionPool} object which contains
-               connections to share among requests.
+               connections to share among requests. It also limits the
+               number of requests per host processed at the same time.
+        @param statistics: (optional) The C{QueueStatistics} object which
+               records the wait time of requests.
 
         """
         threading.Thread.__init__(self)
         self.queue = queue
+        self.connection_pool = connection_pool
+        self.statistics = statistics
         self.http = Http(cookiejar=cookiejar, connection_pool=connection_pool)
 
     def run(self):
@@ -530,18 +653,40 @@ class HttpProcessor(threading.Thread):
             if item is None:
                 pywikibot.debug(u"Shutting down thread.", _logger)
                 return
+            # The deferred requests are processed by the thread releasing
+            # their slot, as the other threads may have been shut down.
+            while item is not None:
+                item = self._process(item)
 
-            # This needs to be set per request, however it is only used
-            # the first time the pooled connection is created.
-            self.http.disable_ssl_certificate_validation = \
-                item.kwargs.pop('disable_ssl_certificate_validation', False)
-            try:
-                item.data = self.http.request(*item.args, **item.kwargs)
-            finally:
-                if item.lock:
-                    item.lock.release()
-                # if data wasn't set others might hang; but wait on lock release
-                assert(item._data)
+    def _process(self, item):
+        """
+        Process a request if a slot for its host is free.
+
+        @return: A request deferred until this request is done, or None
+        """
+        hostname = item.hostname
+        if not self.connection_pool.acquire_slot(hostname, item):
+            # The pool hands it back when a request to that host is done
+            if self.statistics:
+                self.statistics.record_deferred(item)
+            return None
+
+        if self.statistics:
+            self.statistics.record_start(item)
+
+        # This needs to be set per request, however it is only used
+        # the first time the pooled connection is created.
+        self.http.disable_ssl_certificate_validation = \
+            item.kwargs.pop('disable_ssl_certificate_validation', False)
+        try:
+            item.data = self.http.request(*item.args, **item.kwargs)
+        finally:
+            deferred = self.connection_pool.release_slot(hostname)
+            if item.lock:
+                item.lock.release()
+            # if data wasn't set others might hang; but wait on lock release
+            assert(item._data)
+        return deferred
 
 
 # Metaweb Technologies, Inc. License:
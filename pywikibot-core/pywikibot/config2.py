@@ -105,6 +105,14 @@ user_agent_format = '{script_product} ({script_comments}) {pwb} ({revision}) {ht
 site_interface = 'APISite'
 # number of days to cache namespaces, api configuration, etc.
 API_config_expiry = 30
+# Keep the namespaces, site information and API parameter information of
+# each site in a snapshot file, which is loaded in one read when the site is
+# created instead of requesting or loading each part from the API cache.
+site_snapshots = False
+# number of days after which a snapshot is refreshed in the background,
+# while the bot continues with the stale data. Site.version() refreshes
+# siteinfo older than one day itself, so keep this below 1.
+site_snapshot_expiry = 0.5
 
 # The maximum number of bytes which uses a GET request, if not positive
 # it'll always use POST requests
@@ -536,10 +544,21 @@ maxthrottle = 60
 # 'put_throttle' seconds.
 put_throttle = 10
 
+# Limit the total number of requests per second to a site made by all bot
+# processes of this user, e.g. 0.5 for one request every two seconds. The
+# processes share the allowed requests, so one process may use all of them
+# if it's the only one running. None for no limit.
+throttle_shared_rate = None
+
 # Sometimes you want to know when a delay is inserted. If a delay is larger
 # than 'noisysleep' seconds, it is logged on the screen.
 noisysleep = 3.0
 
+# The file to which the statistics of a bot run are written as JSON at exit
+# and when the process receives SIGUSR1, see pywikibot.metrics. If None, they
+# are only written to the log on SIGUSR1.
+metrics_file = None
+
 # Defer bot edits during periods of database server lag.  For details, see
 # https://www.mediawiki.org/wiki/Maxlag_parameter
 # You can set this variable to a number of seconds, or to None (or 0) to
@@ -560,6 +579,12 @@ max_retries = 25
 # Minimum time to wait before resubmitting a failed API request.
 retry_wait = 5
 
+# Adapt the number of items requested by each continuation of an API query
+# so that a response takes about this many seconds. The limits learned for
+# each site and query module are remembered across runs. If set to None,
+# the maximum number of items allowed by the API is always requested.
+api_target_response_time = None
+
 # ############# TABLE CONVERSION BOT SETTINGS ##############
 
 # will split long paragraphs for better reading the source.
@@ -679,6 +704,16 @@ persistent_http = False
 # Default socket timeout. Set to None to disable timeouts.
 socket_timeout = 120  # set a pretty long timeout just in case...
 
+# Number of threads which process HTTP requests. Using more than one thread
+# allows requests to different hosts (e.g. Commons, Wikidata and the local
+# wiki) to be processed at the same time.
+http_threads = 1
+
+# Maximum number of requests to one host which are processed at the same
+# time. Further requests to that host wait until one of them has finished.
+# Set to None to disable the limit.
+http_connections_per_host = 2
+
 
 # ############# COSMETIC CHANGES SETTINGS ##############
 # The bot can make some additional changes to each page it edits, e.g. fix
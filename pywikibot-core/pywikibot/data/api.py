@@ -12,6 +12,8 @@ __version__ = '$Id$'
 from collections import Container, MutableMapping
 from pywikibot.comms import http
 from email.mime.nonmultipart import MIMENonMultipart
+import atexit
+import codecs
 import datetime
 import hashlib
 import json
@@ -22,13 +24,15 @@ except ImportError:
     import pickle
 import pprint
 import re
+import threading
 import traceback
 import time
 
 from warnings import warn
 
 import pywikibot
-from pywikibot import config, login
+from pywikibot import config, login, metrics
+from pywikibot.data.cachestore import CacheStore
 from pywikibot.tools import MediaWikiVersion, deprecated, itergroup, ip
 from pywikibot.exceptions import (
     Server504Error, Server414Error, FatalServerError, Error
@@ -168,7 +172,8 @@ class ParamInfo(Container):
 
     init_modules = frozenset(['main', 'paraminfo'])
 
-    def __init__(self, site, preloaded_modules=None, modules_only_mode=None):
+    def __init__(self, site, preloaded_modules=None, modules_only_mode=None,
+                 expiry=None):
         """
         Constructor.
 
@@ -177,8 +182,12 @@ class ParamInfo(Container):
         @param modules_only_mode: use the 'modules' only syntax for API request
         @type: modules_only_mode: bool or None to only use default, which True
             if the site is 1.25wmf4+
+        @param expiry: days the cached responses are used; default is
+            config.API_config_expiry
+        @type expiry: int/float or None
         """
         self.site = site
+        self.expiry = expiry
 
         # Keys are module names, values are the raw responses from the server.
         self._paraminfo = {}
@@ -553,7 +562,8 @@ class ParamInfo(Container):
                     self.preloaded_modules |= set(['query'])
 
             params = {
-                'expiry': config.API_config_expiry,
+                'expiry': (config.API_config_expiry if self.expiry is None
+                           else self.expiry),
                 'use_get': True,  # Request need ParamInfo to determine use_get
                 'site': self.site,
                 'action': 'paraminfo',
@@ -1123,6 +1133,8 @@ class Request(MutableMapping):
         self.action = kwargs['action']
         self.update(**kwargs)
         self._warning_handler = None
+        # seconds the server took for the last response of submit()
+        self.response_time = None
         # Actions that imply database updates on the server, used for various
         # things like throttling or skipping actions when we're in simulation
         # mode
@@ -1495,6 +1507,52 @@ class Request(MutableMapping):
                             not self._warning_handler(mod, single_warning)):
                         pywikibot.warning(u"API warning (%s): %s" % (mod, single_warning))
 
+    def _response_encoding(self, response):
+        """Return the encoding of an API response.
+
+        @param response: the response
+        @type response: L{threadedhttp.HttpRequest}
+        @rtype: str
+        """
+        if 'content-type' in response.response_headers:
+            encoding = response.header_encoding
+            if encoding:
+                try:
+                    codecs.lookup(encoding)
+                except LookupError:
+                    pass
+                else:
+                    return encoding
+        return self.site.encoding()
+
+    @staticmethod
+    def _decode_json(rawdata, encoding):
+        """Parse the JSON document in the undecoded response body.
+
+        The body is parsed without decoding it into a separate unicode copy
+        first, unless the json module does not accept bytes or the encoding
+        is not UTF-8.
+
+        @param rawdata: the response body
+        @type rawdata: bytes
+        @param encoding: the encoding of rawdata
+        @type encoding: str
+        @raises ValueError: rawdata is not a valid JSON document
+        """
+        if (codecs.lookup(encoding).name == 'utf-8' and
+                (sys.version_info[0] == 2 or sys.version_info >= (3, 6))):
+            return json.loads(rawdata)
+        return json.loads(rawdata.decode(encoding))
+
+    def _count_request(self):
+        """Count the request for its action and its query modules."""
+        metrics.increment('api.requests')
+        metrics.increment('api.requests.%s' % self.action)
+        if self.action == 'query':
+            for mod_type_name in ('prop', 'list', 'meta', 'generator'):
+                for module in self._params.get(mod_type_name, []):
+                    metrics.increment('api.requests.query+%s' % module)
+
     def submit(self):
         """Submit a query and parse the response.
 
@@ -1550,9 +1608,13 @@ class Request(MutableMapping):
                     else:
                         body = paramstring
 
-                rawdata = http.request(
+                self._count_request()
+                start = time.time()
+                response = http.fetch_from_site(
                     site=self.site, uri=uri, method='GET' if use_get else 'POST',
                     body=body, headers=headers)
+                self.response_time = time.time() - start
+                metrics.observe('api.response_time', self.response_time)
             except Server504Error:
                 pywikibot.log(u"Caught HTTP 504 error; retrying")
                 self.wait()
@@ -1578,14 +1640,17 @@ class Request(MutableMapping):
                 pywikibot.log(u"%s, %s" % (uri, paramstring))
                 self.wait()
                 continue
-            if not isinstance(rawdata, unicode):
-                rawdata = rawdata.decode(self.site.encoding())
-            pywikibot.debug((u"API response received from %s:\n" % self.site) +
-                            rawdata, _logger)
-            if rawdata.startswith(u"unknown_action"):
+            rawdata = response.raw
+            encoding = self._response_encoding(response)
+            if pywikibot.debug_enabled(_logger):
+                pywikibot.debug(u"API response received from %s:\n%s", _logger,
+                                args=(self.site,
+                                      rawdata.decode(encoding, 'replace')))
+            if rawdata.startswith(b"unknown_action"):
+                rawdata = rawdata.decode(encoding)
                 raise APIError(rawdata[:14], rawdata[16:])
             try:
-                result = json.loads(rawdata)
+                result = self._decode_json(rawdata, encoding)
             except ValueError:
                 # if the result isn't valid JSON, there must be a server
                 # problem.  Wait a few seconds and try again
@@ -1800,6 +1865,13 @@ class CachedRequest(Request):
 
         @rtype: unicode
         """
+        return ''.join(self._cache_key_parts())
+
+    def _cache_key_parts(self):
+        """Return the site, user and request parts of the description.
+
+        @rtype: tuple of unicode
+        """
         login_status = self.site._loginstatus
 
         if login_status > pywikibot.site.LoginStatus.NOT_LOGGED_IN and \
@@ -1817,7 +1889,7 @@ class CachedRequest(Request):
             user_key = repr(user_key)
 
         request_key = repr(sorted(list(self._encoded_items().items())))
-        return repr(self.site) + user_key + request_key
+        return repr(self.site), user_key, request_key
 
     def _create_file_name(self):
         """
@@ -1830,47 +1902,83 @@ class CachedRequest(Request):
         ).hexdigest()
 
     def _cachefile_path(self):
+        """Return the path of the cache file used before L{CacheStore}."""
         return os.path.join(CachedRequest._get_cache_dir(),
                             self._create_file_name())
 
+    def _cache_store(self):
+        """Return the store of the cache entries."""
+        return CacheStore.get(self._get_cache_dir())
+
     def _expired(self, dt):
         return dt + self.expiry < datetime.datetime.now()
 
     def _load_cache(self):
         """Load cache entry for request, if available.
 
+        The cache time is checked using the index of the store, so the
+        payload of an expired entry is not loaded.
+
         @return: Whether the request was loaded from the cache
         @rtype: bool
         """
         self._add_defaults()
         try:
-            filename = self._cachefile_path()
-            with open(filename, 'rb') as f:
-                uniquedescr, self._data, self._cachetime = pickle.load(f)
-            assert(uniquedescr == self._uniquedescriptionstr())
-            if self._expired(self._cachetime):
-                self._data = None
+            key = self._create_file_name()
+            uniquedescr = self._uniquedescriptionstr()
+            store = self._cache_store()
+            entry = store.lookup(key)
+            if entry is None:
+                return self._load_cache_file(uniquedescr)
+            assert(entry[0] == uniquedescr)
+            if self._expired(entry[3]):
                 return False
-            pywikibot.debug(u"%s: cache hit (%s) for API request: %s"
-                            % (self.__class__.__name__, filename, uniquedescr),
-                            _logger)
+            self._data = store.load(key)
+            self._cachetime = entry[3]
+            pywikibot.debug(u"%s: cache hit (%s) for API request: %s", _logger,
+                            args=(self.__class__.__name__, key, uniquedescr))
             return True
-        except IOError as e:
-            # file not found
-            return False
         except Exception as e:
             pywikibot.output("Could not load cache: %r" % e)
             return False
 
+    def _load_cache_file(self, uniquedescr):
+        """Load a cache entry from a file written before L{CacheStore}.
+
+        A valid entry is copied into the store.
+
+        @return: Whether the request was loaded from the cache
+        @rtype: bool
+        """
+        filename = self._cachefile_path()
+        try:
+            with open(filename, 'rb') as f:
+                descr, data, cachetime = pickle.load(f)
+        except IOError:
+            # file not found
+            return False
+        assert(descr == uniquedescr)
+        if self._expired(cachetime):
+            return False
+        site, user, request = self._cache_key_parts()
+        self._cache_store().store(self._create_file_name(), descr, data,
+                                  site, user, cachetime)
+        self._data, self._cachetime = data, cachetime
+        pywikibot.debug(u"%s: cache hit (%s) for API request: %s", _logger,
+                        args=(self.__class__.__name__, filename, descr))
+        return True
+
     def _write_cache(self, data):
-        """Write data to self._cachefile_path()."""
-        data = [self._uniquedescriptionstr(), data, datetime.datetime.now()]
-        with open(self._cachefile_path(), 'wb') as f:
-            pickle.dump(data, f, protocol=config.pickle_protocol)
+        """Write data to the cache store."""
+        site, user, request = self._cache_key_parts()
+        self._cache_store().store(self._create_file_name(),
+                                  site + user + request, data, site, user)
 
     def submit(self):
         """Submit cached request."""
         cached_available = self._load_cache()
+        metrics.increment('api.cache.hits' if cached_available
+                          else 'api.cache.misses')
         if not cached_available:
             self._data = super(CachedRequest, self).submit()
             self._write_cache(self._data)
@@ -1935,9 +2043,8 @@ class APIGenerator(object):
         """
         self.query_increment = int(value)
         self.request[self.limit_name] = self.query_increment
-        pywikibot.debug(u"%s: Set query_increment to %i."
-                        % (self.__class__.__name__, self.query_increment),
-                        _logger)
+        pywikibot.debug(u"%s: Set query_increment to %i.", _logger,
+                        args=(self.__class__.__name__, self.query_increment))
 
     def set_maximum_items(self, value):
         """
@@ -1953,10 +2060,10 @@ class APIGenerator(object):
         self.limit = int(value)
         if self.limit < self.query_increment:
             self.request[self.limit_name] = self.limit
-            pywikibot.debug(u"%s: Set request item limit to %i"
-                            % (self.__class__.__name__, self.limit), _logger)
-        pywikibot.debug(u"%s: Set limit (maximum_items) to %i."
-                        % (self.__class__.__name__, self.limit), _logger)
+            pywikibot.debug(u"%s: Set request item limit to %i", _logger,
+                            args=(self.__class__.__name__, self.limit))
+        pywikibot.debug(u"%s: Set limit (maximum_items) to %i.", _logger,
+                        args=(self.__class__.__name__, self.limit))
 
     def __iter__(self):
         """Submit request and iterate the response.
@@ -1967,29 +2074,170 @@ class APIGenerator(object):
         n = 0
         while True:
             self.request[self.continue_name] = offset
-            pywikibot.debug(u"%s: Request: %s" % (self.__class__.__name__,
-                                                  self.request), _logger)
+            pywikibot.debug(u"%s: Request: %s", _logger,
+                            args=(self.__class__.__name__, self.request))
             data = self.request.submit()
 
             n_items = len(data[self.data_name])
-            pywikibot.debug(u"%s: Retrieved %d items" % (
-                self.__class__.__name__, n_items), _logger)
+            pywikibot.debug(u"%s: Retrieved %d items", _logger,
+                            args=(self.__class__.__name__, n_items))
             if n_items > 0:
                 for item in data[self.data_name]:
                     yield item
                     n += 1
                     if self.limit is not None and n >= self.limit:
                         pywikibot.debug(u"%s: Stopped iterating due to "
-                                        u"exceeding item limit." %
-                                        self.__class__.__name__, _logger)
+                                        u"exceeding item limit.", _logger,
+                                        args=self.__class__.__name__)
                         return
                 offset += n_items
             else:
                 pywikibot.debug(u"%s: Stopped iterating due to empty list in "
-                                u"response." % self.__class__.__name__, _logger)
+                                u"response.", _logger,
+                                args=self.__class__.__name__)
                 break
 
 
+class LimitController(object):
+
+    """Adapt the limit of query continuations to the server response time.
+
+    For each site and query module the controller keeps the number of items
+    to request per continuation. After each response the limit is scaled by
+    the ratio of the target response time to the measured one, by at most
+    a factor of two either way, and never beyond the maximum allowed by the
+    API. The learned limits can be saved to a file and are loaded from it
+    on first use.
+    """
+
+    filename = 'apilimits.json'
+
+    def __init__(self, target, path=None):
+        """
+        Constructor.
+
+        @param target: the response time to aim for, in seconds
+        @type target: float
+        @param path: file to load learned limits from and save them to
+        @type path: basestring or None
+        """
+        self.target = float(target)
+        self.path = path
+        self.lock = threading.Lock()
+        self._limits = None
+        self._changed = False
+
+    @staticmethod
+    def key(site, module):
+        """Return the key of the limit for a query module of a site."""
+        return '%s:%s|%s' % (site.family.name, site.code, module)
+
+    @property
+    def limits(self):
+        """Return the dict of learned limits, loading them if needed."""
+        if self._limits is None:
+            self._limits = self._load()
+        return self._limits
+
+    def _load(self):
+        """Return the limits stored in the file."""
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with codecs.open(self.path, 'r', 'utf-8') as f:
+                data = json.load(f)
+        except (IOError, ValueError) as e:
+            pywikibot.warning('Could not load API limits from %s: %s'
+                              % (self.path, e))
+            return {}
+        return dict((key, value) for key, value in data.items()
+                    if isinstance(value, int) and value > 0)
+
+    def save(self):
+        """Write the learned limits to the file if they changed."""
+        with self.lock:
+            if not self.path or not self._changed:
+                return
+            data = json.dumps(self._limits, sort_keys=True, indent=0)
+            self._changed = False
+        try:
+            with codecs.open(self.path, 'w', 'utf-8') as f:
+                f.write(data)
+        except IOError as e:
+            pywikibot.warning('Could not save API limits to %s: %s'
+                              % (self.path, e))
+
+    def _set(self, key, limit):
+        """Store a learned limit; the lock must be held."""
+        if self.limits.get(key) != limit:
+            self.limits[key] = limit
+            self._changed = True
+
+    def limit(self, key, maximum):
+        """Return the number of items to request.
+
+        @param key: the key of the site and module
+        @param maximum: the highest limit allowed for this request
+        @type maximum: int
+        @rtype: int
+        """
+        with self.lock:
+            return min(self.limits.get(key, maximum), maximum)
+
+    def record(self, key, limit, elapsed, maximum):
+        """Adapt the limit to the response time of a request.
+
+        @param key: the key of the site and module
+        @param limit: the number of items requested
+        @type limit: int
+        @param elapsed: seconds the server took to respond
+        @type elapsed: float
+        @param maximum: the highest limit allowed
+        @type maximum: int
+        @return: the new limit
+        @rtype: int
+        """
+        if elapsed > 0:
+            ratio = max(0.5, min(2.0, self.target / elapsed))
+        else:
+            ratio = 2.0
+        new_limit = max(1, min(maximum, int(limit * ratio)))
+        with self.lock:
+            if ratio >= 1:
+                # a fast response to a small request, e.g. the last one
+                # of a query, must not shrink the limit.
+                new_limit = max(new_limit,
+                                min(self.limits.get(key, 0), maximum))
+            self._set(key, new_limit)
+        return new_limit
+
+    def reduce(self, key, limit):
+        """Record that a request only succeeded after its limit was reduced.
+
+        @param key: the key of the site and module
+        @param limit: the limit of the successful request
+        @type limit: int
+        """
+        with self.lock:
+            self._set(key, max(1, min(self.limits.get(key, limit), limit)))
+
+
+_limit_controller = None
+
+
+def _get_limit_controller():
+    """Return the shared LimitController, or None if it is disabled."""
+    global _limit_controller
+    if not config.api_target_response_time:
+        return None
+    if _limit_controller is None:
+        _limit_controller = LimitController(
+            config.api_target_response_time,
+            config.datafilepath(LimitController.filename))
+        atexit.register(_limit_controller.save)
+    return _limit_controller
+
+
 class QueryGenerator(object):
 
     """Base class for iterators that handle responses to API action=query.
@@ -2119,9 +2367,8 @@ class QueryGenerator(object):
             self.query_limit = limit
         else:
             self.query_limit = min(self.api_limit, limit)
-        pywikibot.debug(u"%s: Set query_limit to %i."
-                        % (self.__class__.__name__, self.query_limit),
-                        _logger)
+        pywikibot.debug(u"%s: Set query_limit to %i.", _logger,
+                        args=(self.__class__.__name__, self.query_limit))
 
     def set_maximum_items(self, value):
         """Set the maximum number of items to be retrieved from the wiki.
@@ -2145,10 +2392,8 @@ class QueryGenerator(object):
             self.api_limit = int(param["highmax"])
         else:
             self.api_limit = int(param["max"])
-        pywikibot.debug(u"%s: Set query_limit to %i."
-                        % (self.__class__.__name__,
-                           self.api_limit),
-                        _logger)
+        pywikibot.debug(u"%s: Set query_limit to %i.", _logger,
+                        args=(self.__class__.__name__, self.api_limit))
 
     def set_namespace(self, namespaces):
         """Set a namespace filter on this query.
@@ -2216,6 +2461,10 @@ class QueryGenerator(object):
         """
         previous_result_had_data = True
         prev_limit = new_limit = None
+        if self.limited_module and self.api_limit is not None:
+            controller = _get_limit_controller()
+        else:
+            controller = None
 
         count = 0
         while True:
@@ -2235,46 +2484,43 @@ class QueryGenerator(object):
                 else:
                     new_limit = None
 
-                if new_limit and \
-                        "rvprop" in self.request \
-                        and "content" in self.request["rvprop"]:
+                if new_limit and self._content_query():
                     # queries that retrieve page content have lower limits
                     # Note: although API allows up to 500 pages for content
                     #   queries, these sometimes result in server-side errors
                     #   so use 250 as a safer limit
                     new_limit = min(new_limit, self.api_limit // 10, 250)
+                if new_limit and controller:
+                    new_limit = controller.limit(self._limit_key(), new_limit)
                 if new_limit is not None:
                     self.request[self.prefix + "limit"] = str(new_limit)
                 if prev_limit != new_limit:
-                    pywikibot.debug(
-                        u"%s: query_limit: %s, api_limit: %s, "
-                        u"limit: %s, new_limit: %s, count: %s"
-                        % (self.__class__.__name__,
-                           self.query_limit, self.api_limit,
-                           self.limit, new_limit, count),
-                        _logger)
-                    pywikibot.debug(
-                        u"%s: %s: %s"
-                        % (self.__class__.__name__,
-                           self.prefix + "limit",
-                           self.request[self.prefix + "limit"]),
-                        _logger)
+                    pywikibot.debug(u"%s: query_limit: %s, api_limit: %s, "
+                                    u"limit: %s, new_limit: %s, count: %s",
+                                    _logger,
+                                    args=(self.__class__.__name__,
+                                          self.query_limit, self.api_limit,
+                                          self.limit, new_limit, count))
+                    pywikibot.debug(u"%s: %s: %s", _logger,
+                                    args=(self.__class__.__name__,
+                                          self.prefix + "limit",
+                                          self.request[self.prefix + "limit"]))
             if not hasattr(self, "data"):
                 self.data = self.request.submit()
+                if new_limit and controller:
+                    self._adapt_limit(controller, new_limit)
             if not self.data or not isinstance(self.data, dict):
                 pywikibot.debug(
-                    u"%s: stopped iteration because no dict retrieved from api."
-                    % self.__class__.__name__,
-                    _logger)
+                    u"%s: stopped iteration because no dict retrieved from api.",
+                    _logger, args=self.__class__.__name__)
                 return
             if 'query' in self.data and self.resultkey in self.data["query"]:
                 resultdata = self.data["query"][self.resultkey]
                 if isinstance(resultdata, dict):
-                    pywikibot.debug(u"%s received %s; limit=%s"
-                                    % (self.__class__.__name__,
-                                       list(resultdata.keys()),
-                                       self.limit),
-                                    _logger)
+                    pywikibot.debug(u"%s received %s; limit=%s", _logger,
+                                    args=(self.__class__.__name__,
+                                          list(resultdata.keys()),
+                                          self.limit))
                     if "results" in resultdata:
                         resultdata = resultdata["results"]
                     elif "pageids" in self.data["query"]:
@@ -2286,11 +2532,9 @@ class QueryGenerator(object):
                         resultdata = [resultdata[k]
                                       for k in sorted(resultdata.keys())]
                 else:
-                    pywikibot.debug(u"%s received %s; limit=%s"
-                                    % (self.__class__.__name__,
-                                       resultdata,
-                                       self.limit),
-                                    _logger)
+                    pywikibot.debug(u"%s received %s; limit=%s", _logger,
+                                    args=(self.__class__.__name__,
+                                          resultdata, self.limit))
                 if "normalized" in self.data["query"]:
                     self.normalized = dict((item['to'], item['from'])
                                            for item in
@@ -2339,6 +2583,45 @@ class QueryGenerator(object):
 
             del self.data  # a new request with (query-)continue is needed
 
+    def _content_query(self):
+        """Return whether the request retrieves page content."""
+        return ('rvprop' in self.request and
+                'content' in self.request['rvprop'])
+
+    def _limit_key(self):
+        """Return the key of the limited module for the LimitController."""
+        module = self.limited_module
+        if self._content_query():
+            # content queries have a much higher cost per item
+            module += '+content'
+        return LimitController.key(self.site, module)
+
+    def _adapt_limit(self, controller, limit):
+        """Report the response to the last request to the controller.
+
+        @param controller: the controller which chose the limit
+        @type controller: LimitController
+        @param limit: the limit the request was prepared with
+        @type limit: int
+        """
+        key = self._limit_key()
+        # Request.submit halves the limit after an invalid response
+        used = int(self.request[self.prefix + 'limit'][0])
+        if used < limit:
+            controller.reduce(key, used)
+        elif self.request.response_time is not None:
+            maximum = self.query_limit
+            if self._content_query():
+                maximum = min(maximum, self.api_limit // 10, 250)
+            new_limit = controller.record(key, limit,
+                                          self.request.response_time, maximum)
+            if new_limit != limit:
+                pywikibot.debug(u'%s: adapted %slimit from %s to %s after %.2fs',
+                                _logger,
+                                args=(self.__class__.__name__, self.prefix,
+                                      limit, new_limit,
+                                      self.request.response_time))
+
     def result(self, data):
         """Process result data as needed for particular subclass."""
         return data
@@ -2455,6 +2738,143 @@ class PropertyGenerator(QueryGenerator):
         return self._props
 
 
+class PropertyBatcher(object):
+
+    """Collect page property lookups and submit them in combined queries.
+
+    Pages added to the batcher are kept pending until the title limit of a
+    query is reached or L{flush} is called. Then one PropertyGenerator query
+    requests the union of all pending properties for all pending pages, and
+    each result is applied to its page using L{update_page}.
+
+    Example:
+
+    >>> batcher = PropertyBatcher(site, ['info'])  # doctest: +SKIP
+    >>> batcher.add(page_a)  # doctest: +SKIP
+    >>> batcher.add(page_b, ['pageprops', 'coordinates'])  # doctest: +SKIP
+    >>> batcher.flush()  # doctest: +SKIP
+
+    """
+
+    # Request parameters used by the single page loading methods of APISite
+    default_parameters = {
+        'info': {'inprop': 'protection'},
+        'coordinates': {'coprop': ['type', 'name', 'dim', 'country',
+                                   'region', 'globe'],
+                        'coprimary': 'all'},
+        'imageinfo': {'iiprop': ['timestamp', 'user', 'comment', 'url',
+                                 'size', 'sha1', 'mime', 'metadata',
+                                 'archivename']},
+    }
+
+    def __init__(self, site, props=None, groupsize=None, parameters=None):
+        """
+        Constructor.
+
+        @param site: the site of all pages
+        @type site: APISite
+        @param props: properties requested for every page
+        @type props: iterable of str
+        @param groupsize: maximum number of pages per query; default is the
+            maximum number of titles allowed by the API for the user
+        @type groupsize: int
+        @param parameters: request parameters overriding
+            L{default_parameters}
+        @type parameters: dict
+        """
+        self.site = site
+        self.props = set(props or [])
+        if groupsize is None:
+            if site.logged_in() and site.has_right('apihighlimits'):
+                groupsize = 500
+            else:
+                groupsize = 50
+        self.groupsize = groupsize
+        self.parameters = dict(self.default_parameters)
+        if parameters:
+            self.parameters.update(parameters)
+        self._pending = []
+        self._pending_props = set()
+
+    def __len__(self):
+        """Return the number of pending pages."""
+        return len(self._pending)
+
+    def add(self, page, props=None):
+        """Add a page to be loaded.
+
+        If the page limit of one query is reached, the pending pages are
+        loaded.
+
+        @param page: page to be loaded
+        @type page: Page
+        @param props: properties requested for this page in addition to
+            the properties of the batcher
+        @type props: iterable of str
+        @return: the loaded pages, or an empty list if no query was made
+        @rtype: list of Page
+        """
+        if page.site != self.site:
+            raise Error('%s: %s is not on %s'
+                        % (self.__class__.__name__, page, self.site))
+        self._pending.append(page)
+        if props:
+            self._pending_props.update(props)
+        if len(self._pending) >= self.groupsize:
+            return self.flush()
+        return []
+
+    def flush(self):
+        """Load all pending pages using one query.
+
+        @return: the loaded pages in the order they were added
+        @rtype: list of Page
+        """
+        pages, self._pending = self._pending, []
+        props, self._pending_props = self.props | self._pending_props, set()
+        if not pages:
+            return []
+        if not props:
+            props = set(['info'])
+
+        cache = {}
+        for page in pages:
+            cache.setdefault(page.title(withSection=False), []).append(page)
+
+        kwargs = {}
+        for prop in props:
+            kwargs.update(self.parameters.get(prop, {}))
+        query = PropertyGenerator('|'.join(sorted(props)), site=self.site,
+                                  titles='|'.join(cache), **kwargs)
+        for pagedata in query:
+            if 'title' not in pagedata:
+                pywikibot.debug(u"No 'title' in %s", _logger, args=(pagedata,))
+                continue
+            title = pagedata['title']
+            if title not in cache:
+                # The API returns normalized titles, which are usually the
+                # same as the title of the page; see APISite.preloadpages.
+                for key in cache:
+                    if self.site.sametitle(key, title):
+                        cache[title] = cache[key]
+                        break
+                else:
+                    pywikibot.warning(
+                        u'%s: Query returned unexpected title %r'
+                        % (self.__class__.__name__, title))
+                    continue
+            for page in cache[title]:
+                update_page(page, pagedata, query.props)
+        # like Page.coordinates and Page.properties, remember that a page
+        # has none, so that they are not loaded again
+        for page in pages:
+            if 'coordinates' in props and not hasattr(page, '_coords'):
+                page._coords = []
+            if 'pageprops' in props and not hasattr(page, '_pageprops'):
+                page._pageprops = {}
+        return pages
+
+
 class ListGenerator(QueryGenerator):
 
     """Iterator for queries of type action=query&list=foo.
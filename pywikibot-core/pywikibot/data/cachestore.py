@@ -0,0 +1,208 @@
+# -*- coding: utf-8  -*-
+"""
+Indexed store for cached API responses.
+
+All entries of a cache directory are kept in a single sqlite database.
+Besides the compressed payload each entry records its key, the site and
+user it was requested for and the time it was cached, so that expiry checks,
+listing and pruning only need the index and never load the payload.
+"""
+#
+# (C) Pywikibot team, 2015
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import unicode_literals
+
+__version__ = '$Id$'
+
+import datetime
+import os
+import sqlite3
+import threading
+import zlib
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from pywikibot import config
+
+_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+def _format_timestamp(dt):
+    """Return a string of dt which sorts in chronological order."""
+    return dt.strftime(_TIMESTAMP_FORMAT)
+
+
+def _parse_timestamp(value):
+    """Return the datetime of a string made by L{_format_timestamp}."""
+    return datetime.datetime.strptime(value, _TIMESTAMP_FORMAT)
+
+
+class CacheStore(object):
+
+    """A thread-safe sqlite store of cache entries.
+
+    Use L{CacheStore.get} to share one instance per cache directory.
+    """
+
+    filename = 'cache.sqlite'
+
+    _stores = {}
+    _stores_lock = threading.Lock()
+
+    def __init__(self, path):
+        """
+        Constructor.
+
+        @param path: path of the database file
+        @type path: basestring
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self._connection = None
+
+    @classmethod
+    def get(cls, directory):
+        """Return the shared store of the cache directory.
+
+        @param directory: the cache directory
+        @type directory: basestring
+        @rtype: CacheStore
+        """
+        path = os.path.join(directory, cls.filename)
+        with cls._stores_lock:
+            if path not in cls._stores:
+                cls._stores[path] = cls(path)
+            return cls._stores[path]
+
+    @classmethod
+    def is_store(cls, path):
+        """Return whether path is a database file, or one of its journals."""
+        name = os.path.basename(path)
+        return name == cls.filename or name.startswith(cls.filename + '-')
+
+    @property
+    def connection(self):
+        """Return the database connection, creating the database if needed."""
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, timeout=30,
+                                               check_same_thread=False)
+            self._connection.executescript('''
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    description TEXT NOT NULL,
+                    site TEXT,
+                    user TEXT,
+                    timestamp TEXT NOT NULL,
+                    data BLOB NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS entries_timestamp
+                    ON entries (timestamp);
+                CREATE INDEX IF NOT EXISTS entries_site
+                    ON entries (site, user);
+            ''')
+        return self._connection
+
+    def _execute(self, sql, parameters=(), commit=False):
+        """Execute sql and return all rows of the result."""
+        with self.lock:
+            cursor = self.connection.execute(sql, parameters)
+            rows = cursor.fetchall()
+            if commit:
+                self.connection.commit()
+            return rows
+
+    def lookup(self, key):
+        """Return the index data of an entry without loading its payload.
+
+        @param key: the entry key
+        @return: tuple of description, site, user and cache time, or None if
+            there is no entry for key
+        @rtype: tuple or None
+        """
+        rows = self._execute('SELECT description, site, user, timestamp '
+                             'FROM entries WHERE key = ?', (key, ))
+        if not rows:
+            return None
+        description, site, user, timestamp = rows[0]
+        return description, site, user, _parse_timestamp(timestamp)
+
+    def load(self, key):
+        """Return the payload of an entry.
+
+        @param key: the entry key
+        @raises KeyError: there is no entry for key
+        """
+        rows = self._execute('SELECT data FROM entries WHERE key = ?',
+                             (key, ))
+        if not rows:
+            raise KeyError(key)
+        return pickle.loads(zlib.decompress(bytes(rows[0][0])))
+
+    def store(self, key, description, data, site=None, user=None,
+              timestamp=None):
+        """Add or replace an entry.
+
+        @param key: the entry key
+        @param description: the unique description the key was made from
+        @param data: the payload; it must be picklable
+        @param site: the site the entry belongs to
+        @param user: the user the entry belongs to
+        @param timestamp: the cache time; default is now
+        @type timestamp: datetime.datetime
+        """
+        if timestamp is None:
+            timestamp = datetime.datetime.now()
+        payload = zlib.compress(
+            pickle.dumps(data, protocol=config.pickle_protocol))
+        self._execute('INSERT OR REPLACE INTO entries '
+                      '(key, description, site, user, timestamp, data) '
+                      'VALUES (?, ?, ?, ?, ?, ?)',
+                      (key, description, site, user,
+                       _format_timestamp(timestamp), sqlite3.Binary(payload)),
+                      commit=True)
+
+    def delete(self, key):
+        """Delete an entry."""
+        self._execute('DELETE FROM entries WHERE key = ?', (key, ),
+                      commit=True)
+
+    def prune(self, before):
+        """Delete all entries cached before the given time.
+
+        @param before: the oldest cache time to keep
+        @type before: datetime.datetime
+        @return: number of deleted entries
+        @rtype: int
+        """
+        with self.lock:
+            cursor = self.connection.execute(
+                'DELETE FROM entries WHERE timestamp < ?',
+                (_format_timestamp(before), ))
+            self.connection.commit()
+            return cursor.rowcount
+
+    def entries(self):
+        """Iterate the index data of all entries.
+
+        @return: tuples of key, description, site, user and cache time
+        """
+        rows = self._execute('SELECT key, description, site, user, timestamp '
+                             'FROM entries ORDER BY timestamp')
+        for key, description, site, user, timestamp in rows:
+            yield key, description, site, user, _parse_timestamp(timestamp)
+
+    def __len__(self):
+        """Return the number of entries."""
+        return self._execute('SELECT COUNT(*) FROM entries')[0][0]
+
+    def close(self):
+        """Close the database connection."""
+        with self.lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,224 @@
+# -*- coding: utf-8  -*-
+"""
+Snapshots of the site information and API parameter information of sites.
+
+A new site needs its namespaces, general site information and the parameter
+information of the API modules before it can make any request. Each of these
+is a separate API request, or a separate entry of the API cache. A snapshot
+keeps all of them in a single file per site, which is read once when the
+site is created.
+"""
+#
+# (C) Pywikibot team, 2015
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import unicode_literals
+
+__version__ = '$Id$'
+
+import atexit
+import datetime
+import os
+import tempfile
+import threading
+import zlib
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+import pywikibot
+from pywikibot import config
+from pywikibot.data import api
+
+_logger = 'data.snapshot'
+
+
+class SiteSnapshot(object):
+
+    """Snapshot of the siteinfo and paraminfo of a site."""
+
+    format_version = 1
+
+    # siteinfo properties which are fetched when the snapshot is refreshed
+    siteinfo_props = ('general', 'namespaces', 'namespacealiases',
+                      'magicwords', 'interwikimap')
+
+    _snapshots = []
+    _snapshots_lock = threading.Lock()
+
+    def __init__(self, site, directory=None):
+        """
+        Constructor.
+
+        @param site: the site of the snapshot
+        @type site: APISite
+        @param directory: the directory of the snapshot files; default is
+            the directory 'snapshots' in the base directory
+        @type directory: basestring
+        """
+        if directory is None:
+            directory = os.path.join(config.base_dir, 'snapshots')
+        self.site = site
+        self.directory = directory
+        self.path = os.path.join(directory, '%s-%s.snapshot'
+                                 % (site.family.name, site.code))
+        self.timestamp = None
+        self.lock = threading.Lock()
+        self._saved_state = None
+
+    @classmethod
+    def attach(cls, site):
+        """Load the snapshot of a site and save it at exit.
+
+        A snapshot older than config.site_snapshot_expiry is refreshed in
+        a background thread, while the site uses the stale data.
+
+        @param site: the site of the snapshot
+        @type site: APISite
+        @rtype: SiteSnapshot
+        """
+        snapshot = cls(site)
+        if (snapshot.load() and
+                snapshot.is_stale(config.site_snapshot_expiry)):
+            snapshot.refresh_in_background()
+        with cls._snapshots_lock:
+            cls._snapshots.append(snapshot)
+        return snapshot
+
+    @classmethod
+    def save_all(cls):
+        """Save the changed snapshots of all attached sites."""
+        with cls._snapshots_lock:
+            snapshots = list(cls._snapshots)
+        for snapshot in snapshots:
+            try:
+                snapshot.save()
+            except Exception as e:
+                pywikibot.warning('Could not save snapshot of %s: %s'
+                                  % (snapshot.site, e))
+
+    def _state(self):
+        """Return the keys of the cached siteinfo and paraminfo."""
+        return (frozenset(self.site._siteinfo._cache),
+                frozenset(self.site._paraminfo._paraminfo))
+
+    def load(self):
+        """Load the snapshot into the site.
+
+        Data the site has already cached is kept.
+
+        @return: whether a snapshot was loaded
+        @rtype: bool
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                data = pickle.loads(zlib.decompress(f.read()))
+        except (IOError, OSError):
+            return False
+        except Exception as e:
+            pywikibot.warning('Could not load snapshot %s: %s'
+                              % (self.path, e))
+            return False
+        if (not isinstance(data, dict) or
+                data.get('version') != self.format_version):
+            pywikibot.log('Ignoring snapshot %s of an older version'
+                          % self.path)
+            return False
+        for key, value in data['siteinfo'].items():
+            self.site._siteinfo._cache.setdefault(key, value)
+        paraminfo = self.site._paraminfo
+        for key, value in data['paraminfo'].items():
+            paraminfo._paraminfo.setdefault(key, value)
+        # ParamInfo.fetch only initialises itself while 'paraminfo' is
+        # missing, so the modules of the snapshot must initialise it
+        if 'paraminfo' in paraminfo._paraminfo:
+            paraminfo._init()
+        self.timestamp = data['timestamp']
+        self._saved_state = self._state()
+        pywikibot.debug('Loaded snapshot of %s from %s'
+                        % (self.site, self.timestamp), _logger)
+        return True
+
+    def is_stale(self, expiry):
+        """Return whether the snapshot is older than expiry.
+
+        @param expiry: the maximum age
+        @type expiry: int/float (days) or L{datetime.timedelta}
+        @rtype: bool
+        """
+        if self.timestamp is None:
+            return True
+        if not isinstance(expiry, datetime.timedelta):
+            expiry = datetime.timedelta(expiry)
+        return self.timestamp + expiry < datetime.datetime.utcnow()
+
+    def save(self, force=False):
+        """Write the snapshot file if the cached data changed.
+
+        @param force: write it even if nothing changed
+        @type force: bool
+        """
+        with self.lock:
+            state = self._state()
+            if not force and state == self._saved_state:
+                return
+            data = {
+                'version': self.format_version,
+                'timestamp': datetime.datetime.utcnow(),
+                'siteinfo': dict(self.site._siteinfo._cache),
+                'paraminfo': dict(self.site._paraminfo._paraminfo),
+            }
+            payload = zlib.compress(
+                pickle.dumps(data, protocol=config.pickle_protocol))
+            if not os.path.exists(self.directory):
+                os.makedirs(self.directory)
+            # write a new file and replace the snapshot, so that other
+            # processes never read a partial file
+            handle, tmp_path = tempfile.mkstemp(dir=self.directory)
+            try:
+                with os.fdopen(handle, 'wb') as f:
+                    f.write(payload)
+                if os.name == 'nt' and os.path.exists(self.path):
+                    os.remove(self.path)
+                os.rename(tmp_path, self.path)
+            except:
+                os.remove(tmp_path)
+                raise
+            self.timestamp = data['timestamp']
+            self._saved_state = state
+
+    def refresh(self):
+        """Fetch the current siteinfo and paraminfo and save the snapshot."""
+        siteinfo = self.site._siteinfo
+        props = set(self.siteinfo_props) | set(siteinfo._cache)
+        siteinfo._cache.update(siteinfo._get_siteinfo(sorted(props), 0))
+        # bypass the API cache like the siteinfo above
+        paraminfo = api.ParamInfo(self.site, expiry=0)
+        paraminfo.fetch(set(self.site._paraminfo._paraminfo))
+        self.site._paraminfo._paraminfo.update(paraminfo._paraminfo)
+        self.save(force=True)
+
+    def _refresh_quietly(self):
+        """Refresh the snapshot, logging any error."""
+        try:
+            self.refresh()
+        except Exception as e:
+            pywikibot.warning('Could not refresh snapshot of %s: %s'
+                              % (self.site, e))
+
+    def refresh_in_background(self):
+        """Refresh the snapshot in a daemon thread.
+
+        @rtype: threading.Thread
+        """
+        thread = threading.Thread(target=self._refresh_quietly,
+                                  name='snapshot-%s' % self.site)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+
+atexit.register(SiteSnapshot.save_all)
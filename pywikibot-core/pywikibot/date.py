@@ -2316,36 +2316,160 @@ def getNumberOfDaysInMonth(month):
     return formatLimits[dayMnthFmts[month - 1]][2] - 1
 
 
+# Matches a number in any of the digits of _digitDecoders
+_reDigitRun = re.compile(u'[%s]+' % u''.join(
+    sorted(set(u''.join(dec[0] for dec in _digitDecoders.values()
+                        if isinstance(dec, tuple))))))
+
+# A map of language code to the index of its formats, see _getFormatIndex
+_formatIndexCache = {}
+
+
+def _getTitleShape(title):
+    """Return the title with every number replaced by '#'."""
+    return _reDigitRun.sub(u'#', title)
+
+
+def _getFormatIndex(lang):
+    """
+    Return the index of the formats of a language.
+
+    The index maps the shape of a formatted value (see _getTitleShape) to
+    the names of the formats producing it, in the order of formats. It is
+    built by formatting the values within the limits of each format and
+    below 200; the shapes of larger values repeat those. Only these formats
+    can decode a title of that shape.
+    """
+    if lang not in _formatIndexCache:
+        index = {}
+        for dictName, dict in formats.items():
+            if lang not in dict:
+                continue
+            predicate, start, stop = formatLimits[dictName]
+            values = set(range(200)) | set(range(start, stop))
+            # the predicate usually allows more values than are tested
+            values.update(value
+                          for value in range(max(0, start - 2000), stop + 2000)
+                          if predicate(value))
+            shapes = set()
+            for value in values:
+                try:
+                    shapes.add(_getTitleShape(dict[lang](value)))
+                except Exception:
+                    pass
+            for shape in shapes:
+                index.setdefault(shape, []).append(dictName)
+        _formatIndexCache[lang] = index
+    return _formatIndexCache[lang]
+
+
 def getAutoFormat(lang, title, ignoreFirstLetterCase=True):
     """
     Return first matching formatted date value.
 
+    Only the formats which can produce a title of that shape are tried,
+    the index of each language is built on its first use.
+
     @param lang: language code
     @param title: value to format
     @return: dictName ('YearBC', 'December', ...) and value (a year, date, ...)
     @rtype: tuple
     """
-    for dictName, dict in formats.items():
+    for dictName in _getFormatIndex(lang).get(_getTitleShape(title), ()):
         try:
-            year = dict[lang](title)
-            return dictName, year
-        except:
+            return dictName, formats[dictName][lang](title)
+        except Exception:
             pass
     # sometimes the title may begin with an upper case while its listed as
     # lower case, or the other way around
     # change case of the first character to the opposite, and try again
-    if ignoreFirstLetterCase:
-        try:
-            if title[0].isupper():
-                title = title[0].lower() + title[1:]
-            else:
-                title = title[0].upper() + title[1:]
-            return getAutoFormat(lang, title, ignoreFirstLetterCase=False)
-        except:
-            pass
+    if ignoreFirstLetterCase and title:
+        if title[0].isupper():
+            title = title[0].lower() + title[1:]
+        else:
+            title = title[0].upper() + title[1:]
+        return getAutoFormat(lang, title, ignoreFirstLetterCase=False)
     return None, None
 
 
+# A map of format name and language code to its FormatTable
+_formatTableCache = {}
+
+
+class FormatTable(object):
+
+    """
+    A format of a language with its values within the limits in a table.
+
+    It is called like the format and formats a value or decodes a string,
+    but for the values within the limits of formatLimits it only looks up
+    the result. The strings are formatted when the table is created, they
+    are decoded on the first call with a string. Other values are passed
+    to the format.
+    """
+
+    def __init__(self, dictName, lang):
+        """
+        Constructor.
+
+        @param dictName: format name ('YearBC', 'December', ...)
+        @param lang: language code
+        """
+        self.dictName = dictName
+        self.lang = lang
+        self.format = formats[dictName][lang]
+        predicate, start, stop = formatLimits[dictName]
+        self.strings = {}
+        for value in range(start, stop):
+            try:
+                self.strings[value] = self.format(value)
+            except Exception:
+                pass
+        self.values = None
+
+    def _decode_all(self):
+        """Return the map of the strings to their values."""
+        values = {}
+        for string in set(self.strings.values()):
+            try:
+                values[string] = self.format(string)
+            except Exception:
+                pass
+        return values
+
+    def __call__(self, value):
+        """Return the formatted value or the value of a string."""
+        if isinstance(value, basestring):
+            if self.values is None:
+                self.values = self._decode_all()
+            if value in self.values:
+                return self.values[value]
+        elif value in self.strings:
+            return self.strings[value]
+        return self.format(value)
+
+    def __repr__(self):
+        return '{0}({1!r}, {2!r})'.format(self.__class__.__name__,
+                                          self.dictName, self.lang)
+
+
+def getFormatTable(dictName, lang):
+    """
+    Return the FormatTable of a format of a language.
+
+    The table is created on the first call. It is worth it when many values
+    of the format are formatted or decoded, e.g. by a page generator.
+
+    @param dictName: format name ('YearBC', 'December', ...)
+    @param lang: language code
+    @rtype: L{FormatTable}
+    """
+    key = (dictName, lang)
+    if key not in _formatTableCache:
+        _formatTableCache[key] = FormatTable(dictName, lang)
+    return _formatTableCache[key]
+
+
 class FormatDate(object):
 
     """Format a date."""
@@ -2356,14 +2480,15 @@ class FormatDate(object):
 
     def __call__(self, m, d):
         """Return a formatted month and day."""
-        return formats['Day_' + enMonthNames[m - 1]][self.site.lang](d)
+        return getFormatTable('Day_' + enMonthNames[m - 1],
+                              self.site.lang)(d)
 
 
 def formatYear(lang, year):
     if year < 0:
-        return formats['YearBC'][lang](-year)
+        return getFormatTable('YearBC', lang)(-year)
     else:
-        return formats['YearAD'][lang](year)
+        return getFormatTable('YearAD', lang)(year)
 
 
 def apply_month_delta(date, month_delta=1, add_overlap=False):
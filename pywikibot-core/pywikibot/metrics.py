@@ -0,0 +1,320 @@
+# -*- coding: utf-8  -*-
+"""
+Statistics about a bot run.
+
+The framework counts API requests by module, HTTP bytes sent and received,
+API cache hits and misses and saved pages, and records the distribution of
+throttle waits, API response times and the time treat() of a bot took for
+a page, in the L{registry}.
+
+The statistics are written as JSON to config.metrics_file when the bot
+exits and when the process receives SIGUSR1; without a file they are
+written to the log on SIGUSR1. The global argument -profile additionally
+profiles the bot, see L{start_profiling}.
+"""
+#
+# (C) Pywikibot team, 2015
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import unicode_literals
+
+__version__ = '$Id$'
+#
+
+import atexit
+import bisect
+import collections
+import json
+import signal
+import sys
+import threading
+import time
+
+if sys.version_info[0] > 2:
+    from io import StringIO
+else:
+    from StringIO import StringIO
+
+import pywikibot
+from pywikibot import config
+from pywikibot.tools import Counter
+
+_logger = "metrics"
+
+
+class Histogram(object):
+
+    """The distribution of values, like durations in seconds."""
+
+    # upper bounds of the buckets; the last bucket holds larger values
+    bounds = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self):
+        """Constructor."""
+        self.buckets = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        """Add a value."""
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def as_dict(self):
+        """Return the counts of the buckets and the summary values."""
+        labels = ['<=%s' % bound for bound in self.bounds]
+        labels.append('>%s' % self.bounds[-1])
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.total / self.count if self.count else 0.0,
+            'max': self.max,
+            'buckets': dict(zip(labels, self.buckets)),
+        }
+
+
+class MetricsRegistry(object):
+
+    """Thread-safe counters and histograms of a bot run."""
+
+    def __init__(self):
+        """Constructor."""
+        self.lock = threading.Lock()
+        # callables returning a dict of statistics kept elsewhere
+        self.sources = {}
+        self.reset()
+
+    def reset(self):
+        """Reset all counters and histograms."""
+        with self.lock:
+            self.start = time.time()
+            self.counters = collections.defaultdict(int)
+            self.histograms = collections.defaultdict(Histogram)
+
+    def increment(self, name, value=1):
+        """Add value to the counter name."""
+        with self.lock:
+            self.counters[name] += value
+
+    def observe(self, name, value):
+        """Add value to the histogram name."""
+        with self.lock:
+            self.histograms[name].observe(value)
+
+    def add_source(self, name, function):
+        """
+        Include the statistics returned by function in the snapshots.
+
+        @param name: the key of the statistics in the snapshot
+        @param function: callable without arguments which returns a dict
+        """
+        self.sources[name] = function
+
+    def as_dict(self):
+        """
+        Return a snapshot of all statistics.
+
+        Besides the counters and histograms it contains the rate of each
+        counter per minute since the registry was reset.
+        """
+        with self.lock:
+            elapsed = time.time() - self.start
+            minutes = elapsed / 60 or 1
+            result = {
+                'elapsed': elapsed,
+                'counters': dict(self.counters),
+                'per_minute': dict((name, value / minutes)
+                                   for name, value in self.counters.items()),
+                'histograms': dict((name, histogram.as_dict())
+                                   for name, histogram
+                                   in self.histograms.items()),
+            }
+        for name, function in list(self.sources.items()):
+            result[name] = function()
+        return result
+
+    def dump(self, filename=None):
+        """
+        Write the snapshot as JSON.
+
+        @param filename: the file to write, default is config.metrics_file;
+            if neither is set, the snapshot is written to the log
+        """
+        filename = filename or config.metrics_file
+        data = json.dumps(self.as_dict(), indent=4, sort_keys=True)
+        if filename:
+            with open(filename, 'w') as f:
+                f.write(data)
+            pywikibot.log('Statistics written to %s' % filename)
+        else:
+            pywikibot.log('Statistics of this run:\n%s' % data)
+
+    def __repr__(self):
+        return '{0}({1!r})'.format(self.__class__.__name__, self.as_dict())
+
+
+registry = MetricsRegistry()
+
+increment = registry.increment
+observe = registry.observe
+
+
+class Timer(object):
+
+    """Context manager adding the seconds its block took to a histogram."""
+
+    def __init__(self, name):
+        """Constructor."""
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        registry.observe(self.name, time.time() - self.start)
+
+
+class Sampler(threading.Thread):
+
+    """
+    Sampling profiler of all threads.
+
+    At regular intervals it counts the function each thread is executing.
+    Other than cProfile it also covers threads like the ones treating pages
+    and saving pages in background.
+    """
+
+    def __init__(self, interval=0.005):
+        """
+        Constructor.
+
+        @param interval: the seconds between two samples
+        @type interval: float
+        """
+        super(Sampler, self).__init__(name='Sampler')
+        self.setDaemon(True)
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        self.samples = 0
+        self.counts = Counter()
+
+    def run(self):
+        """Take samples until stopped."""
+        while True:
+            # Event.wait() returns None in Python 2.6
+            self.stopped.wait(self.interval)
+            if self.stopped.is_set():
+                break
+            frames = sys._current_frames()
+            with self.lock:
+                for thread_id, frame in frames.items():
+                    if thread_id == self.ident:
+                        continue
+                    code = frame.f_code
+                    self.counts['%s:%d(%s)' % (code.co_filename,
+                                               code.co_firstlineno,
+                                               code.co_name)] += 1
+                self.samples += 1
+
+    def stop(self):
+        """Stop taking samples."""
+        self.stopped.set()
+        self.join()
+
+    def most_common(self, count=30):
+        """Return the most frequent functions and their number of samples."""
+        with self.lock:
+            return self.counts.most_common(count)
+
+    def as_dict(self):
+        """Return the number of samples of the most frequent functions."""
+        return {
+            'samples': self.samples,
+            'interval': self.interval,
+            'functions': dict(self.most_common()),
+        }
+
+
+_profiler = None
+
+
+def start_profiling(mode='cprofile', filename=None):
+    """
+    Profile the rest of the run.
+
+    With mode 'cprofile' the calling thread is profiled using cProfile and
+    the statistics are written to filename at exit. With mode 'sample' all
+    threads are sampled and the most frequent functions are added to the
+    statistics in the registry. In both modes a summary is written to the
+    log at exit.
+
+    @param mode: 'cprofile' or 'sample'
+    @param filename: the file of the cProfile statistics
+    """
+    global _profiler
+    if _profiler is not None:
+        return
+    if mode == 'sample':
+        _profiler = Sampler()
+        _profiler.start()
+        registry.add_source('profile', _profiler.as_dict)
+    elif mode == 'cprofile':
+        import cProfile
+        _profiler = cProfile.Profile()
+        _profiler.filename = filename
+        _profiler.enable()
+    else:
+        raise ValueError('Unknown profiling mode %r' % mode)
+
+
+def stop_profiling():
+    """Stop the profiler and write its results."""
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if isinstance(profiler, Sampler):
+        profiler.stop()
+        pywikibot.log('Most frequently sampled functions:\n%s'
+                      % '\n'.join('%8d %s' % (count, name) for name, count
+                                  in profiler.most_common()))
+    elif profiler is not None:
+        import pstats
+        profiler.disable()
+        if profiler.filename:
+            profiler.dump_stats(profiler.filename)
+            pywikibot.log('Profile written to %s' % profiler.filename)
+        stream = StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats(
+            'cumulative').print_stats(30)
+        pywikibot.log(stream.getvalue())
+
+
+def install_signal_handler():
+    """Dump the statistics when the process receives SIGUSR1.
+
+    It must be called from the main thread. Platforms without SIGUSR1 are
+    ignored. The statistics are dumped in a new thread, because the main
+    thread may hold the lock of the registry when the signal arrives.
+    """
+    def handler(signum, frame):
+        thread = threading.Thread(target=registry.dump, name='MetricsDump')
+        thread.setDaemon(True)
+        thread.start()
+
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, handler)
+
+
+def _at_exit():
+    stop_profiling()
+    if config.metrics_file:
+        registry.dump()
+
+
+atexit.register(_at_exit)
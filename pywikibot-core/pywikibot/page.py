@@ -40,7 +40,7 @@ else:
 
 import pywikibot
 
-from pywikibot import config
+from pywikibot import config, metrics
 from pywikibot.comms import http
 from pywikibot.family import Family
 from pywikibot.site import Namespace
@@ -127,6 +127,7 @@ class BasePage(UnicodeMixin, ComparableMixin):
                 # overwrite title
                 self._link = Link(title, source=source.site,
                                   defaultNamespace=ns)
+                self.__dict__.pop('_hash', None)
         elif isinstance(source, Link):
             self._link = source
             self._revisions = {}
@@ -291,10 +292,14 @@ class BasePage(UnicodeMixin, ComparableMixin):
         """
         A stable identifier to be used as a key in hash-tables.
 
-        This relies on the fact that the string
-        representation of an instance can not change after the construction.
+        It is computed once from the comparison key, as the site, namespace
+        and title of a page can not change after the construction.
         """
-        return hash(unicode(self))
+        try:
+            return self._hash
+        except AttributeError:
+            self._hash = hash(self._cmpkey())
+            return self._hash
 
     def full_url(self):
         """Return the full URL."""
@@ -471,6 +476,14 @@ class BasePage(UnicodeMixin, ComparableMixin):
         if hasattr(self, "_text"):
             del self._text
 
+    def _text_index(self):
+        """Return the L{textlib.WikitextIndex} of the current text."""
+        text = self.text
+        index = getattr(self, '_wikitext_index', None)
+        if index is None or index.text is not text:
+            index = self._wikitext_index = textlib.WikitextIndex(text)
+        return index
+
     def preloadText(self):
         """The text returned by EditFormPreloadText.
 
@@ -1020,6 +1033,9 @@ class BasePage(UnicodeMixin, ComparableMixin):
             if the page was saved successfully. The callback is intended for
             use by bots that need to keep track of which saves were
             successful.
+        @return: if async, the future of the save, which is done when the
+            requests to the site queued before it are done
+        @rtype: L{pywikibot.savequeue.SaveFuture} or None
 
         """
         if not comment:
@@ -1034,9 +1050,9 @@ class BasePage(UnicodeMixin, ComparableMixin):
             raise pywikibot.OtherPageSaveError(
                 self, "Editing restricted by {{bots}} template")
         if async:
-            pywikibot.async_request(self._save, comment=comment, minor=minor,
-                                    watchval=watchval, botflag=botflag,
-                                    async=async, callback=callback, **kwargs)
+            return pywikibot.async_request(
+                self._save, comment=comment, minor=minor, watchval=watchval,
+                botflag=botflag, async=async, callback=callback, **kwargs)
         else:
             self._save(comment=comment, minor=minor, watchval=watchval,
                        botflag=botflag, async=async, callback=callback,
@@ -1056,6 +1072,7 @@ class BasePage(UnicodeMixin, ComparableMixin):
                 pywikibot.warning(u"Page %s not saved" % link)
                 raise pywikibot.PageNotSaved(self)
             else:
+                metrics.increment('page.saves')
                 pywikibot.output(u"Page %s saved" % link)
         # TODO: other "expected" error types to catch?
         except pywikibot.Error as err:
@@ -1119,9 +1136,9 @@ class BasePage(UnicodeMixin, ComparableMixin):
 
         """
         self.text = newtext
-        self.save(comment=comment, watch=watchArticle, minor=minorEdit,
-                  botflag=botflag, force=force, async=async, callback=callback,
-                  **kwargs)
+        return self.save(comment=comment, watch=watchArticle,
+                         minor=minorEdit, botflag=botflag, force=force,
+                         async=async, callback=callback, **kwargs)
 
     def put_async(self, newtext, comment=u'', watchArticle=None,
                   minorEdit=True, botflag=None, force=False, callback=None,
@@ -1134,9 +1151,9 @@ class BasePage(UnicodeMixin, ComparableMixin):
         backwards-compatibility.
 
         """
-        self.put(newtext, comment=comment, watchArticle=watchArticle,
-                 minorEdit=minorEdit, botflag=botflag, force=force, async=True,
-                 callback=callback, **kwargs)
+        return self.put(newtext, comment=comment, watchArticle=watchArticle,
+                        minorEdit=minorEdit, botflag=botflag, force=force,
+                        async=True, callback=callback, **kwargs)
 
     def watch(self, unwatch=False):
         """Add or remove this page to/from bot account's watchlist.
@@ -1192,12 +1209,10 @@ class BasePage(UnicodeMixin, ComparableMixin):
         # This function does not exist in the API, so it has to be
         # implemented by screen-scraping
         if expand:
-            text = self.expand_text()
+            index = textlib.WikitextIndex(self.expand_text())
         else:
-            text = self.text
-        for linkmatch in pywikibot.link_regex.finditer(
-                textlib.removeDisabledParts(text)):
-            linktitle = linkmatch.group("title")
+            index = self._text_index()
+        for start, end, linktitle, label in index.links:
             link = Link(linktitle, self.site)
             # only yield links that are to a different site and that
             # are not language links
@@ -1759,7 +1774,7 @@ class BasePage(UnicodeMixin, ComparableMixin):
         # get list of Category objects the article is in and remove possible
         # duplicates
         cats = []
-        for cat in textlib.getCategoryLinks(self.text, site=self.site,
+        for cat in textlib.getCategoryLinks(self._text_index(), site=self.site,
                                             include=include):
             if cat not in cats:
                 cats.append(cat)
@@ -1906,7 +1921,7 @@ class Page(BasePage):
         # WARNING: may not return all templates used in particularly
         # intricate cases such as template substitution
         titles = list(t.title() for t in self.templates())
-        templates = textlib.extract_templates_and_params(self.text)
+        templates = textlib.extract_templates_and_params(self._text_index())
         # backwards-compatibility: convert the dict returned as the second
         # element into a list in the format used by old scripts
         result = []
@@ -3427,6 +3442,14 @@ class ItemPage(WikibasePage):
 
         return super(ItemPage, self).title(**kwargs)
 
+    def __hash__(self):
+        """
+        A hash of the current ID to be used as a key in hash-tables.
+
+        It is not cached, as the title changes when the ID is set.
+        """
+        return hash(self._cmpkey())
+
     @classmethod
     def fromPage(cls, page, lazy_load=False):
         """
@@ -4306,6 +4329,69 @@ class FileInfo(DotReadableDict):
         return self.__dict__ == other.__dict__
 
 
+class PageRef(ComparableMixin):
+
+    """A compact reference to a page.
+
+    It only holds the site, namespace and title of a page and has no
+    instance dictionary, so it uses a fraction of the memory of a Page.
+    It is equal to and has the same hash as the Page with the same site,
+    namespace and title, so both can be mixed in sets and as dict keys.
+    """
+
+    __slots__ = ('site', 'namespace', 'title', '_hash')
+
+    def __init__(self, site, title, ns=0):
+        """
+        Constructor.
+
+        @param site: the site of the page
+        @type site: BaseSite
+        @param title: normalized title of the page, including the namespace
+            prefix and the section if any, as returned by Page.title()
+        @type title: unicode
+        @param ns: namespace number
+        @type ns: int
+        """
+        self.site = site
+        self.title = title
+        self.namespace = ns
+        self._hash = None
+
+    @classmethod
+    def fromPage(cls, page):
+        """
+        Create a reference to a Page.
+
+        @param page: the page
+        @type page: Page
+        @rtype: PageRef
+        """
+        return cls(page.site, page.title(), page.namespace())
+
+    def page(self):
+        """Return the Page this refers to.
+
+        @rtype: Page
+        """
+        return Page(self.site, self.title, self.namespace)
+
+    def _cmpkey(self):
+        """Key for comparison, the same as for Page objects."""
+        return (self.site, self.namespace, self.title)
+
+    def __hash__(self):
+        """A stable identifier to be used as a key in hash-tables."""
+        if self._hash is None:
+            self._hash = hash(self._cmpkey())
+        return self._hash
+
+    def __repr__(self):
+        """Return a more complete string representation."""
+        return str('PageRef({0!r}, {1!r}, {2})').format(
+            self.site, self.title, self.namespace)
+
+
 class Link(ComparableMixin):
 
     """A MediaWiki link (local or interwiki).
@@ -4363,14 +4449,19 @@ class Link(ComparableMixin):
         else:
             self._anchor = None
 
-        # Convert URL-encoded characters to unicode
-        encodings = [self._source.encoding()] + list(self._source.encodings())
-
-        self._text = url2unicode(self._text, encodings=encodings)
+        # Convert URL-encoded characters to unicode; unicode text without
+        # percent signs is returned unchanged, so skip it
+        if '%' in self._text or not isinstance(self._text, unicode):
+            encodings = ([self._source.encoding()] +
+                         list(self._source.encodings()))
+            self._text = url2unicode(self._text, encodings=encodings)
 
         # Clean up the name, it can come from anywhere.
-        # Convert HTML entities to unicode
-        t = html2unicode(self._text)
+        # Convert HTML entities to unicode, if there might be any
+        if '&' in self._text:
+            t = html2unicode(self._text)
+        else:
+            t = self._text
 
         # Normalize unicode string to a NFC (composed) format to allow
         # proper string comparisons. According to
@@ -40,10 +40,12 @@ from pywikibot.tools import (
     deprecated_args,
     DequeGenerator,
     intersect_generators,
+    prefetch_map,
 )
 from pywikibot.comms import http
 from pywikibot.data import wikidataquery as wdquery
 from pywikibot.exceptions import ArgumentDeprecationWarning
+from pywikibot.page import PageRef
 from pywikibot.site import Namespace
 
 if sys.version_info[0] > 2:
@@ -1255,10 +1257,12 @@ def RedirectFilterPageGenerator(generator, no_redirects=True,
 
 def DuplicateFilterPageGenerator(generator):
     """Yield all unique pages from another generator, omitting duplicates."""
-    seenPages = {}
+    # Only compact references are kept, which compare equal to the pages,
+    # so the yielded pages and their contents can be freed.
+    seenPages = set()
     for page in generator:
         if page not in seenPages:
-            seenPages[page] = True
+            seenPages.add(PageRef.fromPage(page))
             yield page
 
 
@@ -1561,14 +1565,54 @@ def RepeatingGenerator(generator, key_func=lambda x: x, sleep_duration=60,
 
 
 @deprecated_args(pageNumber="step", lookahead=None)
-def PreloadingGenerator(generator, step=50):
+def PreloadingGenerator(generator, step=50, prefetch=0):
     """
     Yield preloaded pages taken from another generator.
 
     @param generator: pages to iterate over
     @param step: how many pages to preload at once
     @type step: int
+    @param prefetch: how many groups of step pages are retrieved in
+        background threads while the current group is being processed
+    @type prefetch: int
+    """
+    groups = _preloading_groups(generator, step)
+    if prefetch > 0:
+        def preload(group):
+            site, pages = group
+            return list(site.preloadpages(pages, step))
+
+        for pages in prefetch_map(preload, groups, prefetch):
+            for page in pages:
+                yield page
+    else:
+        for site, pages in groups:
+            for page in site.preloadpages(pages, step):
+                yield page
+
+
+def PropertyPreloadingGenerator(generator, props, step=50):
     """
+    Yield pages taken from another generator with properties loaded.
+
+    The properties of up to step pages are loaded by one request, instead of
+    one request per page when e.g. Page.coordinates or Page.properties are
+    called.
+
+    @param generator: pages to iterate over
+    @param props: property names to load, e.g. 'info', 'pageprops' or
+        'coordinates'
+    @type props: iterable of str
+    @param step: how many pages to load at once
+    @type step: int
+    """
+    for site, pages in _preloading_groups(generator, step):
+        for page in site.preloadproperties(pages, props, step):
+            yield page
+
+
+def _preloading_groups(generator, step):
+    """Yield tuples of site and up to step pages of that site."""
     # pages may be on more than one site, for example if an interwiki
     # generator is used, so use a separate preloader for each site
     sites = {}
@@ -1580,13 +1624,11 @@ def PreloadingGenerator(generator, step=50):
             # if this site is at the step, process it
             group = sites[site]
             sites[site] = []
-            for i in site.preloadpages(group, step):
-                yield i
+            yield site, group
     for site in sites:
         if sites[site]:
             # process any leftover sites that never reached the step
-            for i in site.preloadpages(sites[site], step):
-                yield i
+            yield site, sites[site]
 
 
 def DequePreloadingGenerator(generator, step=50):
@@ -0,0 +1,302 @@
+# -*- coding: utf-8  -*-
+"""
+Background execution of page saves and other requests.
+
+Each site has its own worker thread, a lane, with a bounded queue. The
+requests of a site are executed in the order they were submitted, so the
+edits of a page are saved in order, while the lanes of different sites run
+independently and only wait for the write throttle of their own site.
+"""
+#
+# (C) Pywikibot team, 2015
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import unicode_literals
+
+__version__ = '$Id$'
+#
+
+import sys
+import threading
+import time
+
+if sys.version_info[0] > 2:
+    from queue import Queue
+else:
+    from Queue import Queue
+
+import pywikibot
+from pywikibot import config
+
+_logger = "wiki.savequeue"
+
+
+class SaveFuture(object):
+
+    """The pending result of a request submitted to a L{SaveExecutor}."""
+
+    def __init__(self):
+        """Constructor."""
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self._result = None
+        self._exception = None
+
+    def done(self):
+        """Return True if the request was executed."""
+        return self._event.is_set()
+
+    def result(self, timeout=None):
+        """
+        Wait for the request and return its result.
+
+        @param timeout: the number of seconds to wait, None to wait until
+            the request is executed
+        @raises RuntimeError: the request didn't finish within timeout
+        @raises Exception: the exception raised by the request
+        """
+        exception = self.exception(timeout)
+        if exception is not None:
+            raise exception
+        return self._result
+
+    def exception(self, timeout=None):
+        """
+        Wait for the request and return the exception it raised.
+
+        @param timeout: the number of seconds to wait, None to wait until
+            the request is executed
+        @return: the exception or None if the request succeeded
+        @raises RuntimeError: the request didn't finish within timeout
+        """
+        if not self._event.wait(timeout) and not self._event.is_set():
+            raise RuntimeError('The request did not finish within %s seconds'
+                               % timeout)
+        return self._exception
+
+    def add_done_callback(self, callback):
+        """
+        Call callback with this future when the request was executed.
+
+        If the request already was executed, callback is called immediately.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def _set(self, result, exception):
+        """Store the outcome of the request and run the callbacks."""
+        with self._lock:
+            self._result = result
+            self._exception = exception
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception:
+                pywikibot.error('Callback of a background request failed',
+                                exc_info=True)
+
+
+class _Lane(object):
+
+    """The worker thread and queue of the requests to one site."""
+
+    # weight of the latest latency in the average
+    smoothing = 0.3
+
+    def __init__(self, key, maxsize):
+        """Constructor."""
+        self.key = key
+        self.queue = Queue(maxsize)
+        self.lock = threading.Lock()
+        # submitted requests which are not done yet
+        self.pending = 0
+        # moving average of the seconds a request took, None before the first
+        self.latency = None
+        self.thread = threading.Thread(target=self.run)
+        self.thread.setName('Put-Thread-%s' % (key,) if key else 'Put-Thread')
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def submit(self, future, request, args, kwargs):
+        """Queue a request, waiting while the queue is full."""
+        with self.lock:
+            self.pending += 1
+        self.queue.put((future, request, args, kwargs))
+
+    def stop(self):
+        """Let the thread end after the queued requests."""
+        self.queue.put(None)
+
+    def run(self):
+        """Execute the queued requests until stopped."""
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            future, request, args, kwargs = item
+            start = time.time()
+            result = exception = None
+            try:
+                result = request(*args, **kwargs)
+            except Exception as e:
+                exception = e
+                pywikibot.error('Background request %r failed: %s'
+                                % (request, e), exc_info=True)
+            elapsed = time.time() - start
+            with self.lock:
+                self.pending -= 1
+                if self.latency is None:
+                    self.latency = elapsed
+                else:
+                    self.latency += self.smoothing * (elapsed - self.latency)
+            future._set(result, exception)
+
+    def eta(self):
+        """Return the estimated seconds to execute the pending requests."""
+        with self.lock:
+            latency = self.latency
+            if latency is None:
+                latency = config.put_throttle
+            return self.pending * latency
+
+
+class SaveExecutor(object):
+
+    """
+    Execute requests in background threads, one per site.
+
+    The site of a request is the site of the object of a bound method, like
+    L{Page._save}. Other requests share a lane without a site. Submitting
+    waits while the lane already holds maxsize requests.
+    """
+
+    def __init__(self, maxsize=None):
+        """
+        Constructor.
+
+        @param maxsize: the number of queued requests of a lane, default
+            config.max_queue_size; if <= 0, the queues are unbounded
+        @type maxsize: int
+        """
+        self.maxsize = config.max_queue_size if maxsize is None else maxsize
+        self._lanes = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def lane_key(request):
+        """Return the site whose lane executes request or None."""
+        return getattr(getattr(request, '__self__', None), 'site', None)
+
+    def submit(self, request, *args, **kwargs):
+        """
+        Queue a call of request with the arguments.
+
+        @return: the future of the result of the request
+        @rtype: L{SaveFuture}
+        """
+        key = self.lane_key(request)
+        with self._lock:
+            lane = self._lanes.get(key)
+            if lane is None or not lane.thread.is_alive():
+                lane = self._lanes[key] = _Lane(key, self.maxsize)
+        future = SaveFuture()
+        lane.submit(future, request, args, kwargs)
+        return future
+
+    def _lane_list(self, site=None):
+        with self._lock:
+            if site is None:
+                return list(self._lanes.values())
+            return [self._lanes[site]] if site in self._lanes else []
+
+    def pending(self, site=None):
+        """
+        Return the number of requests which are not done yet.
+
+        @param site: only count the requests to this site
+        """
+        return sum(lane.pending for lane in self._lane_list(site))
+
+    def full(self, site=None):
+        """
+        Return True if submitting a request for site would wait.
+
+        @param site: the site of the lane, None for the lane without a site
+        """
+        with self._lock:
+            lane = self._lanes.get(site)
+        return lane is not None and lane.queue.full()
+
+    def eta(self, site=None):
+        """
+        Return the estimated seconds until the pending requests are done.
+
+        The estimate of each lane is based on the average time the recent
+        requests took, as the lanes run in parallel the longest estimate is
+        returned.
+
+        @param site: only estimate the requests to this site
+        @rtype: float
+        """
+        return max([lane.eta() for lane in self._lane_list(site)] or [0])
+
+    def shutdown(self):
+        """Stop the threads when their queued requests are done."""
+        for lane in self._lane_list():
+            lane.stop()
+
+    def join(self, timeout=None):
+        """
+        Wait until the threads are stopped.
+
+        @param timeout: the number of seconds to wait at most
+        @return: True if all threads are stopped
+        @rtype: bool
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        for lane in self._lane_list():
+            if deadline is None:
+                lane.thread.join()
+            else:
+                lane.thread.join(max(0, deadline - time.time()))
+        return not any(lane.thread.is_alive() for lane in self._lane_list())
+
+
+class _PutQueue(object):
+
+    """
+    The old page_put_queue interface on top of a L{SaveExecutor}.
+
+    Items are (request, args, kwargs) tuples; the (None, [], {}) item
+    which stopped the old put thread is ignored, as stopme() shuts the
+    executor down.
+    """
+
+    def __init__(self, executor):
+        """Constructor."""
+        self._executor = executor
+
+    def put(self, item, block=True, timeout=None):
+        """Submit the request of item to the executor."""
+        request, args, kwargs = item
+        if request is not None:
+            self._executor.submit(request, *args, **kwargs)
+
+    def qsize(self):
+        """Return the number of requests which are not done yet."""
+        return self._executor.pending()
+
+    def empty(self):
+        """Return True if all requests are done."""
+        return not self._executor.pending()
+
+    def full(self):
+        """Return True if submitting a request without a site would wait."""
+        return self._executor.full()
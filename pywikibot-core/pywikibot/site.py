@@ -32,13 +32,14 @@ from warnings import warn
 import pywikibot
 import pywikibot.family
 from pywikibot.tools import (
-    itergroup, UnicodeMixin, ComparableMixin, SelfCallDict, SelfCallString,
-    deprecated, deprecate_arg, deprecated_args, remove_last_args,
+    itergroup, prefetch_map, UnicodeMixin, ComparableMixin, SelfCallDict,
+    SelfCallString, deprecated, deprecate_arg, deprecated_args, remove_last_args,
     redirect_func, manage_wrapping, MediaWikiVersion, normalize_username,
 )
 from pywikibot.tools.ip import is_IP
 from pywikibot.throttle import Throttle
 from pywikibot.data import api
+from pywikibot.data.snapshot import SiteSnapshot
 from pywikibot.exceptions import (
     Error,
     PageRelatedError,
@@ -763,7 +764,29 @@ class BaseSite(ComparableMixin):
         @return: The matching Namespace object on this Site
         @rtype: Namespace, or None if invalid
         """
-        return Namespace.lookup_name(namespace, self.namespaces)
+        name = Namespace.normalize_name(namespace)
+        if name is False:
+            return None
+        return self._namespace_names().get(name.lower())
+
+    def _namespace_names(self):
+        """
+        Return a dict of the lowercase names and aliases of all namespaces.
+
+        It gives the same result as L{Namespace.lookup_name} with a single
+        lookup, and is rebuilt when the namespaces of the site are replaced.
+
+        @rtype: dict of Namespace
+        """
+        namespaces = self.namespaces
+        if getattr(self, '_namespace_names_of', None) is not namespaces:
+            names = {}
+            for namespace in namespaces.values():
+                for name in namespace._distinct():
+                    names.setdefault(name.lower(), namespace)
+            self._namespace_names_cache = names
+            self._namespace_names_of = namespaces
+        return self._namespace_names_cache
 
     # for backwards-compatibility
     getNamespaceIndex = redirect_func(ns_index, old_name='getNamespaceIndex',
@@ -1502,12 +1525,15 @@ class APISite(BaseSite):
         self._loginstatus = LoginStatus.NOT_ATTEMPTED
         self._siteinfo = Siteinfo(self)
         self._paraminfo = api.ParamInfo(self)
+        if pywikibot.config.site_snapshots:
+            self._snapshot = SiteSnapshot.attach(self)
         self.tokens = TokenWallet(self)
 
     def __getstate__(self):
         """Remove TokenWallet before pickling, for security reasons."""
         new = super(APISite, self).__getstate__()
         del new['tokens']
+        new.pop('_snapshot', None)
         return new
 
     def __setstate__(self, attrs):
@@ -2326,39 +2352,31 @@ class APISite(BaseSite):
                 continue
             api.update_page(page, pageitem, query.props)
 
+    def _load_properties(self, page, prop, **parameters):
+        """Load a property of one page using L{api.PropertyBatcher}.
+
+        @param parameters: request parameters of the property overriding
+            L{api.PropertyBatcher.default_parameters}
+        """
+        batcher = api.PropertyBatcher(
+            self, [prop], parameters={prop: parameters} if parameters else None)
+        batcher.add(page)
+        batcher.flush()
+
     def loadpageinfo(self, page, preload=False):
         """Load page info from api and store in page attributes."""
-        title = page.title(withSection=False)
-        inprop = 'protection'
         if preload:
-            inprop += '|preload'
-
-        query = self._generator(api.PropertyGenerator,
-                                type_arg="info",
-                                titles=title.encode(self.encoding()),
-                                inprop=inprop)
-        self._update_page(page, query, 'loadpageinfo')
+            self._load_properties(page, 'info', inprop='protection|preload')
+        else:
+            self._load_properties(page, 'info')
 
     def loadcoordinfo(self, page):
         """Load [[mw:Extension:GeoData]] info."""
-        title = page.title(withSection=False)
-        query = self._generator(api.PropertyGenerator,
-                                type_arg="coordinates",
-                                titles=title.encode(self.encoding()),
-                                coprop=['type', 'name', 'dim',
-                                        'country', 'region',
-                                        'globe'],
-                                coprimary='all')
-        self._update_page(page, query, 'loadcoordinfo')
+        self._load_properties(page, 'coordinates')
 
     def loadpageprops(self, page):
         """Load page props for the given page."""
-        title = page.title(withSection=False)
-        query = self._generator(api.PropertyGenerator,
-                                type_arg="pageprops",
-                                titles=title.encode(self.encoding()),
-                                )
-        self._update_page(page, query, 'loadpageprops')
+        self._load_properties(page, 'pageprops')
 
     def loadimageinfo(self, page, history=False):
         """Load image info from api and save in page attributes.
@@ -2396,6 +2414,29 @@ class APISite(BaseSite):
         return (pageitem['imageinfo']
                 if history else pageitem['imageinfo'][0])
 
+    def preloadproperties(self, pagelist, props=('info', ), groupsize=None):
+        """Return a generator of pages with properties loaded in bulk.
+
+        Instead of one request per page and property, like L{loadpageinfo},
+        L{loadpageprops} or L{loadcoordinfo}, the properties of up to
+        groupsize pages are loaded by one request. Pages without coordinates
+        or page props are marked as such and are not queried again.
+
+        @param pagelist: an iterable that returns Page objects of this site
+        @param props: property names to load, e.g. 'info', 'pageprops',
+            'coordinates' or 'imageinfo'
+        @type props: iterable of str
+        @param groupsize: how many Pages to query at a time; default is the
+            maximum number of titles allowed by the API
+        @type groupsize: int
+        """
+        batcher = api.PropertyBatcher(self, props, groupsize)
+        for page in pagelist:
+            for loaded in batcher.add(page):
+                yield loaded
+        for loaded in batcher.flush():
+            yield loaded
+
     @deprecated('Check the content model instead')
     def loadflowinfo(self, page):
         """
@@ -2540,7 +2581,7 @@ class APISite(BaseSite):
         return page._redirtarget
 
     def preloadpages(self, pagelist, groupsize=50, templates=False,
-                     langlinks=False):
+                     langlinks=False, prefetch=0, ordered=True):
         """Return a generator to a list of preloaded pages.
 
         Note that [at least in current implementation] pages may be iterated
@@ -2551,56 +2592,77 @@ class APISite(BaseSite):
         @type groupsize: int
         @param templates: preload list of templates in the pages
         @param langlinks: preload list of language links found in the pages
-
-        """
-        for sublist in itergroup(pagelist, groupsize):
-            pageids = [str(p._pageid) for p in sublist
-                       if hasattr(p, "_pageid") and p._pageid > 0]
-            cache = dict((p.title(withSection=False), p) for p in sublist)
-
-            props = "revisions|info|categoryinfo"
-            if templates:
-                props += '|templates'
-            if langlinks:
-                props += '|langlinks'
-            rvgen = api.PropertyGenerator(props, site=self)
-            rvgen.set_maximum_items(-1)  # suppress use of "rvlimit" parameter
-            if len(pageids) == len(sublist):
-                # only use pageids if all pages have them
-                rvgen.request["pageids"] = "|".join(pageids)
-            else:
-                rvgen.request["titles"] = "|".join(list(cache.keys()))
-            rvgen.request[u"rvprop"] = u"ids|flags|timestamp|user|comment|content"
-            pywikibot.output(u"Retrieving %s pages from %s."
-                             % (len(cache), self))
-            for pagedata in rvgen:
-                pywikibot.debug(u"Preloading %s" % pagedata, _logger)
-                try:
-                    if pagedata['title'] not in cache:
-                        # API always returns a "normalized" title which is
-                        # usually the same as the canonical form returned by
-                        # page.title(), but sometimes not (e.g.,
-                        # gender-specific localizations of "User" namespace).
-                        # This checks to see if there is a normalized title in
-                        # the response that corresponds to the canonical form
-                        # used in the query.
-                        for key in cache:
-                            if self.sametitle(key, pagedata['title']):
-                                cache[pagedata['title']] = cache[key]
-                                break
-                        else:
-                            pywikibot.warning(
-                                u"preloadpages: Query returned unexpected "
-                                u"title '%s'" % pagedata['title'])
-                            continue
-                except KeyError:
-                    pywikibot.debug(u"No 'title' in %s" % pagedata, _logger)
-                    pywikibot.debug(u"pageids=%s" % pageids, _logger)
-                    pywikibot.debug(u"titles=%s" % list(cache.keys()), _logger)
-                    continue
-                page = cache[pagedata['title']]
-                api.update_page(page, pagedata, rvgen.props)
-                yield page
+        @param prefetch: how many groups are retrieved in background threads
+            while the current group is being processed. If 0, every group is
+            retrieved when it is needed.
+        @type prefetch: int
+        @param ordered: when prefetching, yield the groups in the order of
+            pagelist instead of the order they have been retrieved in
+        @type ordered: bool
+
+        """
+        groups = itergroup(pagelist, groupsize)
+        if prefetch > 0:
+            def preload(sublist):
+                return list(self._preloadgroup(sublist, templates, langlinks))
+
+            for group in prefetch_map(preload, groups, prefetch, ordered):
+                for page in group:
+                    yield page
+        else:
+            for sublist in groups:
+                for page in self._preloadgroup(sublist, templates, langlinks):
+                    yield page
+
+    def _preloadgroup(self, sublist, templates=False, langlinks=False):
+        """Retrieve and yield one group of preloaded pages."""
+        pageids = [str(p._pageid) for p in sublist
+                   if hasattr(p, "_pageid") and p._pageid > 0]
+        cache = dict((p.title(withSection=False), p) for p in sublist)
+
+        props = "revisions|info|categoryinfo"
+        if templates:
+            props += '|templates'
+        if langlinks:
+            props += '|langlinks'
+        rvgen = api.PropertyGenerator(props, site=self)
+        rvgen.set_maximum_items(-1)  # suppress use of "rvlimit" parameter
+        if len(pageids) == len(sublist):
+            # only use pageids if all pages have them
+            rvgen.request["pageids"] = "|".join(pageids)
+        else:
+            rvgen.request["titles"] = "|".join(list(cache.keys()))
+        rvgen.request[u"rvprop"] = u"ids|flags|timestamp|user|comment|content"
+        pywikibot.output(u"Retrieving %s pages from %s."
+                         % (len(cache), self))
+        for pagedata in rvgen:
+            pywikibot.debug(u"Preloading %s", _logger, args=(pagedata,))
+            try:
+                if pagedata['title'] not in cache:
+                    # API always returns a "normalized" title which is
+                    # usually the same as the canonical form returned by
+                    # page.title(), but sometimes not (e.g.,
+                    # gender-specific localizations of "User" namespace).
+                    # This checks to see if there is a normalized title in
+                    # the response that corresponds to the canonical form
+                    # used in the query.
+                    for key in cache:
+                        if self.sametitle(key, pagedata['title']):
+                            cache[pagedata['title']] = cache[key]
+                            break
+                    else:
+                        pywikibot.warning(
+                            u"preloadpages: Query returned unexpected "
+                            u"title '%s'" % pagedata['title'])
+                        continue
+            except KeyError:
+                pywikibot.debug(u"No 'title' in %s", _logger, args=(pagedata,))
+                pywikibot.debug(u"pageids=%s", _logger, args=(pageids,))
+                pywikibot.debug(u"titles=%s", _logger, args=(list(cache),))
+                continue
+            page = cache[pagedata['title']]
+            api.update_page(page, pagedata, rvgen.props)
+            yield page
 
     def validate_tokens(self, types):
         """Validate if requested tokens are acceptable.
@@ -16,8 +16,13 @@ from __future__ import unicode_literals
 __version__ = '$Id$'
 #
 
+import bisect
+import copy
 import datetime
+import multiprocessing
 import re
+import sre_constants
+import sre_parse
 import sys
 
 if sys.version_info[0] > 2:
@@ -31,7 +36,7 @@ import pywikibot
 
 from pywikibot import config2 as config
 from pywikibot.family import Family
-from pywikibot.tools import OrderedDict
+from pywikibot.tools import OrderedDict, manage_wrapping
 
 TEMP_REGEX = re.compile(
     r'{{(?:msg:)?(?P<name>[^{\|]+?)(?:\|(?P<params>[^{]+?(?:{[^{]+?}[^{]*?)?))?}}')
@@ -79,33 +84,37 @@ def unescape(s):
     return s
 
 
-def replaceExcept(text, old, new, exceptions, caseInsensitive=False,
-                  allowoverlap=False, marker='', site=None):
-    """
-    Return text with 'old' replaced by 'new', ignoring specified types of text.
+# Regular expressions of replaceExcept which depend on the site, per site
+_site_exception_regexes = {}
 
-    Skips occurrences of 'old' within exceptions; e.g., within nowiki tags or
-    HTML comments. If caseInsensitive is true, then use case insensitive
-    regex matching. If allowoverlap is true, overlapping occurrences are all
-    replaced (watch out when using this, it might lead to infinite loops!).
+# Regular expressions of other tags, e.g. nowiki or math
+_tag_exception_regexes = {}
 
-    @type text: unicode
-    @param old: a compiled or uncompiled regular expression
-    @param new: a unicode string (which can contain regular
-        expression references), or a function which takes
-        a match object as parameter. See parameter repl of
-        re.sub().
-    @param exceptions: a list of strings which signal what to leave out,
-        e.g. ['math', 'table', 'template']
-    @type caseInsensitive: bool
-    @param marker: a string that will be added to the last replacement;
-        if nothing is changed, it is added at the end
+# Alias of the source tag exception
+_SYNTAXHIGHLIGHT_REGEX = re.compile(
+    r'(?is)<syntaxhighlight .*?</syntaxhighlight>')
 
-    """
-    if site is None:
-        site = pywikibot.Site()
+# Group references in the replacement of replaceExcept
+_GROUP_REGEX = re.compile(r'\\(?P<number>\d+)|\\g<(?P<name>.+?)>')
 
-    exceptionRegexes = {
+# Number of characters before a position which a regular expression may
+# examine, per pattern and flags
+_context_widths = {}
+
+_ZERO_WIDTH_BEHIND = (sre_constants.AT_BEGINNING,
+                      sre_constants.AT_BEGINNING_LINE,
+                      sre_constants.AT_BEGINNING_STRING,
+                      sre_constants.AT_BOUNDARY,
+                      sre_constants.AT_NON_BOUNDARY)
+
+
+def _exception_regexes(site):
+    """Return the named exception regexes of replaceExcept for the site."""
+    try:
+        return _site_exception_regexes[site]
+    except KeyError:
+        pass
+    _site_exception_regexes[site] = exceptionRegexes = {
         'comment':      re.compile(r'(?s)<!--.*?-->'),
         # section headers
         'header':       re.compile(r'\r?\n=+.+=+ *\r?\n'),
@@ -140,6 +149,112 @@ def replaceExcept(text, old, new, exceptions, caseInsensitive=False,
         'file':         re.compile(u'\[\[ *(?:%s)\s*:.*?\]\]' % u'|'.join(site.namespace(6, all=True))),
 
     }
+    return exceptionRegexes
+
+
+def _tag_exception_regex(tag):
+    """Return the exception regex of replaceExcept for an extension tag."""
+    try:
+        return _tag_exception_regexes[tag]
+    except KeyError:
+        regex = re.compile(r'(?is)<%s>.*?</%s>' % (tag, tag))
+        _tag_exception_regexes[tag] = regex
+        return regex
+
+
+def _context_width(regex):
+    """
+    Return how many characters before a position a regex may examine.
+
+    A match of the regex starting at a position only depends on the text
+    after it and on this number of characters before it. These are examined
+    by lookbehind assertions, word boundaries and the start of a line or of
+    the text.
+
+    @param regex: a compiled regular expression
+    @return: the number of characters or None if it can't be determined
+    @rtype: int or None
+    """
+    key = (regex.pattern, regex.flags)
+    try:
+        return _context_widths[key]
+    except KeyError:
+        pass
+    try:
+        width = _subpattern_context_width(sre_parse.parse(regex.pattern,
+                                                          regex.flags))
+    except Exception:
+        width = None
+    _context_widths[key] = width
+    return width
+
+
+def _subpattern_context_width(items):
+    """Return the context width of the items of a parsed regex."""
+    width = 0
+    for op, av in items:
+        if op == sre_constants.AT:
+            if av in _ZERO_WIDTH_BEHIND:
+                width = max(width, 1)
+            continue
+        if op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT) \
+                and av[0] < 0:
+            # lookbehind assertions have a fixed width
+            behind = av[1].getwidth()[1]
+            if behind > 1000:
+                return None
+            width = max(width, behind)
+        # examine nested subpatterns, e.g. of groups or repeats
+        values = [av]
+        while values:
+            value = values.pop()
+            if isinstance(value, sre_parse.SubPattern):
+                nested = _subpattern_context_width(value)
+                if nested is None:
+                    return None
+                width = max(width, nested)
+            elif isinstance(value, (tuple, list)):
+                values.extend(value)
+    return width
+
+
+def _output_tail(pieces, width):
+    """Return the last width characters of the joined pieces."""
+    tail = ''
+    for piece in reversed(pieces):
+        tail = piece + tail
+        if len(tail) >= width:
+            break
+    return tail[len(tail) - width:] if len(tail) > width else tail
+
+
+def replaceExcept(text, old, new, exceptions, caseInsensitive=False,
+                  allowoverlap=False, marker='', site=None):
+    """
+    Return text with 'old' replaced by 'new', ignoring specified types of text.
+
+    Skips occurrences of 'old' within exceptions; e.g., within nowiki tags or
+    HTML comments. If caseInsensitive is true, then use case insensitive
+    regex matching. If allowoverlap is true, overlapping occurrences are all
+    replaced (watch out when using this, it might lead to infinite loops!).
+
+    @type text: unicode
+    @param old: a compiled or uncompiled regular expression
+    @param new: a unicode string (which can contain regular
+        expression references), or a function which takes
+        a match object as parameter. See parameter repl of
+        re.sub().
+    @param exceptions: a list of strings which signal what to leave out,
+        e.g. ['math', 'table', 'template']
+    @type caseInsensitive: bool
+    @param marker: a string that will be added to the last replacement;
+        if nothing is changed, it is added at the end
+
+    """
+    if site is None:
+        site = pywikibot.Site()
+
+    exceptionRegexes = _exception_regexes(site)
 
     # if we got a string, compile it as a regular expression
     if isinstance(old, basestring):
@@ -161,12 +276,10 @@ def replaceExcept(text, old, new, exceptions, caseInsensitive=False,
             else:
                 # nowiki, noinclude, includeonly, timeline, math ond other
                 # extensions
-                dontTouchRegexes.append(re.compile(r'(?is)<%s>.*?</%s>'
-                                                   % (exc, exc)))
+                dontTouchRegexes.append(_tag_exception_regex(exc))
             # handle alias
             if exc == 'source':
-                dontTouchRegexes.append(re.compile(
-                    r'(?is)<syntaxhighlight .*?</syntaxhighlight>'))
+                dontTouchRegexes.append(_SYNTAXHIGHLIGHT_REGEX)
         else:
             # assume it's a regular expression
             dontTouchRegexes.append(exc)
@@ -213,8 +326,33 @@ def replaceExcept(text, old, new, exceptions, caseInsensitive=False,
                 for m2 in Rmarker2.finditer(item):
                     item = item.replace(m2.group(), values[int(m2.group(1))])
                 inside[count] = item
+    if not callable(new):
+        # it is a little hack to make \n work. It would be better
+        # to fix it previously, but better than nothing.
+        new = new.replace('\\n', '\n')
+
+    # The replaced text is collected in pieces and joined at the end. As
+    # long as the matches of the regexes at the search position don't
+    # depend on the replaced text before it, the original text is searched
+    # further. Otherwise the pieces are joined and the search continues on
+    # the replaced text.
+    width = _context_width(old)
+    for dontTouchR in dontTouchRegexes:
+        if width is None:
+            break
+        excWidth = _context_width(dontTouchR)
+        width = None if excWidth is None else max(width, excWidth)
+    if allowoverlap:
+        width = None
+
+    pieces = []
+    copied = 0
+    length = 0  # of the joined pieces
     index = 0
     markerpos = len(text)
+    # the next match of each exception regex; None if there is no match and
+    # False if it isn't searched yet
+    excMatches = [False] * len(dontTouchRegexes)
     while True:
         match = old.search(text, index)
         if not match:
@@ -223,8 +361,10 @@ def replaceExcept(text, old, new, exceptions, caseInsensitive=False,
 
         # check which exception will occur next.
         nextExceptionMatch = None
-        for dontTouchR in dontTouchRegexes:
-            excMatch = dontTouchR.search(text, index)
+        for i, dontTouchR in enumerate(dontTouchRegexes):
+            excMatch = excMatches[i]
+            if excMatch is False or excMatch and excMatch.start() < index:
+                excMatch = excMatches[i] = dontTouchR.search(text, index)
             if excMatch and (
                     nextExceptionMatch is None or
                     excMatch.start() < nextExceptionMatch.start()):
@@ -244,10 +384,6 @@ def replaceExcept(text, old, new, exceptions, caseInsensitive=False,
             else:
                 # it is not a function, but a string.
 
-                # it is a little hack to make \n work. It would be better
-                # to fix it previously, but better than nothing.
-                new = new.replace('\\n', '\n')
-
                 # We cannot just insert the new string, as it may contain regex
                 # group references such as \2 or \g<name>.
                 # On the other hand, this approach does not work because it
@@ -259,9 +395,8 @@ def replaceExcept(text, old, new, exceptions, caseInsensitive=False,
                 # So we have to process the group references manually.
                 replacement = new
 
-                groupR = re.compile(r'\\(?P<number>\d+)|\\g<(?P<name>.+?)>')
                 while True:
-                    groupMatch = groupR.search(replacement)
+                    groupMatch = _GROUP_REGEX.search(replacement)
                     if not groupMatch:
                         break
                     groupID = (groupMatch.group('name') or
@@ -274,14 +409,28 @@ def replaceExcept(text, old, new, exceptions, caseInsensitive=False,
                         pywikibot.output('\nInvalid group reference: %s' % groupID)
                         pywikibot.output('Groups found:\n%s' % match.groups())
                         raise IndexError
-            text = text[:match.start()] + replacement + text[match.end():]
+            skipped = text[copied:match.start()]
+            pieces.append(skipped)
+            pieces.append(replacement)
+            length += len(skipped) + len(replacement)
+            copied = match.end()
+            markerpos = length
 
             # continue the search on the remaining text
-            if allowoverlap:
-                index = match.start() + 1
+            if width is not None and (_output_tail(pieces, width) ==
+                                      text[max(0, copied - width):copied]):
+                index = copied
             else:
-                index = match.start() + len(replacement)
-            markerpos = match.start() + len(replacement)
+                text = ''.join(pieces) + text[copied:]
+                pieces = []
+                copied = length = 0
+                excMatches = [False] * len(dontTouchRegexes)
+                if allowoverlap:
+                    index = markerpos - len(replacement) + 1
+                else:
+                    index = markerpos
+    if pieces:
+        text = ''.join(pieces) + text[copied:]
     text = text[:markerpos] + marker + text[markerpos:]
 
     if except_templates:  # restore templates from dict
@@ -292,6 +441,61 @@ def replaceExcept(text, old, new, exceptions, caseInsensitive=False,
     return text
 
 
+_DISABLED_PART_REGEXES = {
+    'comments':        r'<!--.*?-->',
+    'includeonly':     r'<includeonly>.*?</includeonly>',
+    'nowiki':          r'<nowiki>.*?</nowiki>',
+    'pre':             r'<pre>.*?</pre>',
+    'source':          r'<source .*?</source>',
+    'syntaxhighlight': r'<syntaxhighlight .*?</syntaxhighlight>',
+}
+
+_disabled_parts_regexes = {}
+
+
+def _disabled_parts_regex(tags=['*'], include=[]):
+    """Return the regex of removeDisabledParts with a group for each tag."""
+    if '*' in tags:
+        tags = _DISABLED_PART_REGEXES.keys()
+    # add alias
+    tags = set(tags) - set(include)
+    if 'source' in tags:
+        tags.add('syntaxhighlight')
+    key = frozenset(tags)
+    try:
+        return _disabled_parts_regexes[key]
+    except KeyError:
+        regex = re.compile('|'.join('(?P<%s>%s)'
+                                    % (tag, _DISABLED_PART_REGEXES[tag])
+                                    for tag in sorted(tags)),
+                           re.IGNORECASE | re.DOTALL)
+        _disabled_parts_regexes[key] = regex
+        return regex
+
+
+def _indexed(function):
+    """
+    Cache the results of a function for a WikitextIndex.
+
+    The decorated function is called with the index, which it must pass to
+    functions accepting an index or replace by its text. The cached
+    dicts and lists are copied before they are returned.
+    """
+    def wrapper(text, *args, **kwargs):
+        if not isinstance(text, WikitextIndex):
+            return function(text, *args, **kwargs)
+        key = (function.__name__,
+               tuple(tuple(arg) if isinstance(arg, list) else arg
+                     for arg in args),
+               tuple(sorted((name, tuple(value) if isinstance(value, list)
+                             else value)
+                            for name, value in kwargs.items())))
+        return copy.copy(text._cached(key, function, text, *args, **kwargs))
+
+    manage_wrapping(wrapper, function)
+    return wrapper
+
+
 def removeDisabledParts(text, tags=['*'], include=[]):
     """
     Return text without portions where wiki markup is disabled.
@@ -307,24 +511,11 @@ def removeDisabledParts(text, tags=['*'], include=[]):
     Or, in alternative, default parts that shall not be removed can be
     specified in the 'include' param.
 
+    @param text: the text or its L{WikitextIndex}
     """
-    regexes = {
-        'comments':        r'<!--.*?-->',
-        'includeonly':     r'<includeonly>.*?</includeonly>',
-        'nowiki':          r'<nowiki>.*?</nowiki>',
-        'pre':             r'<pre>.*?</pre>',
-        'source':          r'<source .*?</source>',
-        'syntaxhighlight': r'<syntaxhighlight .*?</syntaxhighlight>',
-    }
-    if '*' in tags:
-        tags = list(regexes.keys())
-    # add alias
-    tags = set(tags) - set(include)
-    if 'source' in tags:
-        tags.add('syntaxhighlight')
-    toRemoveR = re.compile('|'.join([regexes[tag] for tag in tags]),
-                           re.IGNORECASE | re.DOTALL)
-    return toRemoveR.sub('', text)
+    if isinstance(text, WikitextIndex):
+        return text.without(tags, include)
+    return _disabled_parts_regex(tags, include).sub('', text)
 
 
 def removeHTMLParts(text, keeptags=['tt', 'nowiki', 'small', 'sup']):
@@ -368,8 +559,12 @@ def isDisabled(text, index, tags=['*']):
     """
     Return True if text[index] is disabled, e.g. by a comment or by nowiki tags.
 
-    For the tags parameter, see L{removeDisabledParts}.
+    For the tags parameter, see L{removeDisabledParts}. With a
+    L{WikitextIndex} instead of the text it is looked up in the recorded
+    disabled parts.
     """
+    if isinstance(text, WikitextIndex):
+        return text.is_disabled(index, tags)
     # Find a marker that is not already in the text.
     marker = findmarker(text)
     text = text[:index] + marker + text[index:]
@@ -432,16 +627,77 @@ def expandmarker(text, marker='', separator=''):
 #        do not find or change links of other kinds, nor any that are formatted
 #        as in-line interwiki links (e.g., "[[:es:Articulo]]".
 
-def getLanguageLinks(text, insite=None, pageLink="[[]]",
-                     template_subpage=False):
+# This regular expression will find every link that is possibly an
+# interwiki link.
+# NOTE: language codes are case-insensitive and only consist of basic latin
+# letters and hyphens.
+# TODO: currently, we do not have any, but BCP 47 allows digits, and
+#       underscores.
+# TODO: There is no semantic difference between hyphens and
+#       underscores -> fold them.
+_INTERWIKI_REGEX = re.compile(r'\[\[([a-zA-Z\-]+)\s?:([^\[\]\n]*)\]\]')
+
+_language_link_codes = {}
+_language_link_sites = {}
+
+
+def _language_codes(fam):
     """
-    Return a dict of inter-language links found in text.
+    Return the language codes of links to the family.
 
-    The returned dict uses language codes as keys and Page objects as values.
+    The dict maps each code, including obsolete codes, to the code of the
+    site the link goes to. It is built once per family.
+    """
+    try:
+        return _language_link_codes[fam.name]
+    except KeyError:
+        pass
+    codes = dict((code, code) for code in fam.langs)
+    for old, new in fam.obsolete.items():
+        if new in fam.langs:
+            codes[old] = new
+        else:
+            codes.pop(old, None)
+    _language_link_codes[fam.name] = codes
+    return codes
+
+
+def _language_site(code, fam):
+    """Return the site of a language code of the family."""
+    try:
+        return _language_link_sites[fam.name, code]
+    except KeyError:
+        site = pywikibot.Site(code=code, fam=fam)
+        _language_link_sites[fam.name, code] = site
+        return site
 
-    Do not call this routine directly, use Page.interwiki() method
-    instead.
 
+def _language_link_tags(template_subpage):
+    """Return the tags of the disabled parts without language links."""
+    # Ignore interwiki links within nowiki tags, includeonly tags, pre tags,
+    # and HTML comments
+    tags = ['comments', 'nowiki', 'pre', 'source']
+    if not template_subpage:
+        tags += ['includeonly']
+    return tags
+
+
+def iter_language_links(text, insite=None, template_subpage=False):
+    """
+    Yield the site and title of each inter-language link found in text.
+
+    Other than L{getLanguageLinks} it does not create Page objects, so the
+    titles are not checked, and it yields each link in the order of the
+    text, even if several links go to the same site.
+
+    @param text: the text or its L{WikitextIndex}
+    @param insite: the site of the text, by default the configured site
+    @type insite: BaseSite
+    @param template_subpage: whether the text is a template documentation
+        subpage, whose links in includeonly tags are used
+    @type template_subpage: bool
+    @return: tuples of the site and the title of the linked page
+    @rtype: generator
     """
     if insite is None:
         insite = pywikibot.Site()
@@ -450,42 +706,55 @@ def getLanguageLinks(text, insite=None, pageLink="[[]]",
     # infos there
     if fam.interwiki_forward:
         fam = Family.load(fam.interwiki_forward)
-    result = {}
-    # Ignore interwiki links within nowiki tags, includeonly tags, pre tags,
-    # and HTML comments
-    tags = ['comments', 'nowiki', 'pre', 'source']
-    if not template_subpage:
-        tags += ['includeonly']
-    text = removeDisabledParts(text, tags)
+    codes = _language_codes(fam)
+    if isinstance(text, WikitextIndex):
+        links = [(lang, pagetitle) for start, end, lang, pagetitle
+                 in text.language_links(template_subpage)]
+    else:
+        text = removeDisabledParts(text,
+                                   _language_link_tags(template_subpage))
+        links = _INTERWIKI_REGEX.findall(text)
 
-    # This regular expression will find every link that is possibly an
-    # interwiki link.
-    # NOTE: language codes are case-insensitive and only consist of basic latin
-    # letters and hyphens.
-    # TODO: currently, we do not have any, but BCP 47 allows digits, and
-    #       underscores.
-    # TODO: There is no semantic difference between hyphens and
-    #       underscores -> fold them.
-    interwikiR = re.compile(r'\[\[([a-zA-Z\-]+)\s?:([^\[\]\n]*)\]\]')
-    for lang, pagetitle in interwikiR.findall(text):
-        lang = lang.lower()
+    for lang, pagetitle in links:
         # Check if it really is in fact an interwiki link to a known
         # language, or if it's e.g. a category tag or an internal link
-        if lang in fam.obsolete:
-            lang = fam.obsolete[lang]
-        if lang in list(fam.langs.keys()):
-            if '|' in pagetitle:
-                # ignore text after the pipe
-                pagetitle = pagetitle[:pagetitle.index('|')]
-            # we want the actual page objects rather than the titles
-            site = pywikibot.Site(code=lang, fam=fam)
-            try:
-                result[site] = pywikibot.Page(site, pagetitle, insite=insite)
-            except pywikibot.InvalidTitle:
-                pywikibot.output(u'[getLanguageLinks] Text contains invalid '
-                                 u'interwiki link [[%s:%s]].'
-                                 % (lang, pagetitle))
-                continue
+        lang = codes.get(lang.lower())
+        if lang is None:
+            continue
+        if '|' in pagetitle:
+            # ignore text after the pipe
+            pagetitle = pagetitle[:pagetitle.index('|')]
+        yield _language_site(lang, fam), pagetitle
+
+
+@_indexed
+def getLanguageLinks(text, insite=None, pageLink="[[]]",
+                     template_subpage=False):
+    """
+    Return a dict of inter-language links found in text.
+
+    The returned dict uses language codes as keys and Page objects as values.
+
+    Do not call this routine directly, use Page.interwiki() method
+    instead. To get the linked titles without Page objects, use
+    L{iter_language_links}.
+
+    The result for a L{WikitextIndex} is cached in the index.
+
+    """
+    if insite is None:
+        insite = pywikibot.Site()
+    result = {}
+    for site, pagetitle in iter_language_links(text, insite,
+                                               template_subpage):
+        # we want the actual page objects rather than the titles
+        try:
+            result[site] = pywikibot.Page(site, pagetitle, insite=insite)
+        except pywikibot.InvalidTitle:
+            pywikibot.output(u'[getLanguageLinks] Text contains invalid '
+                             u'interwiki link [[%s:%s]].'
+                             % (site.code, pagetitle))
+            continue
     return result
 
 
@@ -498,6 +767,8 @@ def removeLanguageLinks(text, site=None, marker=''):
     interwiki links).
 
     """
+    if isinstance(text, WikitextIndex):
+        text = text.text
     if site is None:
         site = pywikibot.Site()
     if not site.validLanguageLinks():
@@ -525,6 +796,8 @@ def removeLanguageLinksAndSeparator(text, site=None, marker='', separator=''):
     interwiki links).
 
     """
+    if isinstance(text, WikitextIndex):
+        text = text.text
     if separator:
         mymarker = findmarker(text, u'@L@')
         newtext = removeLanguageLinks(text, site, mymarker)
@@ -542,6 +815,8 @@ def replaceLanguageLinks(oldtext, new, site=None, addOnly=False,
     objects as values (i.e., just like the dict returned by getLanguageLinks
     function).
     """
+    if isinstance(oldtext, WikitextIndex):
+        oldtext = oldtext.text
     # Find a marker that is not already in the text.
     marker = findmarker(oldtext)
     if site is None:
@@ -681,9 +956,19 @@ def interwikiSort(sites, insite=None):
 # Functions dealing with category links
 # -------------------------------------
 
+def _category_link_regex(site):
+    """Return the regex of the category links of site."""
+    catNamespace = '|'.join(site.category_namespaces())
+    return re.compile(r'\[\[\s*(?P<namespace>%s)\s*:\s*(?P<rest>.+?)\]\]'
+                      % catNamespace, re.I)
+
+
+@_indexed
 def getCategoryLinks(text, site=None, include=[]):
     """Return a list of category links found in text.
 
+    The result for a L{WikitextIndex} is cached in the index.
+
     @param include: list of tags which should not be removed by
         removeDisabledParts() and where CategoryLinks can be searched.
     @type include: list
@@ -694,23 +979,24 @@ def getCategoryLinks(text, site=None, include=[]):
     result = []
     if site is None:
         site = pywikibot.Site()
-    # Ignore category links within nowiki tags, pre tags, includeonly tags,
-    # and HTML comments
-    text = removeDisabledParts(text, include=include)
-    catNamespace = '|'.join(site.category_namespaces())
-    R = re.compile(r'\[\[\s*(?P<namespace>%s)\s*:\s*(?P<rest>.+?)\]\]'
-                   % catNamespace, re.I)
-    for match in R.finditer(text):
-        if '{{' in match.group('rest'):
-            rest = site.expand_text(match.group('rest'))
-        else:
-            rest = match.group('rest')
+    if isinstance(text, WikitextIndex):
+        links = [(namespace, rest) for start, end, namespace, rest
+                 in text.category_links(site, include)]
+    else:
+        # Ignore category links within nowiki tags, pre tags, includeonly
+        # tags, and HTML comments
+        text = removeDisabledParts(text, include=include)
+        links = [(match.group('namespace'), match.group('rest'))
+                 for match in _category_link_regex(site).finditer(text)]
+    for namespace, rest in links:
+        if '{{' in rest:
+            rest = site.expand_text(rest)
         if '|' in rest:
             title, sortKey = rest.split('|', 1)
         else:
             title, sortKey = rest, None
         cat = pywikibot.Category(pywikibot.Link(
-                                 '%s:%s' % (match.group('namespace'), title),
+                                 '%s:%s' % (namespace, title),
                                  site),
                                  sortKey=sortKey)
         result.append(cat)
@@ -723,6 +1009,8 @@ def removeCategoryLinks(text, site=None, marker=''):
     Put the string marker after the last replacement (at the end of the text
     if there is no replacement).
     """
+    if isinstance(text, WikitextIndex):
+        text = text.text
     # This regular expression will find every link that is possibly an
     # interwiki link, plus trailing whitespace. The language code is grouped.
     # NOTE: This assumes that language codes only consist of non-capital
@@ -750,6 +1038,8 @@ def removeCategoryLinksAndSeparator(text, site=None, marker='', separator=''):
     if there is no replacement).
 
     """
+    if isinstance(text, WikitextIndex):
+        text = text.text
     if site is None:
         site = pywikibot.Site()
     if separator:
@@ -816,6 +1106,8 @@ def replaceCategoryLinks(oldtext, new, site=None, addOnly=False):
     @param addOnly: If addOnly is True, the old category won't be deleted and the
         category(s) given will be added (and so they won't replace anything).
     """
+    if isinstance(oldtext, WikitextIndex):
+        oldtext = oldtext.text
     # Find a marker that is not already in the text.
     marker = findmarker(oldtext)
     if site is None:
@@ -962,18 +1254,22 @@ def extract_templates_and_params(text):
 
     This uses the package L{mwparserfromhell} (mwpfh) if it is installed
     and enabled by config.mwparserfromhell. Otherwise it falls back on a
-    regex based implementation.
+    single pass scanner, L{extract_templates_and_params_scan}.
 
     There are minor differences between the two implementations.
 
     The two implementations return nested templates in a different order.
-    i.e. for {{a|b={{c}}}}, mwpfh returns [a, c], whereas regex returns [c, a].
+    i.e. for {{a|b={{c}}}}, mwpfh returns [a, c], whereas scan returns [c, a].
 
-    mwpfh preserves whitespace in parameter names and values.  regex excludes
+    mwpfh preserves whitespace in parameter names and values.  scan excludes
     anything between <!-- --> before parsing the text.
 
+    Use L{extract_templates_with_spans} to get the position of the
+    templates in text and L{extract_templates_and_params_batch} to extract
+    the templates of many texts.
+
     @param text: The wikitext from which templates are extracted
-    @type text: unicode or string
+    @type text: unicode or string or L{WikitextIndex}
     @return: list of template name and params
     @rtype: list of tuple
     """
@@ -984,10 +1280,22 @@ def extract_templates_and_params(text):
         except ImportError:
             use_mwparserfromhell = False
 
+    if isinstance(text, WikitextIndex):
+        if use_mwparserfromhell:
+            templates = text._cached('mwpfh templates',
+                                     extract_templates_and_params_mwpfh,
+                                     text.text)
+        else:
+            # the order of extract_templates_and_params_scan
+            templates = [template[:2] for template in sorted(
+                text._scan_templates(),
+                key=lambda template: (template[4], template[2]))]
+        # the params may be changed by the caller
+        return [(name, OrderedDict(params)) for name, params in templates]
     if use_mwparserfromhell:
         return extract_templates_and_params_mwpfh(text)
     else:
-        return extract_templates_and_params_regex(text)
+        return extract_templates_and_params_scan(text)
 
 
 def extract_templates_and_params_mwpfh(text):
@@ -1182,6 +1490,247 @@ def extract_templates_and_params_regex(text):
     return result
 
 
+# Tokens of the template scanner. Outside of templates only the start of a
+# template and the parts which are ignored are searched for.
+_DISABLED_PARTS = '|'.join(_DISABLED_PART_REGEXES[tag]
+                           for tag in sorted(_DISABLED_PART_REGEXES))
+_DISABLED_REGEX = _disabled_parts_regex()
+# The lookahead lets the regex engine skip other characters quickly.
+_OUTER_TOKEN_REGEX = re.compile(
+    r'(?=[<{])(?:(?P<disabled>%s)|\{\{+)' % _DISABLED_PARTS,
+    re.IGNORECASE | re.DOTALL)
+_INNER_TOKEN_REGEX = re.compile(
+    r'(?=[<{}\[\]|=])(?:(?P<disabled>%s)|(?P<math><math>[^<]+</math>)'
+    r'|[|=]|\{\{+|\}\}+|\[\[|\]\])' % _DISABLED_PARTS,
+    re.IGNORECASE | re.DOTALL)
+
+
+class _TemplateFrame(object):
+
+    """A template, template parameter or link opened by the scanner."""
+
+    __slots__ = ('kind', 'start', 'parts', 'height', 'invalid')
+
+    def __init__(self, kind, start, size):
+        """Constructor."""
+        self.kind = kind
+        self.start = start
+        # [start, end, position of the first '='] of the name and each
+        # parameter; the end is set when the next part begins
+        self.parts = [[start + size, None, None]]
+        self.height = 0
+        self.invalid = False
+
+
+def _scan_templates(text):
+    """
+    Find the templates in text in a single pass.
+
+    Like MediaWiki, a run of more than three opening braces is split into
+    templates and, for an odd number of braces, an innermost template
+    parameter; a run of closing braces closes the innermost templates and
+    parameters it suffices for.
+
+    @return: tuples of the name, the parameters, the start and end offset in
+        text and the nesting height of each template, in the order the
+        templates are closed
+    @rtype: list of tuple
+    """
+    def clean(start, end):
+        part = text[start:end]
+        if '<' in part:
+            part = _DISABLED_REGEX.sub('', part)
+        return part
+
+    def close(frame, end):
+        """Add the template frame closed at end to the result."""
+        frame.parts[-1][1] = end - 2
+        parent = templates[-1] if templates else None
+        if parent is not None:
+            parent.height = max(parent.height, frame.height + 1)
+            if len(parent.parts) == 1:
+                # the name of the parent contains this template
+                parent.invalid = True
+        if frame.invalid:
+            return
+        name = clean(*frame.parts[0][:2])
+        if name.startswith('msg:'):
+            name = name[4:]
+        name = name.strip()
+        if not name or name.startswith('#') or '{' in name:
+            return
+        params = OrderedDict()
+        numbered_param = 1
+        for start, stop, equals in frame.parts[1:]:
+            if equals is None:
+                param_name = unicode(numbered_param)
+                numbered_param += 1
+                param_val = clean(start, stop)
+            else:
+                param_name = clean(start, equals).strip()
+                param_val = clean(equals + 1, stop)
+            params[param_name] = param_val.strip()
+        result.append((name, params, frame.start, end, frame.height))
+
+    result = []
+    stack = []
+    templates = []
+    outer_search = _OUTER_TOKEN_REGEX.search
+    inner_search = _INNER_TOKEN_REGEX.search
+    pos = 0
+    while True:
+        match = (inner_search if stack else outer_search)(text, pos)
+        if match is None:
+            break
+        kind = match.lastgroup
+        if kind == 'disabled':
+            pos = match.end()
+            continue
+        token = match.group()
+        start = match.start()
+        pos = match.end()
+        first = token[0]
+        if first == '|' or first == '=':
+            template = stack[-1]
+            if template.kind != 'template':
+                continue
+            part = template.parts[-1]
+            if first == '|':
+                part[1] = start
+                template.parts.append([pos, None, None])
+            elif part[2] is None and len(template.parts) > 1:
+                part[2] = start
+        elif first == '{':
+            if templates and len(templates[-1].parts) == 1:
+                # {{ {{{1}}} }}: the name depends on a parameter
+                templates[-1].invalid = True
+            if len(token) % 2:
+                pos -= 3
+            for offset in range(start, pos, 2):
+                stack.append(_TemplateFrame('template', offset, 2))
+                templates.append(stack[-1])
+            if len(token) % 2:
+                stack.append(_TemplateFrame('parameter', pos, 3))
+                pos += 3
+        elif first == '}':
+            offset = start
+            while pos - offset >= 2:
+                # discard links which are not closed
+                while stack and stack[-1].kind == 'link':
+                    stack.pop()
+                if not stack:
+                    break
+                frame = stack[-1]
+                if frame.kind == 'parameter':
+                    if pos - offset < 3:
+                        break
+                    offset += 3
+                    stack.pop()
+                else:
+                    offset += 2
+                    stack.pop()
+                    templates.pop()
+                    close(frame, offset)
+        elif kind == 'math':
+            if templates and len(templates[-1].parts) == 1:
+                templates[-1].invalid = True
+        elif token == '[[':
+            stack.append(_TemplateFrame('link', start, 2))
+        elif stack[-1].kind == 'link':
+            # ']]'
+            stack.pop()
+    return result
+
+
+def extract_templates_and_params_scan(text):
+    """
+    Extract templates with params using a single pass scanner.
+
+    This function should not be called directly.
+
+    Use extract_templates_and_params, which will fallback to using this
+    implementation when the mwparserfromhell implementation is not used.
+
+    Like the regex based implementation it returns the innermost templates
+    first, ignores the parts removed by L{removeDisabledParts} and strips
+    the parameter names and values. Other than the regex based
+    implementation it returns each use of a template, even if the same
+    template with the same parameters is used several times, and it returns
+    empty parameters like mwpfh.
+
+    @param text: The wikitext from which templates are extracted
+    @type text: unicode or string
+    @return: list of template name and params
+    @rtype: list of tuple
+    """
+    templates = _scan_templates(text)
+    templates.sort(key=lambda template: (template[4], template[2]))
+    return [(name, params) for name, params, start, end, height in templates]
+
+
+def extract_templates_with_spans(text):
+    """
+    Return the templates found in text and their position in text.
+
+    The templates are returned in the order they start in text, so a
+    template is followed by the templates nested in it. The offsets allow
+    to replace a template in text without searching for it again; replacing
+    the templates from the last one keeps the offsets of the preceding
+    templates valid::
+
+        for name, params, start, end in reversed(
+                extract_templates_with_spans(text)):
+            if name == 'Old':
+                text = text[:start] + '{{New}}' + text[end:]
+
+    @param text: The wikitext from which templates are extracted
+    @type text: unicode or string or L{WikitextIndex}
+    @return: tuples of the template name, the params as in
+        L{extract_templates_and_params_scan}, and the start and end offset
+        of the template in text
+    @rtype: list of tuple
+    """
+    if isinstance(text, WikitextIndex):
+        return [(name, OrderedDict(params), start, end)
+                for name, params, start, end in text.templates]
+    templates = _scan_templates(text)
+    templates.sort(key=lambda template: template[2])
+    return [template[:4] for template in templates]
+
+
+def _extract_templates_and_params(text):
+    """Call extract_templates_and_params, which pickle can't refer to."""
+    return extract_templates_and_params(text)
+
+
+def extract_templates_and_params_batch(texts, processes=None):
+    """
+    Return the templates found in each of texts.
+
+    This is the same as calling L{extract_templates_and_params} for each
+    text, but with several processes the texts are parsed in parallel,
+    which pays off for many or long texts like the pages of a dump.
+
+    @param texts: The wikitexts from which templates are extracted
+    @type texts: iterable of unicode or string
+    @param processes: the number of processes parsing the texts; by
+        default the texts are parsed in this process
+    @type processes: int
+    @return: the templates of each text in the order of texts
+    @rtype: list of list of tuple
+    """
+    if not processes or processes == 1:
+        return [extract_templates_and_params(text) for text in texts]
+    texts = list(texts)
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(_extract_templates_and_params, texts,
+                        max(1, len(texts) // (processes * 4)))
+    finally:
+        pool.close()
+        pool.join()
+
+
 def glue_template_and_params(template_and_params):
     """Return wiki text of template glued from params.
 
@@ -1226,10 +1775,245 @@ def does_text_contain_section(pagetext, section):
     return bool(m)
 
 
+# --------------
+# Wikitext index
+# --------------
+
+_SECTION_REGEX = re.compile(
+    r'^(?P<level>={1,6})(?P<title>.+?)(?P=level)[ \t]*$', re.MULTILINE)
+
+
+class WikitextIndex(object):
+
+    """
+    The structure of a wikitext, found once and queried many times.
+
+    The index records the offsets of the disabled parts, links, category
+    links, language links, templates and section headers of the text when
+    they are first requested. Except for the templates, they are found in
+    the text without the disabled parts, like the functions below do.
+
+    The functions L{removeDisabledParts}, L{isDisabled},
+    L{iter_language_links}, L{getLanguageLinks}, L{getCategoryLinks},
+    L{extract_templates_and_params} and L{extract_templates_with_spans}
+    accept an index instead of the text and answer from the recorded
+    structures, so calling them again for the same text doesn't scan it
+    again. The functions changing the text accept an index as well, but the
+    changed text needs a new index.
+    """
+
+    def __init__(self, text):
+        """
+        Constructor.
+
+        @param text: the wikitext
+        @type text: unicode
+        """
+        self.text = text
+        self._cache = {}
+
+    def __repr__(self):
+        """Return a representation of the index."""
+        return '{0}({1!r})'.format(self.__class__.__name__, self.text)
+
+    def _cached(self, key, function, *args, **kwargs):
+        """Return the cached result of function or call it."""
+        try:
+            return self._cache[key]
+        except KeyError:
+            result = self._cache[key] = function(*args, **kwargs)
+            return result
+
+    def disabled_parts(self, tags=['*'], include=[]):
+        """
+        Return the parts of the text where wiki markup is disabled.
+
+        For the tags and include parameters, see L{removeDisabledParts}.
+
+        @return: tuples of the start and end offset and the kind of the part,
+            e.g. 'comments', in the order of the text
+        @rtype: list of tuple
+        """
+        regex = _disabled_parts_regex(tags, include)
+        return self._cached(
+            ('disabled', regex.pattern), lambda: [
+                (match.start(), match.end(), match.lastgroup)
+                for match in regex.finditer(self.text)
+                if match.end() > match.start()])
+
+    def without(self, tags=['*'], include=[]):
+        """Return the text without the disabled parts.
+
+        For the tags and include parameters, see L{removeDisabledParts}.
+        """
+        def remove():
+            pieces = []
+            pos = 0
+            for start, end, kind in parts:
+                pieces.append(self.text[pos:start])
+                pos = end
+            pieces.append(self.text[pos:])
+            return ''.join(pieces)
+
+        parts = self.disabled_parts(tags, include)
+        return self._cached(
+            ('without', _disabled_parts_regex(tags, include).pattern), remove)
+
+    def is_disabled(self, index, tags=['*']):
+        """
+        Return True if text[index] is within a disabled part.
+
+        It returns the same as L{isDisabled} for the text. For the tags
+        parameter, see L{removeDisabledParts}.
+        """
+        parts = self.disabled_parts(tags)
+        starts = self._cached(('starts', _disabled_parts_regex(tags).pattern),
+                              lambda: [part[0] for part in parts])
+        position = bisect.bisect_right(starts, index) - 1
+        if position < 0 or index >= parts[position][1]:
+            return False
+        if self._cached('@', lambda: '@' in self.text):
+            # the marker of isDisabled may be joined from the text
+            return isDisabled(self.text, index, tags)
+        # otherwise isDisabled inserts '@@', which changes the parts if it
+        # is inserted into the opening or closing tag of this part; the
+        # parts before are the same
+        start = parts[position][0]
+        text = self.text[start:index] + '@@' + self.text[index:]
+        regex = _disabled_parts_regex(tags)
+        pos = 0
+        while True:
+            match = regex.search(text, pos)
+            if not match or match.start() > index - start:
+                return False
+            if match.end() > index - start:
+                return True
+            pos = match.end()
+
+    def _find(self, regex, tags=['*'], include=[]):
+        """
+        Return the matches of regex in the text without the disabled parts.
+
+        @return: tuples of the start and end offset in the text and the
+            match in the text without the disabled parts
+        @rtype: list of tuple
+        """
+        def find():
+            # the offset of each part in the text without the parts, and
+            # the length of the parts up to it
+            positions = []
+            removed = [0]
+            for start, end, kind in parts:
+                positions.append(start - removed[-1])
+                removed.append(removed[-1] + end - start)
+            result = []
+            for match in regex.finditer(self.without(tags, include)):
+                # the parts at the start of the match precede it, the parts
+                # at its end follow it
+                start = match.start()
+                start += removed[bisect.bisect_right(positions, start)]
+                end = match.end()
+                end += removed[bisect.bisect_right(positions, end - 1)]
+                result.append((start, end, match))
+            return result
+
+        parts = self.disabled_parts(tags, include)
+        return self._cached(
+            ('find', regex.pattern, regex.flags,
+             _disabled_parts_regex(tags, include).pattern), find)
+
+    @property
+    def links(self):
+        """
+        Return the internal links which are not in a disabled part.
+
+        This includes category links, language links and links to files.
+
+        @return: tuples of the start and end offset, the target and the
+            label of each link, which is None if the link has no label
+        @rtype: list of tuple
+        """
+        return self._cached('links', lambda: [
+            (start, end, match.group('title'),
+             match.group(2)[1:] if match.group(2) else None)
+            for start, end, match in self._find(pywikibot.link_regex)])
+
+    def category_links(self, site, include=[]):
+        """
+        Return the category links of site which are not in a disabled part.
+
+        These are the links returned by L{getCategoryLinks}. For the include
+        parameter, see L{removeDisabledParts}.
+
+        @return: tuples of the start and end offset, the namespace and the
+            rest of each link, i.e. the title and the sort key
+        @rtype: list of tuple
+        """
+        return [(start, end, match.group('namespace'), match.group('rest'))
+                for start, end, match in self._find(_category_link_regex(site),
+                                                    include=include)]
+
+    def language_links(self, template_subpage=False):
+        """
+        Return the possible language links which are not in a disabled part.
+
+        These are the links which L{iter_language_links} checks for a known
+        language code of the site.
+
+        @param template_subpage: whether the text is a template documentation
+            subpage, whose links in includeonly tags are used
+        @type template_subpage: bool
+        @return: tuples of the start and end offset, the prefix and the title
+            of each link
+        @rtype: list of tuple
+        """
+        return [(start, end) + match.groups()
+                for start, end, match in self._find(
+                    _INTERWIKI_REGEX, _language_link_tags(template_subpage))]
+
+    def _scan_templates(self):
+        """Return the result of L{_scan_templates} for the text."""
+        return self._cached('templates', _scan_templates, self.text)
+
+    @property
+    def templates(self):
+        """
+        Return the templates and their offsets.
+
+        @see: L{extract_templates_with_spans}
+        @return: tuples of the template name, the params and the start and
+            end offset of each template, in the order they start
+        @rtype: list of tuple
+        """
+        return self._cached('template spans', lambda: [
+            template[:4] for template in
+            sorted(self._scan_templates(), key=lambda template: template[2])])
+
+    @property
+    def sections(self):
+        """
+        Return the section headers which are not in a disabled part.
+
+        @return: tuples of the start and end offset, the level and the
+            title of each header
+        @rtype: list of tuple
+        """
+        return self._cached('sections', lambda: [
+            (start, end, len(match.group('level')),
+             match.group('title').strip())
+            for start, end, match in self._find(_SECTION_REGEX)])
+
+
 # ---------------------------------------
 # Time parsing functionality (Archivebot)
 # ---------------------------------------
 
+# translation table of the non-latin digits to latin digits
+_LATIN_DIGITS = dict((ord(digit), '%d' % i)
+                     for digits in NON_LATIN_DIGITS.values()
+                     for i, digit in enumerate(digits))
+
+
 class tzoneFixedOffset(datetime.tzinfo):
 
     """
@@ -1310,6 +2094,16 @@ class TimeStripper(object):
             monthR = r'(?P<month>(%s))' % u'|'.join(escaped_months)
             dayR = r'(?P<day>(3[01]|[12]\d|0?[1-9]))\.?'
 
+        # the lookaheads let the regex engine skip other characters quickly
+        month_starts = set(_[0] for _ in self.origNames2monthNum
+                           if not _.strip('.').isdigit())
+        if month_starts:
+            if self.is_digit_month:
+                month_starts.update('0123456789')
+            monthR = r'(?=[%s])%s' % (
+                ''.join(re.escape(_) for _ in sorted(month_starts)), monthR)
+        dayR = r'(?=\d)' + dayR
+
         self.ptimeR = re.compile(timeR)
         self.ptimeznR = re.compile(timeznR)
         self.pyearR = re.compile(yearR)
@@ -1335,10 +2129,7 @@ class TimeStripper(object):
 
     def fix_digits(self, line):
         """Make non-latin digits like Persian to latin to parse."""
-        for system in NON_LATIN_DIGITS.values():
-            for i in range(0, 10):
-                line = line.replace(system[i], str(i))
-        return line
+        return line.translate(_LATIN_DIGITS)
 
     def last_match_and_replace(self, txt, pat):
         """
@@ -1369,6 +2160,14 @@ class TimeStripper(object):
         else:
             return (txt, None)
 
+    def _prepare(self, text):
+        """Remove the parts of text which may not contain a timestamp."""
+        # Remove parts that are not supposed to contain the timestamp, in order
+        # to reduce false positives.
+        text = removeDisabledParts(text)
+        text = self.linkP.sub('', text)  # remove external links
+        return self.fix_digits(text)
+
     def timestripper(self, line):
         """
         Find timestamp in line and convert it to time zone aware datetime.
@@ -1376,18 +2175,56 @@ class TimeStripper(object):
         All the following items must be matched, otherwise None is returned:
         -. year, month, hour, time, day, minute, tzinfo
         """
+        return self._timestamp(self._prepare(line))
+
+    def timestrip_text(self, text):
+        """
+        Find the latest timestamp in the lines of text.
+
+        It returns the latest of the timestamps L{timestripper} finds in
+        each line of text, e.g. the time of the last comment of a thread.
+        The parts which may not contain a timestamp are removed from the
+        whole text at once, also if they span several lines, and only the
+        lines with a time zone, which every timestamp ends with, are
+        searched for the other fields.
+
+        @param text: the text, e.g. a thread of a talk page
+        @type text: unicode
+        @return: the latest timestamp or None if there is no timestamp
+        @rtype: datetime.datetime
+        """
+        text = self._prepare(text)
+        latest = None
+        end = -1
+        for match in self.ptimeznR.finditer(text):
+            if match.start() < end:
+                # in the line already searched
+                continue
+            start = text.rfind('\n', 0, match.start()) + 1
+            end = text.find('\n', match.end())
+            if end < 0:
+                end = len(text)
+            timestamp = self._timestamp(text[start:end])
+            if timestamp and (latest is None or timestamp > latest):
+                latest = timestamp
+        return latest
+
+    def _timestamp(self, line):
+        """Find the timestamp in a prepared line."""
         # match date fields
         dateDict = dict()
-        # Remove parts that are not supposed to contain the timestamp, in order
-        # to reduce false positives.
-        line = removeDisabledParts(line)
-        line = self.linkP.sub('', line)  # remove external links
-
-        line = self.fix_digits(line)
-        for pat in self.patterns:
+        for pat in self.patterns[:-1]:
             line, matchDict = self.last_match_and_replace(line, pat)
-            if matchDict:
-                dateDict.update(matchDict)
+            if not matchDict:
+                # all fields are needed
+                return None
+            dateDict.update(matchDict)
+        # the last field needs the rightmost match only
+        match = None
+        for match in self.patterns[-1].finditer(line):
+            pass
+        if match:
+            dateDict.update(match.groupdict())
 
         # all fields matched -> date valid
         if all(g in dateDict for g in self.groups):
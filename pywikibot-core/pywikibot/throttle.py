@@ -1,7 +1,14 @@
 # -*- coding: utf-8  -*-
-"""Mechanics to slow down wiki read and/or write rate."""
+"""
+Mechanics to slow down wiki read and/or write rate.
+
+The bot processes of a host register in a shared sqlite database, the
+throttle store, to find out how many of them access the same site. The store
+also holds the token buckets which limit the total request rate of all
+processes to a site if config.throttle_shared_rate is set.
+"""
 #
-# (C) Pywikibot team, 2008
+# (C) Pywikibot team, 2008-2015
 #
 # Distributed under the terms of the MIT license.
 #
@@ -11,11 +18,13 @@ __version__ = '$Id$'
 #
 
 import math
+import os
+import sqlite3
 import threading
 import time
 
 import pywikibot
-from pywikibot import config
+from pywikibot import config, metrics
 
 _logger = "wiki.throttle"
 
@@ -27,6 +36,187 @@ _logger = "wiki.throttle"
 pid = False
 
 
+class ThrottleStore(object):
+
+    """A thread-safe sqlite store of the bot processes and request tokens.
+
+    Use L{ThrottleStore.get} to share one instance per database file.
+    Each update is a single transaction, so that concurrent processes never
+    see a partial update.
+    """
+
+    filename = 'throttle.sqlite'
+
+    _stores = {}
+    _stores_lock = threading.Lock()
+
+    def __init__(self, path):
+        """
+        Constructor.
+
+        @param path: path of the database file
+        @type path: basestring
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self._connection = None
+        self._connection_pid = None
+
+    @classmethod
+    def get(cls, path=None):
+        """Return the shared store of the database file.
+
+        @param path: the database file; defaults to the file in the data
+            directory of the user
+        @type path: basestring
+        @rtype: ThrottleStore
+        """
+        if path is None:
+            path = config.datafilepath(cls.filename)
+        with cls._stores_lock:
+            if path not in cls._stores:
+                cls._stores[path] = cls(path)
+            return cls._stores[path]
+
+    @property
+    def connection(self):
+        """Return the database connection, creating the database if needed."""
+        # a connection must not be used by a forked process
+        if self._connection_pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=30,
+                                               isolation_level=None,
+                                               check_same_thread=False)
+            self._connection_pid = os.getpid()
+            self._connection.executescript('''
+                CREATE TABLE IF NOT EXISTS processes (
+                    pid INTEGER NOT NULL,
+                    site TEXT NOT NULL,
+                    time REAL NOT NULL,
+                    PRIMARY KEY (pid, site)
+                );
+                CREATE INDEX IF NOT EXISTS processes_site
+                    ON processes (site, time);
+                CREATE TABLE IF NOT EXISTS buckets (
+                    site TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    time REAL NOT NULL
+                );
+            ''')
+        return self._connection
+
+    def _transaction(self, function, *args):
+        """Call function with a cursor in a transaction and return its result.
+
+        The transaction takes the write lock of the database at its start.
+        """
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                result = function(cursor, *args)
+            except BaseException:
+                cursor.execute('ROLLBACK')
+                raise
+            cursor.execute('COMMIT')
+            return result
+
+    def register(self, pid, site, releasepid, now=None):
+        """Record that a process is running for a site.
+
+        @param pid: the process id, or 0 to assign the next free id
+        @type pid: int
+        @param site: the site
+        @type site: str
+        @param releasepid: the seconds after which the ids of processes
+            which haven't registered again are free
+        @param now: the current time; defaults to time.time()
+        @return: the process id
+        @rtype: int
+        """
+        if now is None:
+            now = time.time()
+        return self._transaction(self._register, pid, site, now - releasepid,
+                                 now)
+
+    @staticmethod
+    def _register(cursor, pid, site, expired, now):
+        """Record a process in the transaction of register()."""
+        cursor.execute('DELETE FROM processes WHERE time < ?', (expired, ))
+        if not pid:
+            cursor.execute('SELECT MAX(pid) FROM processes')
+            pid = (cursor.fetchone()[0] or 0) + 1
+        cursor.execute('INSERT OR REPLACE INTO processes (pid, site, time) '
+                       'VALUES (?, ?, ?)', (pid, site, now))
+        return pid
+
+    def count(self, site, since):
+        """Return the number of processes running for a site.
+
+        @param site: the site
+        @type site: str
+        @param since: the oldest time a process must have registered at
+        @type since: float
+        @rtype: int
+        """
+        with self.lock:
+            return self.connection.execute(
+                'SELECT COUNT(*) FROM processes WHERE site = ? AND time >= ?',
+                (site, since)).fetchone()[0]
+
+    def drop(self, pid):
+        """Remove a process for all sites."""
+        self._transaction(lambda cursor: cursor.execute(
+            'DELETE FROM processes WHERE pid = ?', (pid, )))
+
+    def take_token(self, site, rate, burst=None, now=None):
+        """Take a request token of the site's bucket.
+
+        The bucket is refilled with rate tokens per second up to burst
+        tokens. If it is empty, the token is reserved and this returns the
+        time until it is available; further requests then wait longer.
+
+        @param site: the site
+        @type site: str
+        @param rate: the number of requests per second
+        @type rate: float
+        @param burst: the number of requests which may be made at once;
+            defaults to rate, but at least one
+        @type burst: float
+        @param now: the current time; defaults to time.time()
+        @return: the seconds to wait before making the request
+        @rtype: float
+        """
+        if burst is None:
+            burst = max(rate, 1)
+        if now is None:
+            now = time.time()
+        return self._transaction(self._take_token, site, rate, burst, now)
+
+    @staticmethod
+    def _take_token(cursor, site, rate, burst, now):
+        """Take a token in the transaction of take_token()."""
+        cursor.execute('SELECT tokens, time FROM buckets WHERE site = ?',
+                       (site, ))
+        row = cursor.fetchone()
+        if row is None:
+            tokens = burst
+        else:
+            tokens, last = row
+            tokens = min(burst, tokens + max(0, now - last) * rate)
+        tokens -= 1
+        cursor.execute('INSERT OR REPLACE INTO buckets (site, tokens, time) '
+                       'VALUES (?, ?, ?)', (site, tokens, now))
+        return max(0.0, -tokens / rate)
+
+    def close(self):
+        """Close the database connection."""
+        with self.lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+                self._connection_pid = None
+
+
 class Throttle(object):
 
     """Control rate of access to wiki server.
@@ -44,7 +234,7 @@ class Throttle(object):
         """Constructor."""
         self.lock = threading.RLock()
         self.mysite = str(site)
-        self.ctrlfilename = config.datafilepath('throttle.ctrl')
+        self.store = ThrottleStore.get()
         self.mindelay = mindelay
         if self.mindelay is None:
             self.mindelay = config.minthrottle
@@ -68,6 +258,8 @@ class Throttle(object):
         self.releasepid = 1200
 
         self.lastwait = 0.0
+        # no request may be made before this time due to server lag
+        self.lag_until = 0.0
         self.delay = 0
         self.checktime = 0
         self.multiplydelay = multiplydelay
@@ -83,58 +275,16 @@ class Throttle(object):
         pywikibot.debug(u"Checking multiplicity: pid = %(pid)s" % globals(),
                         _logger)
         try:
-            processes = []
-            my_pid = pid or 1  # start at 1 if global pid not yet set
-            count = 1
-            # open throttle.log
-            try:
-                f = open(self.ctrlfilename, 'r')
-            except IOError:
-                if not pid:
-                    pass
-                else:
-                    raise
-            else:
-                now = time.time()
-                for line in f.readlines():
-                    # parse line; format is "pid timestamp site"
-                    try:
-                        line = line.split(' ')
-                        this_pid = int(line[0])
-                        ptime = int(line[1].split('.')[0])
-                        this_site = line[2].rstrip()
-                    except (IndexError, ValueError):
-                        # Sometimes the file gets corrupted ignore that line
-                        continue
-                    if now - ptime > self.releasepid:
-                        continue    # process has expired, drop from file
-                    if now - ptime <= self.dropdelay \
-                       and this_site == mysite \
-                       and this_pid != pid:
-                        count += 1
-                    if this_site != self.mysite or this_pid != pid:
-                        processes.append({'pid': this_pid,
-                                          'time': ptime,
-                                          'site': this_site})
-                    if not pid and this_pid >= my_pid:
-                        my_pid = this_pid + 1  # next unused process id
-                f.close()
-
-            if not pid:
-                pid = my_pid
             self.checktime = time.time()
-            processes.append({'pid': pid,
-                              'time': self.checktime,
-                              'site': mysite})
-            processes.sort(key=lambda p: (p['pid'], p['site']))
             try:
-                f = open(self.ctrlfilename, 'w')
-                for p in processes:
-                    f.write("%(pid)s %(time)s %(site)s\n" % p)
-            except IOError:
-                pass
-            else:
-                f.close()
+                pid = self.store.register(pid, mysite, self.releasepid,
+                                          self.checktime)
+                count = self.store.count(mysite,
+                                         self.checktime - self.dropdelay)
+            except sqlite3.Error as e:
+                pywikibot.warning(u'Could not check the processes running '
+                                  u'for %s: %s' % (mysite, e))
+                count = 1
             self.process_multiplicity = count
             pywikibot.log(u"Found %(count)s %(mysite)s processes "
                           u"running, including this one." % locals())
@@ -191,45 +341,41 @@ class Throttle(object):
             ago = now - self.last_write
         else:
             ago = now - self.last_read
-        if ago < thisdelay:
-            delta = thisdelay - ago
+        # the time of the last access may be a reserved time in the future
+        lag = self.lag_until - now
+        if ago < thisdelay or lag > 0:
+            delta = max(thisdelay - ago, lag)
             return delta
         else:
             return 0.0
 
+    def shared_waittime(self):
+        """Return the time to wait for the shared request rate of the site.
+
+        It takes a token of the site's bucket in the throttle store, which is
+        shared with the other processes. See config.throttle_shared_rate.
+
+        @rtype: float
+        """
+        try:
+            return self.store.take_token(self.mysite,
+                                         config.throttle_shared_rate)
+        except sqlite3.Error as e:
+            pywikibot.warning(u'Could not take a request token of %s: %s'
+                              % (self.mysite, e))
+            return 0.0
+
     def drop(self):
         """Remove me from the list of running bot processes."""
         # drop all throttles with this process's pid, regardless of site
         self.checktime = 0
-        processes = []
-        try:
-            f = open(self.ctrlfilename, 'r')
-        except IOError:
+        if not pid:
             return
-        else:
-            now = time.time()
-            for line in f.readlines():
-                try:
-                    line = line.split(' ')
-                    this_pid = int(line[0])
-                    ptime = int(line[1].split('.')[0])
-                    this_site = line[2].rstrip()
-                except (IndexError, ValueError):
-                    # Sometimes the file gets corrupted ignore that line
-                    continue
-                if now - ptime <= self.releasepid \
-                   and this_pid != pid:
-                    processes.append({'pid': this_pid,
-                                      'time': ptime,
-                                      'site': this_site})
-        processes.sort(key=lambda p: p['pid'])
         try:
-            f = open(self.ctrlfilename, 'w')
-            for p in processes:
-                f.write("%(pid)s %(time)s %(site)s\n" % p)
-        except IOError:
-            return
-        f.close()
+            self.store.drop(pid)
+        except sqlite3.Error as e:
+            pywikibot.warning(u'Could not remove this process from the '
+                              u'running processes: %s' % e)
 
     def wait(self, seconds):
         """Wait for seconds seconds.
@@ -237,9 +383,15 @@ class Throttle(object):
         Announce the delay if it exceeds a preset limit.
 
         """
+        metrics.observe('throttle.wait', max(seconds, 0))
         if seconds <= 0:
             return
 
+        self._announce(seconds)
+        time.sleep(seconds)
+
+    def _announce(self, seconds):
+        """Announce or log a delay."""
         message = (u"Sleeping for %(seconds).1f seconds, %(now)s" % {
             'seconds': seconds,
             'now': time.strftime("%Y-%m-%d %H:%M:%S",
@@ -250,21 +402,26 @@ class Throttle(object):
         else:
             pywikibot.log(message)
 
-        time.sleep(seconds)
-
-    def __call__(self, requestsize=1, write=False):
-        """Block the calling program if the throttle time has not expired.
-
-        Parameter requestsize is the number of Pages to be read/written;
-        multiply delay time by an appropriate factor.
-
-        Because this seizes the throttle lock, it will prevent any other
-        thread from writing to the same site until the wait expires.
-
+    def reserve(self, requestsize=1, write=False):
+        """Reserve the time of the next read or write.
+
+        The next read or write is scheduled after the previously reserved
+        one, and its time becomes the time of the last access. Reads and
+        writes are scheduled separately, so that reads don't wait for
+        writes.
+
+        @param requestsize: the number of Pages to be read/written; the
+            delay of the next access is multiplied by an appropriate factor
+        @type requestsize: int
+        @param write: whether the access is a write
+        @type write: bool
+        @return: the seconds to wait before the access
+        @rtype: float
         """
-        self.lock.acquire()
-        try:
+        with self.lock:
             wait = self.waittime(write=write)
+            if config.throttle_shared_rate:
+                wait = max(wait, self.shared_waittime())
             # Calculate the multiplicity of the next delay based on how
             # big the request is that is being posted now.
             # We want to add "one delay" for each factor of two in the
@@ -272,31 +429,56 @@ class Throttle(object):
             # the delay time for the server.
             self.next_multiplicity = math.log(1 + requestsize) / math.log(2.0)
 
-            self.wait(wait)
-
             if write:
-                self.last_write = time.time()
+                self.last_write = time.time() + wait
             else:
-                self.last_read = time.time()
-        finally:
-            self.lock.release()
+                self.last_read = time.time() + wait
+            return wait
 
-    def lag(self, lagtime):
-        """Seize the throttle lock due to server lag.
+    def __call__(self, requestsize=1, write=False):
+        """Block the calling thread if the throttle time has not expired.
 
-        This will prevent any thread from accessing this site.
+        Parameter requestsize is the number of Pages to be read/written;
+        multiply delay time by an appropriate factor.
+
+        The thread sleeps without holding the throttle lock, so other
+        threads are scheduled after it without waiting for it. Reads are
+        not delayed by writes and vice versa.
 
         """
-        started = time.time()
-        self.lock.acquire()
-        try:
-            # start at 1/2 the current server lag time
-            # wait at least 5 seconds but not more than 120 seconds
-            delay = min(max(5, lagtime // 2), 120)
-            # account for any time we waited while acquiring the lock
-            wait = delay - (time.time() - started)
+        self.wait(self.reserve(requestsize, write))
 
-            self.wait(wait)
+    def wait_async(self, requestsize=1, write=False, loop=None):
+        """Return an asyncio coroutine which waits for the throttle.
 
-        finally:
-            self.lock.release()
+        It reserves the time of the access like a call of the throttle, but
+        waits without blocking the event loop:
+
+            yield from site.throttle.wait_async(write=True)
+
+        @param loop: the event loop; defaults to the current event loop
+        @rtype: coroutine
+        """
+        import asyncio
+
+        seconds = self.reserve(requestsize, write)
+        metrics.observe('throttle.wait', max(seconds, 0))
+        if seconds > 0:
+            self._announce(seconds)
+        if loop is None:
+            return asyncio.sleep(max(seconds, 0))
+        return asyncio.sleep(max(seconds, 0), loop=loop)
+
+    def lag(self, lagtime):
+        """Pause the access to this site due to server lag.
+
+        The calling thread sleeps and no other thread may access the site
+        until the delay has expired.
+
+        """
+        # start at 1/2 the current server lag time
+        # wait at least 5 seconds but not more than 120 seconds
+        delay = min(max(5, lagtime // 2), 120)
+        with self.lock:
+            self.lag_until = max(self.lag_until, time.time() + delay)
+        self.wait(delay)
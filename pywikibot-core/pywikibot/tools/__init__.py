@@ -10,6 +10,7 @@ __version__ = '$Id$'
 
 import collections
 import inspect
+import itertools
 import re
 import sys
 import threading
@@ -111,6 +112,8 @@ class ComparableMixin(object):
 
     """Mixin class to allow comparing to other objects which are comparable."""
 
+    __slots__ = ()
+
     def __lt__(self, other):
         """Compare if other is less than self."""
         return other >= self._cmpkey()
@@ -453,6 +456,94 @@ def itergroup(iterable, size):
         yield group
 
 
+class _PrefetchThread(threading.Thread):
+
+    """Thread computing the result of one item for L{prefetch_map}."""
+
+    def __init__(self, function, item, done=None):
+        """Constructor."""
+        super(_PrefetchThread, self).__init__(name='PrefetchThread')
+        self.setDaemon(True)
+        self.function = function
+        self.item = item
+        self.done = done
+        self.result = None
+        self.exception = None
+
+    def run(self):
+        """Compute the result and notify the done queue."""
+        try:
+            self.result = self.function(self.item)
+        except BaseException as e:
+            self.exception = e
+        finally:
+            if self.done is not None:
+                self.done.put(self)
+
+
+def _join_interruptibly(thread):
+    """Wait for a thread to finish."""
+    # join with timeout to remain interruptible
+    while thread.isAlive():
+        thread.join(0.25)
+
+
+def prefetch_map(function, iterable, size, ordered=True):
+    """Make an iterator that computes function(item) ahead in threads.
+
+    Up to size items of iterable are processed in background threads, also
+    while the caller handles a result, so that the number of buffered
+    results is limited by size. The iterable itself is consumed in the
+    calling thread. An exception raised by function is raised again when its result
+    would have been returned, after the other pending items are finished.
+
+    >>> list(prefetch_map(lambda x: x * 2, range(5), 2))
+    [0, 2, 4, 6, 8]
+
+    @param function: callable which gets one item and returns its result
+    @param iterable: items to process
+    @param size: number of items which are processed at the same time
+    @type size: int
+    @param ordered: return the results in the order of the items, otherwise
+        in the order they are completed
+    @type ordered: bool
+    """
+    if size < 1:
+        raise ValueError('prefetch_map requires a size of at least 1')
+    done = None if ordered else Queue.Queue()
+    pending = collections.deque()
+    iterator = iter(iterable)
+
+    def fill():
+        """Start processing items until size items are pending."""
+        for item in itertools.islice(iterator, size - len(pending)):
+            thread = _PrefetchThread(function, item, done)
+            thread.start()
+            pending.append(thread)
+
+    fill()
+    while pending:
+        if ordered:
+            thread = pending.popleft()
+            _join_interruptibly(thread)
+        else:
+            while True:
+                try:
+                    thread = done.get(True, 0.25)
+                except Queue.Empty:
+                    continue
+                break
+            pending.remove(thread)
+
+        if thread.exception is not None:
+            for other in pending:
+                _join_interruptibly(other)
+            raise thread.exception
+        # the next item is processed while the caller handles this result
+        fill()
+        yield thread.result
+
+
 class ThreadList(list):
 
     """A simple threadpool class to limit the number of simultaneous threads.
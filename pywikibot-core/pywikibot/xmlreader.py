@@ -7,6 +7,11 @@ Each XmlEntry object represents a page, as read from an XML source
 The XmlDump class reads a pages_current XML dump (like the ones offered on
 https://dumps.wikimedia.org/backup-index.html) and offers a generator over
 XmlEntry objects which can be used by other bots.
+
+Multistream bz2 dumps consist of many independently compressed streams of
+about a hundred pages each, and come with an index file which contains the
+offset of the stream of each page. If this index is given, XmlDump
+decompresses and parses the streams in a pool of processes.
 """
 #
 # (C) Pywikibot team, 2005-2013
@@ -18,11 +23,171 @@ from __future__ import unicode_literals
 __version__ = '$Id$'
 #
 
-import threading
+import bz2
+import io
+import multiprocessing
+import os
 import re
+import sqlite3
+import threading
 from xml.etree.cElementTree import iterparse
+from xml.sax.saxutils import unescape
 import xml.sax
 
+# the fields of a page read by the index builder
+_PAGE_FIELD = re.compile(br'<(title|ns|id)>([^<]*)</\1>')
+
+_ROOT_TAG = re.compile(br'<mediawiki\b[^>]*>')
+
+# the tags read from pages, revisions and contributors
+_TAGS = ('title', 'ns', 'id', 'restrictions', 'redirect', 'timestamp',
+         'comment', 'contributor', 'text', 'ip', 'username')
+
+
+def read_multistream_offsets(filename):
+    """
+    Read the stream offsets of a multistream dump from its index file.
+
+    Each line of the index contains the offset of a stream, the id and the
+    title of a page in it, separated by colons.
+
+    @param filename: the index file, which may be bz2 compressed
+    @type filename: str
+    @return: the sorted offsets of the streams containing pages
+    @rtype: list of int
+    """
+    if filename.endswith('.bz2'):
+        index = bz2.BZ2File(filename)
+    else:
+        index = open(filename, 'rb')
+    offsets = set()
+    # BZ2File is no context manager in Python 2.6
+    try:
+        for line in index:
+            offset, _, rest = line.partition(b':')
+            if rest:
+                offsets.add(int(offset))
+    finally:
+        index.close()
+    return sorted(offsets)
+
+
+def _parse_stream(task):
+    """
+    Parse one stream of a multistream dump.
+
+    It is a separate function so that it can be run by a process pool.
+
+    @param task: the dump filename, the offset of the stream, the offset of
+        the next stream or None, the root element start tag of the dump,
+        whether all revisions are parsed and the page filter
+    @type task: tuple
+    @return: the entries of the pages in the stream
+    @rtype: list of XmlEntry
+    """
+    filename, start, end, header, allrevisions, page_filter = task
+    with open(filename, 'rb') as dump:
+        dump.seek(start)
+        data = dump.read(-1 if end is None else end - start)
+    data = bz2.BZ2Decompressor().decompress(data)
+    first = data.find(b'<page>')
+    if first < 0:
+        return []
+    last = data.rindex(b'</page>') + len(b'</page>')
+    source = io.BytesIO(header + data[first:last] + b'</mediawiki>')
+    dump = XmlDump(filename, allrevisions)
+    dump._filter = page_filter
+    return list(dump._parse_source(source))
+
+
+def _scan_pages(lines):
+    """
+    Find the pages in lines of a UTF-8 XML dump.
+
+    @param lines: the lines of the dump
+    @type lines: iterable of bytes
+    @return: the offset of the page element relative to the first line, the
+        title, namespace and page id of each page
+    @rtype: generator of tuple
+    """
+    offset = 0
+    page = None
+    for line in lines:
+        if line.strip() == b'<page>':
+            page = {'offset': offset}
+        elif page is not None:
+            match = _PAGE_FIELD.search(line)
+            if match:
+                page.setdefault(match.group(1), match.group(2))
+                if len(page) == 4:
+                    title = unescape(page[b'title'].decode('utf-8'),
+                                     {'&quot;': '"', '&#039;': "'"})
+                    yield (page['offset'], title, int(page[b'ns']),
+                           int(page[b'id']))
+                    page = None
+        offset += len(line)
+
+
+class _PrefixedFile(object):
+
+    """Read only file object which reads a prefix before a file."""
+
+    def __init__(self, prefix, source):
+        """Constructor."""
+        self.prefix = prefix
+        self.source = source
+
+    def read(self, size=-1):
+        """Read at most size bytes, or everything if size is negative."""
+        if not self.prefix:
+            return self.source.read(size)
+        if size < 0:
+            data = self.prefix + self.source.read()
+            self.prefix = b''
+        else:
+            data = self.prefix[:size]
+            self.prefix = self.prefix[size:]
+        return data
+
+
+class _MultistreamFile(object):
+
+    """Read only file object which decompresses consecutive bz2 streams."""
+
+    def __init__(self, source):
+        """Constructor."""
+        self.source = source
+        self.decompressor = bz2.BZ2Decompressor()
+        self.buffer = b''
+
+    def _decompress(self, data):
+        """Decompress data, which may continue with the next stream."""
+        result = b''
+        while data:
+            try:
+                result += self.decompressor.decompress(data)
+            except EOFError:
+                # the previous stream ended with the previous data
+                self.decompressor = bz2.BZ2Decompressor()
+                continue
+            data = self.decompressor.unused_data
+            if data:
+                self.decompressor = bz2.BZ2Decompressor()
+        return result
+
+    def read(self, size=-1):
+        """Read at most size bytes, or everything if size is negative."""
+        while size < 0 or len(self.buffer) < size:
+            data = self.source.read(65536)
+            if not data:
+                break
+            self.buffer += self._decompress(data)
+        if size < 0:
+            size = len(self.buffer)
+        data = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        return data
+
 
 def parseRestrictions(restrictions):
     """
@@ -47,9 +212,19 @@ def parseRestrictions(restrictions):
     return editRestriction, moveRestriction
 
 
-class XmlEntry:
+class XmlEntry(object):
 
-    """Represent a page."""
+    """
+    Represent a page.
+
+    The text may be given UTF-8 encoded, and is then decoded when it is
+    accessed first. Pickled entries, e.g. those sent by the processes parsing
+    a multistream dump, contain the encoded text.
+    """
+
+    __slots__ = ('title', 'ns', 'id', '_text', 'username', 'ipedit',
+                 'timestamp', 'editRestriction', 'moveRestriction',
+                 'revisionid', 'comment', 'isredirect')
 
     def __init__(self, title, ns, id, text, username, ipedit, timestamp,
                  editRestriction, moveRestriction, revisionid, comment,
@@ -59,7 +234,7 @@ class XmlEntry:
         self.title = title
         self.ns = ns
         self.id = id
-        self.text = text
+        self._text = text
         self.username = username.strip()
         self.ipedit = ipedit
         self.timestamp = timestamp
@@ -69,6 +244,66 @@ class XmlEntry:
         self.comment = comment
         self.isredirect = redirect
 
+    @property
+    def text(self):
+        """Return the page text."""
+        if isinstance(self._text, bytes):
+            self._text = self._text.decode('utf-8')
+        return self._text
+
+    @text.setter
+    def text(self, value):
+        """Set the page text."""
+        self._text = value
+
+    def __getstate__(self):
+        """Return the attributes with the encoded text for pickling."""
+        state = [getattr(self, name) for name in self.__slots__]
+        if not isinstance(self._text, bytes):
+            state[3] = self._text.encode('utf-8')
+        return state
+
+    def __setstate__(self, state):
+        """Restore the attributes of a pickled entry."""
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+
+class _PageFilter(object):
+
+    """The criteria of the pages yielded by L{XmlDump.parse}."""
+
+    def __init__(self, namespaces=None, redirect=None, title=None,
+                 minlength=None, maxlength=None):
+        """Constructor."""
+        if namespaces is not None:
+            namespaces = set('%s' % ns for ns in namespaces)
+        if title is not None and not hasattr(title, 'search'):
+            title = re.compile(title)
+        self.namespaces = namespaces
+        self.redirect = redirect
+        self.title = title
+        self.minlength = minlength
+        self.maxlength = maxlength
+
+    def accepts_page(self, title, ns, isredirect):
+        """Return whether the revisions of a page may be yielded."""
+        return ((self.namespaces is None or ns in self.namespaces) and
+                (self.redirect is None or isredirect == self.redirect) and
+                (self.title is None or
+                 self.title.search(title or '') is not None))
+
+    def accepts_text(self, text):
+        """Return whether the text element of a revision is accepted."""
+        if self.minlength is None and self.maxlength is None:
+            return True
+        length = text.get('bytes') if text is not None else '0'
+        if length is None:
+            length = len((text.text or '').encode('utf-8'))
+        length = int(length)
+        return ((self.minlength is None or length >= self.minlength) and
+                (self.maxlength is None or length <= self.maxlength))
+
 
 class XmlParserThread(threading.Thread):
 
@@ -93,6 +328,95 @@ class XmlParserThread(threading.Thread):
         xml.sax.parse(self.filename, self.handler)
 
 
+class XmlDumpIndex(object):
+
+    """
+    Index of the pages of an XML dump by title and page id.
+
+    The index is an sqlite database which records the title, page id and
+    namespace of each page, and the offset where parsing can start to read
+    it. The offset is the byte offset of the page element in an uncompressed
+    dump and the offset of the stream containing it in a multistream bz2
+    dump. Other compressed dumps can't be indexed.
+
+    Use L{XmlDump.build_index} to build the index of a dump once.
+    """
+
+    def __init__(self, path):
+        """
+        Constructor.
+
+        @param path: path of the database file
+        @type path: str
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path)
+
+    @classmethod
+    def build(cls, dump, path):
+        """
+        Build the index of a dump, replacing an existing index.
+
+        @param dump: the dump
+        @type dump: XmlDump
+        @param path: path of the database file
+        @type path: str
+        @rtype: XmlDumpIndex
+        @raises ValueError: the dump is compressed, but not a multistream
+            dump with an index of its streams
+        """
+        if dump.index:
+            pages = dump._scan_multistream()
+        elif dump.filename.endswith(('.bz2', '.gz', '.7z')):
+            raise ValueError('Only uncompressed and multistream bz2 dumps '
+                             'can be indexed, not %s' % dump.filename)
+        else:
+            pages = dump._scan_single_stream()
+        if os.path.exists(path):
+            os.remove(path)
+        index = cls(path)
+        with index.connection:
+            index.connection.executescript('''
+                CREATE TABLE pages (
+                    position INTEGER PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    ns INTEGER NOT NULL,
+                    pageid INTEGER NOT NULL,
+                    offset INTEGER NOT NULL
+                );
+                CREATE INDEX pages_title ON pages (title);
+                CREATE INDEX pages_pageid ON pages (pageid);
+            ''')
+            index.connection.executemany(
+                'INSERT INTO pages (offset, title, ns, pageid) '
+                'VALUES (?, ?, ?, ?)', pages)
+        return index
+
+    def lookup(self, key):
+        """
+        Return the index data of a page.
+
+        @param key: the title or page id
+        @type key: unicode or int
+        @return: the offset, title, namespace and page id of the page, or
+            None if it isn't in the dump
+        @rtype: tuple or None
+        """
+        column = 'pageid' if isinstance(key, int) else 'title'
+        return self.connection.execute(
+            'SELECT offset, title, ns, pageid FROM pages WHERE %s = ? '
+            'ORDER BY position LIMIT 1' % column, (key, )).fetchone()
+
+    def __len__(self):
+        """Return the number of pages."""
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM pages').fetchone()[0]
+
+    def close(self):
+        """Close the database."""
+        self.connection.close()
+
+
 class XmlDump(object):
 
     """
@@ -101,23 +425,214 @@ class XmlDump(object):
     Reads the local file at initialization,
     parses it, and offers access to the resulting XmlEntries via a generator.
 
+    A multistream bz2 dump is read in parallel if its index file is given.
+    Otherwise it is read as a single stream.
+
     @param allrevisions: boolean
         If True, parse all revisions instead of only the latest one.
         Default: False.
+    @param index: the index file of a multistream bz2 dump, or True to use
+        the index next to the dump with the name used by Wikimedia, e.g.
+        enwiki-20150602-pages-articles-multistream-index.txt.bz2 for
+        enwiki-20150602-pages-articles-multistream.xml.bz2, if it exists
+    @type index: str or bool
+    @param processes: the number of processes parsing the streams of a
+        multistream dump with an index; defaults to the number of CPUs.
+        With one process the streams are parsed in this process.
+    @type processes: int
+    @param ordered: yield the entries of a multistream dump in the order of
+        the dump. Otherwise the entries of each stream are yielded as soon as
+        it is parsed.
+    @type ordered: bool
+
+    The page index of the dump (see L{XmlDumpIndex}), which allows to start
+    reading at a page, is stored next to it with the suffix '.pageindex'.
     """
 
-    def __init__(self, filename, allrevisions=False):
+    def __init__(self, filename, allrevisions=False, index=None,
+                 processes=None, ordered=True):
         """Constructor."""
         self.filename = filename
+        self.allrevisions = allrevisions
         if allrevisions:
             self._parse = self._parse_all
         else:
             self._parse = self._parse_only_latest
+        if index is True:
+            index = None
+            if filename.endswith('-multistream.xml.bz2'):
+                index = filename[:-len('.xml.bz2')] + '-index.txt.bz2'
+                if not os.path.exists(index):
+                    index = None
+        self.index = index
+        self.processes = processes or multiprocessing.cpu_count()
+        self.ordered = ordered
+        self._page_index = None
+        self._filter = _PageFilter()
+
+    @property
+    def page_index(self):
+        """
+        Return the page index of the dump, if it has been built.
+
+        @rtype: XmlDumpIndex or None
+        """
+        if self._page_index is None:
+            path = self.filename + '.pageindex'
+            if os.path.exists(path):
+                self._page_index = XmlDumpIndex(path)
+        return self._page_index
+
+    def build_index(self):
+        """
+        Build the page index of the dump.
+
+        @rtype: XmlDumpIndex
+        @raises ValueError: the dump can't be indexed
+        """
+        if self._page_index is not None:
+            self._page_index.close()
+        self._page_index = XmlDumpIndex.build(self,
+                                              self.filename + '.pageindex')
+        return self._page_index
+
+    def seek(self, start, end=None):
+        """
+        Generator over the entries from a page on.
+
+        With a page index, parsing starts at the page; otherwise all entries
+        before it are parsed and skipped. The entries are always yielded in
+        the order of the dump and not filtered by the criteria of the last
+        L{parse}.
+
+        @param start: the title or page id of the first page
+        @type start: unicode or int
+        @param end: the title or page id of the page to stop before
+        @type end: unicode or int
+        """
+        self._filter = _PageFilter()
+        index = self.page_index
+        if index is not None:
+            found = index.lookup(start)
+            if found is None:
+                return
+            entries = self._parse_from(found[0])
+        elif self.index:
+            entries = self._parse_multistream(ordered=True)
+        else:
+            entries = self._parse_single_stream()
+        try:
+            started = False
+            for entry in entries:
+                if not started:
+                    if not self._is_page(entry, start):
+                        continue
+                    started = True
+                if end is not None and self._is_page(entry, end):
+                    break
+                yield entry
+        finally:
+            entries.close()
+
+    def get(self, key):
+        """
+        Return the entry of a page.
+
+        When all revisions are parsed, the entry of its first revision is
+        returned.
 
-    def parse(self):
-        """Generator using cElementTree iterparse function."""
+        @param key: the title or page id
+        @type key: unicode or int
+        @rtype: XmlEntry
+        @raises KeyError: the page isn't in the dump
+        """
+        entries = self.seek(key)
+        try:
+            return next(entries)
+        except StopIteration:
+            raise KeyError(key)
+        finally:
+            entries.close()
+
+    @staticmethod
+    def _is_page(entry, key):
+        """Return whether an entry belongs to the page with title or id key."""
+        if isinstance(key, int):
+            return int(entry.id) == key
+        return entry.title == key
+
+    def _parse_from(self, offset):
+        """
+        Parse the dump from an offset of the page index.
+
+        The streams of a multistream dump are decompressed in this process
+        as far as they are read, so that a lookup only reads the stream of
+        the page.
+        """
+        with open(self.filename, 'rb') as source:
+            if self.filename.endswith('.bz2'):
+                # the offset is that of a stream of a multistream dump
+                header = _MultistreamFile(source).read(65536)
+                source.seek(offset)
+                data = _MultistreamFile(source)
+            else:
+                header = source.read(65536)
+                source.seek(offset)
+                data = source
+            header = _ROOT_TAG.search(header).group()
+            for rev in self._parse_source(_PrefixedFile(header, data)):
+                yield rev
+
+    def _scan_single_stream(self):
+        """Find the pages of an uncompressed dump for its page index."""
+        with open(self.filename, 'rb') as source:
+            for page in _scan_pages(source):
+                yield page
+
+    def _scan_multistream(self):
+        """Find the pages of a multistream dump for its page index."""
+        offsets = read_multistream_offsets(self.index)
+        ends = offsets[1:] + [None]
+        with open(self.filename, 'rb') as dump:
+            for start, end in zip(offsets, ends):
+                dump.seek(start)
+                data = dump.read(-1 if end is None else end - start)
+                data = bz2.BZ2Decompressor().decompress(data)
+                for page in _scan_pages(data.splitlines(True)):
+                    yield (start, ) + page[1:]
+
+    def parse(self, namespaces=None, redirect=None, title=None,
+              minlength=None, maxlength=None):
+        """
+        Generator using cElementTree iterparse function.
+
+        The filters are applied while parsing, so that no entry is created
+        for pages which are left out.
+
+        @param namespaces: only yield pages in these namespaces
+        @type namespaces: iterable of int or str
+        @param redirect: if True, only yield redirects, if False only pages
+            which are no redirects
+        @type redirect: bool or None
+        @param title: only yield pages whose title matches this regex
+        @type title: str or compiled regex
+        @param minlength: only yield revisions with at least this number of
+            bytes of text
+        @type minlength: int
+        @param maxlength: only yield revisions with at most this number of
+            bytes of text
+        @type maxlength: int
+        """
+        self._filter = _PageFilter(namespaces, redirect, title,
+                                   minlength, maxlength)
+        if self.index:
+            return self._parse_multistream(self.ordered)
+        else:
+            return self._parse_single_stream()
+
+    def _parse_single_stream(self):
+        """Parse the dump as a single stream."""
         if self.filename.endswith('.bz2'):
-            import bz2
             source = bz2.BZ2File(self.filename)
         elif self.filename.endswith('.gz'):
             import gzip
@@ -133,72 +648,189 @@ class XmlDump(object):
             # assume it's an uncompressed XML file
             source = open(self.filename, 'rb')
         try:
-            # iterparse's event must be a str but they are unicode with
-            # unicode_literals in Python 2
-            context = iterparse(source, events=(str('start'), str('end'),
-                                                str('start-ns')))
-            self.root = None
-
-            for event, elem in context:
-                if event == "start-ns" and elem[0] == "":
-                    self.uri = elem[1]
-                    continue
-                if event == "start" and self.root is None:
-                    self.root = elem
-                    continue
-                for rev in self._parse(event, elem):
-                    yield rev
+            for rev in self._parse_source(source):
+                yield rev
         finally:
             source.close()
 
+    def _parse_source(self, source):
+        """Parse an XML file object."""
+        # iterparse's event must be a str but they are unicode with
+        # unicode_literals in Python 2
+        context = iterparse(source, events=(str('start'), str('end'),
+                                            str('start-ns')))
+        self.root = None
+
+        for event, elem in context:
+            if event == "start-ns" and elem[0] == "":
+                self._set_uri(elem[1])
+                continue
+            if event == "start" and self.root is None:
+                self.root = elem
+                continue
+            for rev in self._parse(event, elem):
+                yield rev
+
+    def _parse_multistream(self, ordered):
+        """
+        Parse the streams of a multistream dump in parallel.
+
+        @param ordered: yield the entries in the order of the dump
+        @type ordered: bool
+        """
+        offsets = read_multistream_offsets(self.index)
+        if not offsets:
+            return
+        # the first stream usually only contains the siteinfo header
+        with open(self.filename, 'rb') as dump:
+            first = bz2.BZ2Decompressor().decompress(
+                dump.read(offsets[0] or
+                          (offsets[1] if len(offsets) > 1 else -1)))
+        header = _ROOT_TAG.search(first).group()
+        ends = offsets[1:] + [None]
+        tasks = [(self.filename, offset, end, header, self.allrevisions,
+                  self._filter)
+                 for offset, end in zip(offsets, ends)]
+
+        if self.processes == 1:
+            for task in tasks:
+                for entry in _parse_stream(task):
+                    yield entry
+            return
+
+        # Limit the parsed streams waiting to be yielded
+        window = threading.Semaphore(self.processes * 4)
+        stopped = []
+
+        def submit():
+            for task in tasks:
+                window.acquire()
+                if stopped:
+                    return
+                yield task
+
+        pool = multiprocessing.Pool(self.processes)
+        try:
+            if ordered:
+                results = pool.imap(_parse_stream, submit())
+            else:
+                results = pool.imap_unordered(_parse_stream, submit())
+            for entries in results:
+                window.release()
+                for entry in entries:
+                    yield entry
+        finally:
+            # stop the task submission and wait for the submitted streams;
+            # terminating the pool may hang while a result is being sent
+            stopped.append(True)
+            window.release()
+            pool.close()
+            pool.join()
+
+    def _set_uri(self, uri):
+        """Set the namespace URI of the dump and the tags in it."""
+        self.uri = uri
+        self._page_tag = '{%s}page' % uri
+        self._revision_tag = '{%s}revision' % uri
+        self._tags = dict(('{%s}%s' % (uri, name), name)
+                          for name in _TAGS)
+
     def _parse_only_latest(self, event, elem):
         """Parser that yields only the latest revision."""
-        if event == "end" and elem.tag == "{%s}page" % self.uri:
-            self._headers(elem)
-            revision = elem.find("{%s}revision" % self.uri)
-            yield self._create_revision(revision)
+        if event == "end" and elem.tag == self._page_tag:
+            if self._headers(elem):
+                revision = elem.find(self._revision_tag)
+                entry = self._create_revision(revision)
+                if entry is not None:
+                    yield entry
             elem.clear()
             self.root.clear()
 
     def _parse_all(self, event, elem):
         """Parser that yields all revisions."""
-        if event == "start" and elem.tag == "{%s}page" % self.uri:
-            self._headers(elem)
-        if event == "end" and elem.tag == "{%s}revision" % self.uri:
-            yield self._create_revision(elem)
+        if event == "start" and elem.tag == self._page_tag:
+            self._page = elem
+            self._accepted = None
+        if event == "end" and elem.tag == self._revision_tag:
+            # the headers precede the revisions
+            if self._accepted is None:
+                self._accepted = self._headers(self._page)
+            if self._accepted:
+                entry = self._create_revision(elem)
+                if entry is not None:
+                    yield entry
             elem.clear()
             self.root.clear()
 
     def _headers(self, elem):
-        """Extract headers from XML chunk."""
-        self.title = elem.findtext("{%s}title" % self.uri)
-        self.ns = elem.findtext("{%s}ns" % self.uri)
-        self.pageid = elem.findtext("{%s}id" % self.uri)
-        self.restrictions = elem.findtext("{%s}restrictions" % self.uri)
-        self.isredirect = elem.findtext("{%s}redirect" % self.uri) is not None
+        """
+        Extract headers from XML chunk.
+
+        @return: whether the page is accepted by the filter
+        @rtype: bool
+        """
+        fields = self._fields(elem)
+        self.title = fields.get('title')
+        self.ns = fields.get('ns')
+        self.pageid = fields.get('id')
+        self.restrictions = fields.get('restrictions')
+        self.isredirect = 'redirect' in fields
+        if not self._filter.accepts_page(self.title, self.ns,
+                                         self.isredirect):
+            return False
         self.editRestriction, self.moveRestriction = parseRestrictions(
             self.restrictions)
+        return True
+
+    def _fields(self, elem):
+        """Return the text of the first child element of each known tag."""
+        fields = {}
+        tags = self._tags
+        for child in elem:
+            name = tags.get(child.tag)
+            if name is not None and name not in fields:
+                fields[name] = child.text or ''
+        return fields
 
     def _create_revision(self, revision):
-        """Create a Single revision."""
-        revisionid = revision.findtext("{%s}id" % self.uri)
-        timestamp = revision.findtext("{%s}timestamp" % self.uri)
-        comment = revision.findtext("{%s}comment" % self.uri)
-        contributor = revision.find("{%s}contributor" % self.uri)
-        ipeditor = contributor.findtext("{%s}ip" % self.uri)
-        username = ipeditor or contributor.findtext("{%s}username" % self.uri)
+        """
+        Create a Single revision.
+
+        @return: the entry or None if the filter doesn't accept its text
+        @rtype: XmlEntry or None
+        """
+        fields = {}
+        tags = self._tags
+        contributor = text = None
+        for child in revision:
+            name = tags.get(child.tag)
+            if name == 'text':
+                if text is None:
+                    text = child
+            elif name == 'contributor':
+                if contributor is None:
+                    contributor = child
+            elif name is not None and name not in fields:
+                fields[name] = child.text or ''
+        if not self._filter.accepts_text(text):
+            return None
+        if contributor is not None:
+            contributor = self._fields(contributor)
+        else:
+            contributor = {}
+        ipeditor = contributor.get('ip')
+        username = ipeditor or contributor.get('username')
         # could get comment, minor as well
-        text = revision.findtext("{%s}text" % self.uri)
         return XmlEntry(title=self.title,
                         ns=self.ns,
                         id=self.pageid,
-                        text=text or u'',
+                        text=text is not None and text.text or u'',
                         username=username or u'',  # username might be deleted
                         ipedit=bool(ipeditor),
-                        timestamp=timestamp,
+                        timestamp=fields.get('timestamp'),
                         editRestriction=self.editRestriction,
                         moveRestriction=self.moveRestriction,
-                        revisionid=revisionid,
-                        comment=comment,
+                        revisionid=fields.get('id'),
+                        comment=fields.get('comment'),
                         redirect=self.isredirect
                         )
@@ -97,6 +97,7 @@ from __future__ import unicode_literals
 __version__ = '$Id$'
 #
 import datetime
+import itertools
 import time
 import os
 import re
@@ -287,6 +288,19 @@ class DiscussionThread(object):
         if timestamp:
             self.timestamp = max(self.timestamp, timestamp)
 
+    def feed_lines(self, lines):
+        """Add lines to the thread and search them for timestamps at once."""
+        if not self.content:
+            # skip the empty lines after the header, like feed_line
+            lines = list(itertools.dropwhile(lambda line: not line, lines))
+        if not lines:
+            return
+        text = '\n'.join(lines) + '\n'
+        self.content += text
+        timestamp = self.ts.timestrip_text(text)
+        if timestamp and (not self.timestamp or timestamp > self.timestamp):
+            self.timestamp = timestamp
+
     def size(self):
         return len(self.title.encode('utf-8')) + len(
             self.content.encode('utf-8')) + 12
@@ -354,20 +368,24 @@ class DiscussionPage(pywikibot.Page):
         lines = self.get().split('\n')
         found = False  # Reading header
         cur_thread = None
+        thread_lines = []
         for line in lines:
             thread_header = re.search('^== *([^=].*?) *== *$', line)
             if thread_header:
                 found = True  # Reading threads now
                 if cur_thread:
+                    cur_thread.feed_lines(thread_lines)
                     self.threads.append(cur_thread)
                 cur_thread = DiscussionThread(thread_header.group(1), self.now,
                                               self.timestripper)
+                thread_lines = []
             else:
                 if found:
-                    cur_thread.feed_line(line)
+                    thread_lines.append(line)
                 else:
                     self.header += line + '\n'
         if cur_thread:
+            cur_thread.feed_lines(thread_lines)
             self.threads.append(cur_thread)
         # This extra info is not desirable when run under the unittest
         # framework, which may be run either directly or via setup.py
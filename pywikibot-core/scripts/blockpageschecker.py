@@ -287,6 +287,9 @@ def main(*args):
         pywikibot.output(u'Categories loaded, start!')
     # Main Loop
     preloadingGen = pagegenerators.PreloadingGenerator(generator, step=60)
+    # load the protections of the pages used below together
+    preloadingGen = pagegenerators.PropertyPreloadingGenerator(
+        preloadingGen, ['info'], step=60)
     for page in preloadingGen:
         pagename = page.title(asLink=True)
         pywikibot.output('Loading %s...' % pagename)
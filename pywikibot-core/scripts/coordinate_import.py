@@ -48,7 +48,8 @@ class CoordImportRobot(WikidataBot):
 
         """
         super(CoordImportRobot, self).__init__()
-        self.generator = pagegenerators.PreloadingGenerator(generator)
+        self.generator = pagegenerators.PropertyPreloadingGenerator(
+            pagegenerators.PreloadingGenerator(generator), ['coordinates'])
         self.cacheSources()
         self.prop = 'P625'
 
@@ -44,7 +44,8 @@ class IllustrateRobot(WikidataBot):
 
         """
         super(IllustrateRobot, self).__init__()
-        self.generator = pagegenerators.PreloadingGenerator(generator)
+        self.generator = pagegenerators.PropertyPreloadingGenerator(
+            pagegenerators.PreloadingGenerator(generator), ['pageprops'])
         self.wdproperty = wdproperty
         self.cacheSources()
 
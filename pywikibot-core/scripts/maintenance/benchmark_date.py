@@ -0,0 +1,136 @@
+# -*- coding: utf-8  -*-
+"""
+Benchmark the number of titles per second recognized by date.getAutoFormat.
+
+The titles are the values which tests/date_tests.py checks: every format
+of a language applied to the values within its limits. Each title is also
+given with the case of its first letter swapped. They are recognized by
+the former implementation, which tries every format of date.formats, and
+by getAutoFormat, which only tries the formats found in the index of the
+language. The time to build the indexes is given separately.
+
+Afterwards the same values are formatted and decoded again by the formats
+and by their tables returned by date.getFormatTable, including the time
+to create the tables.
+
+Syntax: python pwb.py benchmark_date [-code:xx] [-count:N]
+
+The default are the languages en, de, fr, ru, zh and fa and 1 round; the
+argument -code can be given multiple times.
+"""
+#
+# (C) Pywikibot team, 2015
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import unicode_literals
+
+__version__ = '$Id$'
+#
+
+import time
+
+import pywikibot
+from pywikibot import date
+
+
+def scan(lang, title, ignoreFirstLetterCase=True):
+    """Return the first format decoding title, trying every format."""
+    for dictName, dict in date.formats.items():
+        try:
+            return dictName, dict[lang](title)
+        except Exception:
+            pass
+    if ignoreFirstLetterCase and title:
+        if title[0].isupper():
+            title = title[0].lower() + title[1:]
+        else:
+            title = title[0].upper() + title[1:]
+        return scan(lang, title, ignoreFirstLetterCase=False)
+    return None, None
+
+
+def formatted(lang):
+    """Return the format names, values and formatted values of a language."""
+    result = []
+    for dictName, dict in date.formats.items():
+        if lang not in dict:
+            continue
+        step = 10 if dictName in date.decadeFormats else 1
+        predicate, start, stop = date.formatLimits[dictName]
+        for value in range(start, stop, step):
+            result.append((dictName, value, dict[lang](value)))
+    return result
+
+
+def titles(lang):
+    """Return the formatted values of a language and their case variants."""
+    result = []
+    for dictName, value, title in formatted(lang):
+        result.append(title)
+        result.append(title[0].swapcase() + title[1:])
+    return result
+
+
+def rate(label, function, count):
+    """Call function and output the number of titles/s."""
+    start = time.time()
+    results = function()
+    elapsed = time.time() - start
+    pywikibot.output('%-28s %10.1f titles per second'
+                     % (label, count / elapsed if elapsed else 0))
+    return results
+
+
+def main(*args):
+    """Process command line arguments and run the benchmark."""
+    langs = []
+    count = 1
+    for arg in pywikibot.handle_args(args):
+        if arg.startswith('-code:'):
+            langs.append(arg[len('-code:'):])
+        elif arg.startswith('-count:'):
+            count = int(arg[len('-count:'):])
+        else:
+            pywikibot.warning('Unknown argument %s' % arg)
+    langs = langs or ['en', 'de', 'fr', 'ru', 'zh', 'fa']
+
+    values = [(lang, title) for lang in langs for title in titles(lang)]
+    pywikibot.output('%d titles in %d languages:'
+                     % (len(values), len(langs)))
+    start = time.time()
+    for lang in langs:
+        date._getFormatIndex(lang)
+    pywikibot.output('%-28s %10.2f seconds' % ('build indexes',
+                                                time.time() - start))
+    expected = rate('scan', lambda: [scan(lang, title)
+                                     for i in range(count)
+                                     for lang, title in values],
+                    len(values) * count)
+    results = rate('index', lambda: [date.getAutoFormat(lang, title)
+                                     for i in range(count)
+                                     for lang, title in values],
+                   len(values) * count)
+    if results != expected:
+        pywikibot.warning('The results of both implementations differ')
+
+    values = [(lang, dictName, value, title) for lang in langs
+              for dictName, value, title in formatted(lang)]
+    pywikibot.output('%d values in %d languages:'
+                     % (len(values), len(langs)))
+    expected = rate('format', lambda: [
+        (date.formats[dictName][lang](value),
+         date.formats[dictName][lang](title))
+        for i in range(count) for lang, dictName, value, title in values],
+        len(values) * count)
+    results = rate('table', lambda: [
+        (date.getFormatTable(dictName, lang)(value),
+         date.getFormatTable(dictName, lang)(title))
+        for i in range(count) for lang, dictName, value, title in values],
+        len(values) * count)
+    if results != expected:
+        pywikibot.warning('The results of the formats and tables differ')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+# -*- coding: utf-8  -*-
+"""
+Benchmark the number of link titles parsed per second.
+
+It parses a mix of plain, namespaced, URL encoded and HTML escaped titles
+as found in dumps and wikitext, and compares namespace lookups using the
+name table of the site with L{Namespace.lookup_name}.
+
+Syntax: python pwb.py benchmark_links [-count:N]
+
+The default is 100000 titles. The links are parsed on the default site,
+which needs its namespaces.
+"""
+#
+# (C) Pywikibot team, 2015
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import unicode_literals
+
+__version__ = '$Id$'
+#
+
+import time
+
+import pywikibot
+from pywikibot.page import Link
+from pywikibot.site import Namespace
+
+TITLE_FORMATS = (
+    'Benchmark page %d',
+    'Talk:Benchmark_page_%d',
+    'User:Benchmark/%d',
+    'Help:Benchmark page %d#Section',
+    ':Category:Benchmark %d',
+    'Benchmark%%20page%%20%d',
+    'Benchmark &amp; page %d',
+)
+
+
+def rate(label, function, items):
+    """Call function for each item and output the number of calls/s."""
+    start = time.time()
+    for item in items:
+        function(item)
+    elapsed = time.time() - start
+    pywikibot.output('%-24s %10.0f per second'
+                     % (label, len(items) / elapsed if elapsed else 0))
+
+
+def main(*args):
+    """Process command line arguments and run the benchmark."""
+    count = 100000
+    for arg in pywikibot.handle_args(args):
+        if arg.startswith('-count:'):
+            count = int(arg[len('-count:'):])
+        else:
+            pywikibot.warning('Unknown argument %s' % arg)
+
+    site = pywikibot.Site()
+    namespaces = site.namespaces
+    titles = [TITLE_FORMATS[i % len(TITLE_FORMATS)] % i for i in range(count)]
+    prefixes = [title.partition(':')[0] for title in titles]
+
+    pywikibot.output('%d titles on %s:' % (count, site))
+    rate('Link.parse', lambda title: Link(title, site).parse(), titles)
+    rate('Link.parse_site', lambda title: Link(title, site).parse_site(),
+         titles)
+    rate('Site.ns_index', site.ns_index, prefixes)
+    rate('Namespace.lookup_name',
+         lambda prefix: Namespace.lookup_name(prefix, namespaces), prefixes)
+
+
+if __name__ == '__main__':
+    main()
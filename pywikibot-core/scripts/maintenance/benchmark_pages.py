@@ -0,0 +1,103 @@
+# -*- coding: utf-8  -*-
+"""
+Benchmark the memory use and hashing of Page and PageRef objects.
+
+For a number of titles it measures the time to create Page objects and
+compact PageRef objects and the memory they use, and the time to hash all
+of them: for pages by their string representation, which was used by
+earlier versions, the first time by the comparison key and again with the
+cached hash.
+
+Syntax: python pwb.py benchmark_pages [-count:N]
+
+The default is a million titles. The pages are created on the default site,
+which needs its namespaces. Memory is only measured on Python 3.4 and later.
+"""
+#
+# (C) Pywikibot team, 2015
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import unicode_literals
+
+__version__ = '$Id$'
+#
+
+import gc
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+import pywikibot
+from pywikibot.page import PageRef
+
+if sys.version_info[0] > 2:
+    unicode = str
+
+
+def measure(label, function, *args):
+    """Run function and output its time and the memory it allocated.
+
+    @return: the result of function
+    """
+    gc.collect()
+    if tracemalloc:
+        tracemalloc.start()
+    start = time.time()
+    result = function(*args)
+    elapsed = time.time() - start
+    if tracemalloc:
+        memory = '%8.1f MiB' % (tracemalloc.get_traced_memory()[0] / 2 ** 20)
+        tracemalloc.stop()
+    else:
+        memory = 'n/a'
+    pywikibot.output('%-28s %8.2f s %s' % (label, elapsed, memory))
+    return result
+
+
+def create_pages(site, titles):
+    """Return a Page for each title."""
+    return [pywikibot.Page(site, title) for title in titles]
+
+
+def create_refs(site, titles):
+    """Return a PageRef for each title."""
+    return [PageRef(site, title, 0) for title in titles]
+
+
+def hash_unicode(pages):
+    """Hash each page by its string representation."""
+    return [hash(unicode(page)) for page in pages]
+
+
+def main(*args):
+    """Process command line arguments and run the benchmark."""
+    count = 1000000
+    for arg in pywikibot.handle_args(args):
+        if arg.startswith('-count:'):
+            count = int(arg[len('-count:'):])
+        else:
+            pywikibot.warning('Unknown argument %s' % arg)
+
+    site = pywikibot.Site()
+    site.namespaces
+    titles = ['Benchmark page %d' % i for i in range(count)]
+
+    pywikibot.output('%d titles on %s:' % (count, site))
+    pages = measure('create Page', create_pages, site, titles)
+    measure('hash Page by unicode()', hash_unicode, pages)
+    measure('hash Page', set, pages)
+    measure('hash Page (cached)', set, pages)
+    del pages
+
+    refs = measure('create PageRef', create_refs, site, titles)
+    measure('hash PageRef', set, refs)
+    measure('hash PageRef (cached)', set, refs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8  -*-
+"""
+Benchmark the time a new site needs until it can submit its first request.
+
+Before the first query a site loads its version, namespaces and the API
+parameter information of the query modules. This script measures that time
+for new site objects loading this data from the API cache, and loading it
+from a site snapshot (see config.site_snapshots).
+
+Syntax: python pwb.py benchmark_startup [-repeat:N]
+
+The site is the default site, which may be changed with the global options
+-family and -lang. The first run needs network access to fill the caches.
+"""
+#
+# (C) Pywikibot team, 2015
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import unicode_literals
+
+__version__ = '$Id$'
+#
+
+import time
+
+import pywikibot
+from pywikibot import config
+
+
+def prepare_first_request(site):
+    """Load the data needed by a query of the site and return the query."""
+    site.version()
+    site.namespaces
+    return site.allpages(total=1)
+
+
+def time_startup(site_class, code, fam, repeat):
+    """Return the best and the mean time to prepare the first request.
+
+    @param site_class: the class of the sites to create
+    @param repeat: the number of sites to create
+    @rtype: tuple of float
+    """
+    times = []
+    for i in range(repeat):
+        start = time.time()
+        prepare_first_request(site_class(code, fam))
+        times.append(time.time() - start)
+    return min(times), sum(times) / len(times)
+
+
+def main(*args):
+    """Process command line arguments and run the benchmark."""
+    repeat = 10
+    for arg in pywikibot.handle_args(args):
+        if arg.startswith('-repeat:'):
+            repeat = int(arg[len('-repeat:'):])
+        else:
+            pywikibot.warning('Unknown argument %s' % arg)
+
+    site = pywikibot.Site()
+    site_class = type(site)
+    code, fam = site.code, site.family.name
+
+    # fill the API cache and write the snapshot
+    config.site_snapshots = True
+    warm = site_class(code, fam)
+    prepare_first_request(warm)
+    warm._snapshot.save(force=True)
+
+    pywikibot.output('Time to the first request of %s (%d sites):'
+                     % (site, repeat))
+    for enabled, label in ((False, 'API cache'), (True, 'site snapshot')):
+        config.site_snapshots = enabled
+        best, mean = time_startup(site_class, code, fam, repeat)
+        pywikibot.output('%-14s best %8.2f ms, mean %8.2f ms'
+                         % (label, best * 1000, mean * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# -*- coding: utf-8  -*-
+"""
+Benchmark the number of talk page lines per second searched for timestamps.
+
+It splits talk pages into threads like archivebot and finds the latest
+timestamp of each thread, once by calling TimeStripper.timestripper for
+each line and once by calling TimeStripper.timestrip_text for each thread.
+
+The pages are the *.page files in tests/pages and a generated talk page
+with signed comments in the format of the site.
+
+Syntax: python pwb.py benchmark_timestripper [-count:N]
+
+The default is 20 rounds. The timestamps are parsed for the default site,
+which needs its month names.
+"""
+#
+# (C) Pywikibot team, 2015
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import unicode_literals
+
+__version__ = '$Id$'
+#
+
+import codecs
+import glob
+import os
+import re
+import time
+
+import pywikibot
+from pywikibot.textlib import TimeStripper
+
+PAGES = os.path.join(os.path.dirname(__file__), '..', '..', 'tests', 'pages')
+
+COMMENT = ('%(indent)sComment %(i)d with a [[link]] and a '
+           '[http://example.org/%(i)d source]. [[User:U%(i)d|U%(i)d]] '
+           '([[User talk:U%(i)d|talk]]) %(time)s\n')
+
+
+def talk_page(site, threads=200, comments=8):
+    """Return a talk page with signed comments."""
+    months = site.months_names
+    lines = []
+    for i in range(threads):
+        lines.append('== Thread %d ==\n' % i)
+        for j in range(comments):
+            timestamp = '%02d:%02d, %d %s %d (UTC)' % (
+                j, i % 60, i % 28 + 1, months[i % 12][0], 2000 + i % 15)
+            lines.append(COMMENT % {'indent': ':' * j, 'i': i * comments + j,
+                                    'time': timestamp})
+        lines.append('\n')
+    return ''.join(lines)
+
+
+def threads(text):
+    """Split a page into the lines of its threads like archivebot."""
+    result = [[]]
+    for line in text.split('\n'):
+        if re.search('^== *([^=].*?) *== *$', line):
+            result.append([])
+        else:
+            result[-1].append(line)
+    return result
+
+
+def latest(timestamps):
+    """Return the latest timestamp or None."""
+    timestamps = [timestamp for timestamp in timestamps if timestamp]
+    return max(timestamps) if timestamps else None
+
+
+def main(*args):
+    """Process command line arguments and run the benchmark."""
+    count = 20
+    for arg in pywikibot.handle_args(args):
+        if arg.startswith('-count:'):
+            count = int(arg[len('-count:'):])
+        else:
+            pywikibot.warning('Unknown argument %s' % arg)
+
+    site = pywikibot.Site()
+    ts = TimeStripper(site)
+    texts = [talk_page(site)]
+    for filename in sorted(glob.glob(os.path.join(PAGES, '*.page'))):
+        with codecs.open(filename, 'r', 'utf-8') as f:
+            texts.append(f.read())
+    pages = [threads(text) for text in texts]
+    lines = sum(len(thread) for page in pages for thread in page)
+    pywikibot.output('%d pages with %d lines on %s:' % (len(pages), lines,
+                                                        site))
+
+    start = time.time()
+    for i in range(count):
+        by_line = [latest(ts.timestripper(line) for line in thread)
+                   for page in pages for thread in page]
+    elapsed = time.time() - start
+    pywikibot.output('%-24s %10.0f lines per second'
+                     % ('timestripper', lines * count / elapsed))
+
+    start = time.time()
+    for i in range(count):
+        by_thread = [ts.timestrip_text('\n'.join(thread))
+                     for page in pages for thread in page]
+    elapsed = time.time() - start
+    pywikibot.output('%-24s %10.0f lines per second'
+                     % ('timestrip_text', lines * count / elapsed))
+
+    if by_line != by_thread:
+        pywikibot.warning('The timestamps of %d threads differ'
+                          % sum(a != b for a, b in zip(by_line, by_thread)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+# -*- coding: utf-8  -*-
+"""
+Benchmark the time to parse XML dumps.
+
+It parses the XML dumps of the tests and a synthetic dump, all entries and
+with the filters of XmlDump.parse, once without and once with accessing the
+text of the entries.
+
+Syntax: python pwb.py benchmark_xmlreader [-count:N] [-repeat:N]
+
+-count    The number of pages of the synthetic dump, default 20000
+-repeat   How often the dumps of the tests are parsed, default 200
+"""
+#
+# (C) Pywikibot team, 2015
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import unicode_literals
+
+__version__ = '$Id$'
+#
+
+import os
+import shutil
+import tempfile
+import time
+
+import pywikibot
+from pywikibot import xmlreader
+
+_data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         '..', '..', 'tests', 'data', 'xml')
+
+TEST_DUMPS = ('article-pear-0.10.xml', 'article-pyrus.xml', 'pair-0.10.xml')
+
+HEADER = ('<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.10/" '
+          'version="0.10" xml:lang="en">\n')
+
+PAGE = '''  <page>
+    <title>%(title)s</title>
+    <ns>%(ns)d</ns>
+    <id>%(id)d</id>%(redirect)s
+    <revision>
+      <id>%(id)d</id>
+      <timestamp>2015-01-01T00:00:00Z</timestamp>
+      <contributor>
+        <username>Benchmark</username>
+        <id>1</id>
+      </contributor>
+      <comment>benchmark</comment>
+      <text xml:space="preserve" bytes="%(bytes)d">%(text)s</text>
+    </revision>
+  </page>
+'''
+
+FILTERS = (
+    ('all pages', {}),
+    ('namespace 0', {'namespaces': [0]}),
+    ('redirects', {'redirect': True}),
+    ('title regex', {'title': '7$'}),
+    ('at most 1000 bytes', {'maxlength': 1000}),
+)
+
+
+def write_dump(filename, count):
+    """Write a dump of count pages of several namespaces and lengths."""
+    with open(filename, 'wb') as dump:
+        dump.write(HEADER.encode('utf-8'))
+        for i in range(count):
+            if i % 10 == 0:
+                text = '#REDIRECT [[Benchmark page %d]]' % (i + 1)
+            else:
+                text = 'Benchmark [[text]] ' * (i % 200)
+            dump.write((PAGE % {
+                'title': (('Talk:' if i % 3 == 0 else '') +
+                          'Benchmark page %d' % i),
+                'ns': 1 if i % 3 == 0 else 0,
+                'id': i + 1,
+                'redirect': '\n    <redirect title="Benchmark page %d" />'
+                            % (i + 1) if i % 10 == 0 else '',
+                'bytes': len(text),
+                'text': text,
+            }).encode('utf-8'))
+        dump.write(b'</mediawiki>\n')
+
+
+def measure(label, filenames, repeat, filters, read_text):
+    """Parse the dumps and output the time and the number of entries."""
+    count = 0
+    start = time.time()
+    for i in range(repeat):
+        for filename in filenames:
+            for entry in xmlreader.XmlDump(filename).parse(**filters):
+                if read_text:
+                    entry.text
+                count += 1
+    elapsed = time.time() - start
+    pywikibot.output('%-22s %8.2f s %8d entries' % (label, elapsed, count))
+
+
+def benchmark(title, filenames, repeat):
+    """Run the benchmark of all filters on the dumps."""
+    for read_text in (False, True):
+        pywikibot.output('%s, %s:' % (title, 'reading the text' if read_text
+                                      else 'without reading the text'))
+        for label, filters in FILTERS:
+            measure(label, filenames, repeat, filters, read_text)
+
+
+def main(*args):
+    """Process command line arguments and run the benchmark."""
+    count = 20000
+    repeat = 200
+    for arg in pywikibot.handle_args(args):
+        if arg.startswith('-count:'):
+            count = int(arg[len('-count:'):])
+        elif arg.startswith('-repeat:'):
+            repeat = int(arg[len('-repeat:'):])
+        else:
+            pywikibot.warning('Unknown argument %s' % arg)
+
+    benchmark('Test dumps', [os.path.join(_data_dir, filename)
+                             for filename in TEST_DUMPS], repeat)
+
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, 'benchmark.xml')
+        write_dump(filename, count)
+        benchmark('Synthetic dump of %d pages' % count, [filename], 1)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
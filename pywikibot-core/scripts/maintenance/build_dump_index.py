@@ -0,0 +1,62 @@
+# -*- coding: utf-8  -*-
+"""
+Build the page index of an XML dump.
+
+The index records the title, page id and namespace of each page of the dump
+and where reading it can start. Scripts using -xmlstart then start reading
+the dump at that page instead of parsing all pages before it.
+
+Only uncompressed dumps and multistream bz2 dumps with the index file of
+their streams can be indexed.
+
+Syntax: python pwb.py build_dump_index -xml:filename [-index:filename]
+
+-xml         The XML dump
+-index       The index file of the streams of a multistream dump, if it
+             doesn't have the name used by Wikimedia
+"""
+#
+# (C) Pywikibot team, 2015
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import unicode_literals
+
+__version__ = '$Id$'
+#
+
+import time
+
+import pywikibot
+from pywikibot import xmlreader
+
+
+def main(*args):
+    """Process command line arguments and build the index."""
+    filename = None
+    index = None
+    for arg in pywikibot.handle_args(args):
+        if arg.startswith('-xml:'):
+            filename = arg[len('-xml:'):]
+        elif arg.startswith('-index:'):
+            index = arg[len('-index:'):]
+        else:
+            pywikibot.warning('Unknown argument %s' % arg)
+
+    if not filename:
+        pywikibot.error('No XML dump given, use -xml:filename')
+        return
+
+    start = time.time()
+    try:
+        page_index = xmlreader.XmlDump(filename,
+                                       index=index or True).build_index()
+    except ValueError as e:
+        pywikibot.error(e)
+        return
+    pywikibot.output('Indexed %d pages of %s in %.1f s'
+                     % (len(page_index), filename, time.time() - start))
+
+
+if __name__ == '__main__':
+    main()
@@ -6,6 +6,11 @@ Syntax: cache.py [-password] [-delete] [-c '...'] [dir ...]
 
 If no directory are specified, it will detect the API caches.
 
+Each cache directory may contain a cache store database, which holds most
+entries, and separate files for each entry written by older versions.
+Entries in the store are listed using its index; the cached response is
+only loaded if the command uses it.
+
 If no command is specified, it will print the filename of all entries.
 If only -delete is specified, it will delete all entries.
 
@@ -38,7 +43,7 @@ print("%s" % entry._uniquedescriptionstr())
     newer_than(entry, interval)
 """
 #
-# (C) Pywikibot team, 2014
+# (C) Pywikibot team, 2014-2015
 #
 # Distributed under the terms of the MIT license.
 #
@@ -52,6 +57,7 @@ import pickle
 import hashlib
 import pywikibot
 from pywikibot.data import api
+from pywikibot.data.cachestore import CacheStore
 
 from pywikibot.site import APISite, DataSite, LoginStatus  # noqa
 from pywikibot.page import User  # noqa
@@ -66,15 +72,26 @@ class CacheEntry(api.CachedRequest):
 
     """A Request cache entry."""
 
-    def __init__(self, directory, filename):
-        """Constructor."""
+    def __init__(self, directory, filename, store=None):
+        """Constructor.
+
+        @param directory: cache directory
+        @param filename: file name of the entry, which is its key if it is
+            in a store
+        @param store: store which contains the entry, None if the entry is
+            a separate file
+        @type store: L{CacheStore}
+        """
         self.directory = directory
         self.filename = filename
+        self.store = store
 
     def __str__(self):
         return self.filename
 
     def __repr__(self):
+        if self.store:
+            return '%s#%s' % (self.store.path, self.filename)
         return self._cachefile_path()
 
     def _create_file_name(self):
@@ -89,10 +106,32 @@ class CacheEntry(api.CachedRequest):
         return os.path.join(self._get_cache_dir(),
                             self._create_file_name())
 
+    def _get_data(self):
+        """Return the cached response, loading it from the store if needed."""
+        if not hasattr(self, '_loaded_data'):
+            self._loaded_data = self.store.load(self.filename)
+        return self._loaded_data
+
+    def _set_data(self, value):
+        """Set the cached response."""
+        self._loaded_data = value
+
+    _data = property(_get_data, _set_data)
+
     def _load_cache(self):
-        """Load the cache entry."""
-        with open(self._cachefile_path(), 'rb') as f:
-            self.key, self._data, self._cachetime = pickle.load(f)
+        """Load the cache entry.
+
+        For entries in a store only the index is read; the response is
+        loaded when it is accessed.
+        """
+        if self.store:
+            entry = self.store.lookup(self.filename)
+            if entry is None:
+                raise ValueError('%r not found' % self)
+            self.key, site, user, self._cachetime = entry
+        else:
+            with open(self._cachefile_path(), 'rb') as f:
+                self.key, self._data, self._cachetime = pickle.load(f)
         return True
 
     def parse_key(self):
@@ -172,7 +211,10 @@ class CacheEntry(api.CachedRequest):
 
     def _delete(self):
         """Delete the cache entry."""
-        os.remove(self._cachefile_path())
+        if self.store:
+            self.store.delete(self.filename)
+        else:
+            os.remove(self._cachefile_path())
 
 
 def process_entries(cache_path, func, use_accesstime=None):
@@ -205,6 +247,18 @@ def process_entries(cache_path, func, use_accesstime=None):
     else:
         filenames = [cache_path]
 
+    stores = set(os.path.dirname(filepath) for filepath in filenames
+                 if CacheStore.is_store(filepath))
+    filenames = [filepath for filepath in filenames
+                 if not CacheStore.is_store(filepath)]
+
+    for cache_dir in stores:
+        store = CacheStore.get(cache_dir)
+        for key, description, site, user, cachetime in store.entries():
+            entry = CacheEntry(cache_dir, key, store)
+            entry.key, entry._cachetime = description, cachetime
+            _process_entry(entry, func)
+
     for filepath in filenames:
         filename = os.path.basename(filepath)
         cache_dir = os.path.dirname(filepath)
@@ -228,23 +282,28 @@ def process_entries(cache_path, func, use_accesstime=None):
             os.utime(filepath, (stinfo.st_atime, stinfo.st_mtime))
             entry.stinfo = stinfo
 
-        try:
-            entry.parse_key()
-        except ParseError:
-            pywikibot.error(u'Problems parsing %s with key %s'
-                            % (entry.filename, entry.key))
-            pywikibot.exception()
-            continue
+        _process_entry(entry, func)
 
-        try:
-            entry._rebuild()
-        except Exception as e:
-            pywikibot.error(u'Problems loading %s with key %s, %r'
-                            % (entry.filename, entry.key, entry._parsed_key))
-            pywikibot.exception(e, tb=True)
-            continue
 
-        func(entry)
+def _process_entry(entry, func):
+    """Rebuild the request of a loaded entry and call func with it."""
+    try:
+        entry.parse_key()
+    except ParseError:
+        pywikibot.error(u'Problems parsing %s with key %s'
+                        % (entry.filename, entry.key))
+        pywikibot.exception()
+        return
+
+    try:
+        entry._rebuild()
+    except Exception as e:
+        pywikibot.error(u'Problems loading %s with key %s, %r'
+                        % (entry.filename, entry.key, entry._parsed_key))
+        pywikibot.exception(e, tb=True)
+        return
+
+    func(entry)
 
 
 def has_password(entry):
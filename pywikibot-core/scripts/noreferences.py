@@ -534,6 +534,8 @@ class NoReferencesBot(Bot):
         * Returns : The modified pagetext
 
         """
+        # the disabled parts of the text, to check many sections against
+        wikitext = textlib.WikitextIndex(oldText)
         # Is there an existing section where we can add the references tag?
         for section in i18n.translate(self.site, referencesSections):
             sectionR = re.compile(r'\r?\n=+ *%s *=+ *\r?\n' % section)
@@ -541,7 +543,7 @@ class NoReferencesBot(Bot):
             while index < len(oldText):
                 match = sectionR.search(oldText, index)
                 if match:
-                    if textlib.isDisabled(oldText, match.start()):
+                    if textlib.isDisabled(wikitext, match.start()):
                         pywikibot.output(
                             'Existing  %s section is commented out, skipping.'
                             % section)
@@ -568,7 +570,7 @@ class NoReferencesBot(Bot):
             while index < len(oldText):
                 match = sectionR.search(oldText, index)
                 if match:
-                    if textlib.isDisabled(oldText, match.start()):
+                    if textlib.isDisabled(wikitext, match.start()):
                         pywikibot.output(
                             'Existing %s section is commented out, won\'t add '
                             'the references in front of it.' % section)
@@ -191,11 +191,13 @@ class XmlDumpPageGenerator(object):
     def __init__(self, xmlFilename, xmlStart, namespaces, site=None):
         self.xmlStart = xmlStart
         self.namespaces = namespaces
-        self.skipping = bool(xmlStart)
         self.site = site or pywikibot.Site()
 
         dump = xmlreader.XmlDump(xmlFilename)
-        self.parser = dump.parse()
+        if xmlStart:
+            self.parser = dump.seek(xmlStart)
+        else:
+            self.parser = dump.parse()
 
     def __iter__(self):
         return self
@@ -206,10 +208,6 @@ class XmlDumpPageGenerator(object):
                 entry = next(self.parser)
             except StopIteration:
                 raise
-            if self.skipping:
-                if entry.title != self.xmlStart:
-                    continue
-                self.skipping = False
             page = pywikibot.Page(self.site, entry.title)
             if not self.namespaces == []:
                 if page.namespace() not in self.namespaces:
@@ -28,7 +28,9 @@ Furthermore, the following command line parameters are supported:
 
 -xmlstart         (Only works with -xml) Skip all articles in the XML dump
                   before the one specified (may also be given as
-                  -xmlstart:Article).
+                  -xmlstart:Article). If the page index of the dump has
+                  been built with build_dump_index.py, reading starts at
+                  that article.
 
 -addcat:cat_name  Adds "cat_name" category to every altered page.
 
@@ -326,7 +328,6 @@ class XmlDumpReplacePageGenerator(object):
         self.replacements = replacements
         self.exceptions = exceptions
         self.xmlStart = xmlStart
-        self.skipping = bool(xmlStart)
 
         self.excsInside = []
         if "inside-tags" in self.exceptions:
@@ -339,16 +340,16 @@ class XmlDumpReplacePageGenerator(object):
         else:
             self.site = pywikibot.Site()
         dump = xmlreader.XmlDump(self.xmlFilename)
-        self.parser = dump.parse()
+        if self.xmlStart:
+            # uses the page index of the dump if it has been built
+            self.parser = dump.seek(self.xmlStart)
+        else:
+            self.parser = dump.parse()
 
     def __iter__(self):
         """Iterator method."""
         try:
             for entry in self.parser:
-                if self.skipping:
-                    if entry.title != self.xmlStart:
-                        continue
-                    self.skipping = False
                 if not self.isTitleExcepted(entry.title) \
                         and not self.isTextExcepted(entry.text):
                     new_text = entry.text
@@ -362,10 +363,9 @@ class XmlDumpReplacePageGenerator(object):
                         yield pywikibot.Page(self.site, entry.title)
         except KeyboardInterrupt:
             try:
-                if not self.skipping:
-                    pywikibot.output(
-                        u'To resume, use "-xmlstart:%s" on the command line.'
-                        % entry.title)
+                pywikibot.output(
+                    u'To resume, use "-xmlstart:%s" on the command line.'
+                    % entry.title)
             except NameError:
                 pass
 
@@ -26,11 +26,10 @@ from __future__ import unicode_literals
 __version__ = '$Id$'
 #
 
-import os
 import pywikibot
 from pywikibot import config
 from pywikibot.data.api import CachedRequest
-from scripts.maintenance.cache import CacheEntry
+from scripts.maintenance.cache import process_entries
 
 cache = {}
 
@@ -87,18 +86,16 @@ def refresh(site, sysop=False):
 def refresh_all(sysop=False):
     """Reload watchlists for all wikis where a watchlist is already present."""
     cache_path = CachedRequest._get_cache_dir()
-    files = os.listdir(cache_path)
     seen = []
-    for filename in files:
-        entry = CacheEntry(cache_path, filename)
-        entry._load_cache()
-        entry.parse_key()
-        entry._rebuild()
+
+    def refresh_entry(entry):
         if entry.site not in seen:
-            if entry._data['watchlistraw']:
+            if entry._data.get('watchlistraw'):
                 refresh(entry.site, sysop)
                 seen.append(entry.site)
 
+    process_entries(cache_path, refresh_entry)
+
 
 def refresh_new(sysop=False):
     """Load watchlists of all wikis for accounts set in user-config.py."""
@@ -58,6 +58,9 @@ library_test_modules = [
     'xmlreader',
     'textlib',
     'http',
+    'throttle',
+    'savequeue',
+    'metrics',
     'namespace',
     'dry_api',
     'dry_site',
@@ -72,6 +75,7 @@ library_test_modules = [
     'edit_failure',
     'timestripper',
     'pagegenerators',
+    'bot',
     'wikidataquery',
     'weblib',
     'i18n',
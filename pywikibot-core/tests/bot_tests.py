@@ -0,0 +1,157 @@
+# -*- coding: utf-8  -*-
+"""Tests for the run method of the bot classes."""
+#
+# (C) Pywikibot team, 2015
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import unicode_literals
+
+__version__ = '$Id$'
+
+import threading
+import time
+
+import pywikibot
+import pywikibot.bot
+
+from tests.aspects import unittest, DefaultDrySiteTestCase
+
+
+class RecordingBot(pywikibot.bot.CurrentPageBot):
+
+    """A bot which records the treated pages."""
+
+    def __init__(self, **kwargs):
+        """Constructor."""
+        self.delay = kwargs.pop('delay', 0)
+        self.fail_on = kwargs.pop('fail_on', None)
+        super(RecordingBot, self).__init__(**kwargs)
+        self.treated = []
+        self.batches = []
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def treat_batch(self, pages):
+        self.batches.append(list(pages))
+        super(RecordingBot, self).treat_batch(pages)
+
+    def treat_page(self):
+        page = self.current_page
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.delay)
+        with self.lock:
+            self.running -= 1
+        if page == self.fail_on:
+            raise self.exception
+        # each thread keeps its page
+        assert self.current_page == page
+        self.treated.append(page)
+
+
+class BotRunTestCase(DefaultDrySiteTestCase):
+
+    """Test Bot.run with and without threads."""
+
+    def setUp(self):
+        super(BotRunTestCase, self).setUp()
+        self.pages = [pywikibot.Page(self.site, 'Page %d' % i)
+                      for i in range(10)]
+
+    def test_sequential(self):
+        """Test that pages are treated in order in the main thread."""
+        bot = RecordingBot(generator=iter(self.pages))
+        bot.run()
+        self.assertEqual(bot.treated, self.pages)
+        self.assertEqual(bot.batches, [[page] for page in self.pages])
+        self.assertEqual(bot.max_running, 1)
+        self.assertEqual(bot._treat_counter, 10)
+        self.assertEqual(bot.current_page, self.pages[-1])
+
+    def test_batches(self):
+        """Test the groups passed to treat_batch."""
+        bot = RecordingBot(generator=iter(self.pages), treat_batch_size=4)
+        bot.run()
+        self.assertEqual(bot.batches, [self.pages[:4], self.pages[4:8],
+                                       self.pages[8:]])
+        self.assertEqual(bot.treated, self.pages)
+
+    def test_concurrent(self):
+        """Test that pages are treated in threads."""
+        bot = RecordingBot(generator=iter(self.pages), treat_workers=3,
+                           delay=0.1)
+        bot.run()
+        self.assertEqual(sorted(bot.treated), sorted(self.pages))
+        self.assertEqual(bot.max_running, 3)
+        self.assertEqual(bot._treat_counter, 10)
+        self.assertEqual([len(batch) for batch in bot.batches], [3, 3, 3, 1])
+
+    def test_concurrent_quit(self):
+        """Test that quitting in a thread stops the run."""
+        bot = RecordingBot(generator=iter(self.pages), treat_workers=2,
+                           fail_on=self.pages[4])
+        bot.exception = pywikibot.bot.QuitKeyboardInterrupt()
+        bot.run()
+        self.assertNotIn(self.pages[4], bot.treated)
+        self.assertLess(bot._treat_counter, 10)
+        self.assertNotIn(self.pages[-1], bot.treated)
+
+    def test_concurrent_quit_workers(self):
+        """Test that the other threads don't save after quitting."""
+        events = []
+
+        class QuittingBot(RecordingBot):
+
+            def treat_page(bot):
+                page = bot.current_page
+                if page == self.pages[0]:
+                    events.append('quit')
+                    bot.quit()
+                time.sleep(0.2)
+                bot._save_page(page, lambda: events.append('saved'),
+                               confirmed=True)
+
+        bot = QuittingBot(generator=iter(self.pages[:2]), treat_workers=2)
+        bot.run()
+        events.append('run returned')
+        time.sleep(0.3)
+        self.assertEqual(events, ['quit', 'run returned'])
+
+    def test_interrupted_workers(self):
+        """Test that the threads stop when the calling thread is interrupted."""
+        events = []
+
+        def treat(page):
+            time.sleep(0.2)
+            bot._save_page(page, lambda: events.append('saved'),
+                           confirmed=True)
+
+        def pages():
+            yield self.pages[0]
+            yield self.pages[1]
+            # like a KeyboardInterrupt while waiting for the threads
+            raise KeyboardInterrupt
+
+        bot = RecordingBot(generator=iter([]), treat_workers=3)
+        self.assertRaises(KeyboardInterrupt, bot._treat_all, treat, pages())
+        events.append('raised')
+        time.sleep(0.3)
+        self.assertEqual(events, ['raised'])
+
+    def test_concurrent_error(self):
+        """Test that an error in a thread is raised by run."""
+        bot = RecordingBot(generator=iter(self.pages), treat_workers=2,
+                           fail_on=self.pages[4])
+        bot.exception = ValueError('treat failed')
+        self.assertRaises(ValueError, bot.run)
+        self.assertNotIn(self.pages[-1], bot.treated)
+
+
+if __name__ == '__main__':
+    try:
+        unittest.main()
+    except SystemExit:
+        pass
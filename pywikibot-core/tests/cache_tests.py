@@ -1,7 +1,7 @@
 # -*- coding: utf-8  -*-
 """API Request cache tests."""
 #
-# (C) Pywikibot team, 2012-2014
+# (C) Pywikibot team, 2012-2015
 #
 # Distributed under the terms of the MIT license.
 #
@@ -10,6 +10,12 @@ from __future__ import unicode_literals
 __version__ = '$Id$'
 #
 
+import datetime
+import os
+import shutil
+import tempfile
+
+from pywikibot.data.cachestore import CacheStore
 from pywikibot.site import BaseSite
 import scripts.maintenance.cache as cache
 
@@ -38,5 +44,62 @@ class RequestCacheTests(TestCase):
         cache.process_entries(_cache_dir, self._check_cache_entry)
 
 
+class CacheStoreTests(TestCase):
+
+    """Test the indexed cache store."""
+
+    net = False
+
+    def setUp(self):
+        super(CacheStoreTests, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.store = CacheStore(
+            os.path.join(self.directory, CacheStore.filename))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+        super(CacheStoreTests, self).tearDown()
+
+    def test_store_load(self):
+        """Test storing and loading an entry."""
+        now = datetime.datetime.now()
+        data = {'query': {'pages': {'1': {'title': 'Foo'}}}}
+        self.assertIsNone(self.store.lookup('abc'))
+        self.assertRaises(KeyError, self.store.load, 'abc')
+        self.store.store('abc', 'description', data, 'site', 'user', now)
+        self.assertEqual(self.store.lookup('abc'),
+                         ('description', 'site', 'user', now))
+        self.assertEqual(self.store.load('abc'), data)
+        self.assertEqual(len(self.store), 1)
+
+        self.store.store('abc', 'description', None)
+        self.assertIsNone(self.store.load('abc'))
+        self.assertGreaterEqual(self.store.lookup('abc')[3], now)
+        self.assertEqual(len(self.store), 1)
+
+    def test_delete_prune(self):
+        """Test deleting and pruning entries."""
+        now = datetime.datetime.now()
+        for i in range(5):
+            self.store.store('key%d' % i, 'description', i,
+                             timestamp=now - datetime.timedelta(days=i))
+        self.assertEqual([entry[0] for entry in self.store.entries()],
+                         ['key4', 'key3', 'key2', 'key1', 'key0'])
+        self.store.delete('key0')
+        self.assertIsNone(self.store.lookup('key0'))
+        self.assertEqual(
+            self.store.prune(now - datetime.timedelta(days=2, hours=1)), 2)
+        self.assertEqual(sorted(entry[0] for entry in self.store.entries()),
+                         ['key1', 'key2'])
+
+    def test_is_store(self):
+        """Test detection of the database files."""
+        self.assertTrue(CacheStore.is_store(self.store.path))
+        self.assertTrue(CacheStore.is_store(self.store.path + '-journal'))
+        self.assertFalse(CacheStore.is_store(
+            os.path.join(self.directory, 'a' * 64)))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -63,6 +63,79 @@ class TestDate(TestCase):
     net = False
 
 
+class TestAutoFormat(TestCase):
+
+    """Test cases for date.getAutoFormat."""
+
+    net = False
+
+    def test_formatted_values(self):
+        """Test that formatted values are recognized."""
+        for lang in ('en', 'fr', 'zh', 'fa'):
+            for formatname, formats in date.formats.items():
+                if lang not in formats:
+                    continue
+                predicate, start, stop = date.formatLimits[formatname]
+                for value in (start, stop - 1):
+                    title = formats[lang](value)
+                    dictName, result = date.getAutoFormat(lang, title)
+                    # formats like YearAD and Number may be equal
+                    self.assertEqual(date.formats[dictName][lang](result),
+                                     title)
+
+    def test_examples(self):
+        """Test some titles."""
+        self.assertEqual(date.getAutoFormat('en', '1984'), ('YearAD', 1984))
+        self.assertEqual(date.getAutoFormat('en', '1980s'),
+                         ('DecadeAD', 1980))
+        self.assertEqual(date.getAutoFormat('en', 'March 1984'),
+                         ('Year_March', 1984))
+        self.assertEqual(date.getAutoFormat('en', 'march 1984'),
+                         ('Year_March', 1984))
+        self.assertEqual(date.getAutoFormat('en', 'march 1984',
+                                            ignoreFirstLetterCase=False),
+                         (None, None))
+        # outside of the limits of the test above
+        self.assertEqual(date.getAutoFormat('fi', '1437000-vuosituhat'),
+                         ('MillenniumAD', 1438))
+        self.assertEqual(date.getAutoFormat('en', 'Marching 1984'),
+                         (None, None))
+        self.assertEqual(date.getAutoFormat('en', ''), (None, None))
+        self.assertEqual(date.getAutoFormat('xx', '1984'), (None, None))
+
+
+class TestFormatTable(TestCase):
+
+    """Test cases for date.FormatTable."""
+
+    net = False
+
+    def test_table(self):
+        """Test that the table returns the results of the format."""
+        for lang in ('en', 'fr', 'zh', 'fa'):
+            for formatname in ('YearAD', 'DecadeAD', 'CenturyBC',
+                               'Day_February', 'Year_May', 'MonthName'):
+                if lang not in date.formats[formatname]:
+                    continue
+                table = date.getFormatTable(formatname, lang)
+                self.assertIs(date.getFormatTable(formatname, lang), table)
+                function = date.formats[formatname][lang]
+                predicate, start, stop = date.formatLimits[formatname]
+                for value in range(start, stop):
+                    title = function(value)
+                    self.assertEqual(table(value), title)
+                    self.assertEqual(table(title), function(title))
+
+    def test_outside_limits(self):
+        """Test values and strings outside of the table."""
+        table = date.getFormatTable('YearBC', 'en')
+        self.assertEqual(table(3000), '3000 BC')
+        self.assertEqual(table('3000 BC'), 3000)
+        self.assertRaises(ValueError, table, '3000 AD')
+        self.assertRaises(ValueError, table, 5000)
+        self.assertEqual(date.formatYear('en', -3000), '3000 BC')
+
+
 class TestMonthDelta(TestCase):
 
     """Tests for adding months to a date and getting the months between two."""
@@ -12,10 +12,14 @@ __version__ = '$Id$'
 
 import os
 import datetime
+import shutil
+import tempfile
 
 import pywikibot
+from pywikibot.data import api
 from pywikibot.data.api import (
     CachedRequest,
+    LimitController,
     ParamInfo,
     Request,
     QueryGenerator,
@@ -181,6 +185,41 @@ class MockCachedRequestKeyTests(TestCase):
 
         self.assertEqual(en_user_path, ar_user_path)
 
+    def test_cache_store(self):
+        """Test writing and loading the cache using the store."""
+        directory = tempfile.mkdtemp()
+        try:
+            req = CachedRequest(expiry=1, site=self.mocksite,
+                                action='query', meta='siteinfo')
+            expreq = CachedRequest(expiry=0, site=self.mocksite,
+                                   action='query', meta='siteinfo')
+            diffreq = CachedRequest(expiry=1, site=self.mocksite,
+                                    action='query', meta='userinfo')
+            for r in (req, expreq, diffreq):
+                r._get_cache_dir = lambda: directory
+
+            data = {'query': {'general': {'case': 'first-letter'}}}
+            self.assertFalse(req._load_cache())
+            req._write_cache(data)
+            self.assertTrue(req._load_cache())
+            self.assertEqual(req._data, data)
+            self.assertIsNotNone(req._cachetime)
+            self.assertFalse(diffreq._load_cache())
+
+            store = req._cache_store()
+            description, site, user, cachetime = store.lookup(
+                req._create_file_name())
+            self.assertEqual(description, req._uniquedescriptionstr())
+            self.assertEqual(site, 'MockSite()')
+
+            store.store(req._create_file_name(), description, data,
+                        site, user, cachetime - datetime.timedelta(days=2))
+            self.assertFalse(req._load_cache())
+            self.assertFalse(expreq._load_cache())
+            store.close()
+        finally:
+            shutil.rmtree(directory)
+
 
 class DryWriteAssertTests(DefaultDrySiteTestCase):
 
@@ -246,6 +285,81 @@ class DryMimeTests(TestCase):
         self.assertNotEqual(body.find(file_content), -1)
 
 
+class DryJsonDecodeTests(TestCase):
+
+    """Test decoding API responses without a real site."""
+
+    net = False
+
+    def test_utf8(self):
+        """Test decoding an UTF-8 encoded response."""
+        data = '{"query": {"title": "\u00e9\u4e2d"}}'
+        self.assertEqual(Request._decode_json(data.encode('utf-8'), 'utf-8'),
+                         {'query': {'title': '\u00e9\u4e2d'}})
+        self.assertEqual(Request._decode_json(data.encode('utf-8'), 'UTF8'),
+                         {'query': {'title': '\u00e9\u4e2d'}})
+
+    def test_other_encoding(self):
+        """Test decoding a response which is not UTF-8 encoded."""
+        data = '{"title": "\u00e9"}'
+        self.assertEqual(
+            Request._decode_json(data.encode('latin1'), 'iso-8859-1'),
+            {'title': '\u00e9'})
+
+    def test_invalid(self):
+        """Test that a response which is not JSON raises ValueError."""
+        self.assertRaises(ValueError, Request._decode_json,
+                          b'<html></html>', 'utf-8')
+        self.assertRaises(ValueError, Request._decode_json,
+                          b'{"title": "\xff"}', 'utf-8')
+
+
+class LimitControllerTests(TestCase):
+
+    """Test adapting query limits to the response time."""
+
+    net = False
+
+    def test_adapt(self):
+        """Test growing and shrinking the limit towards the target."""
+        controller = LimitController(2)
+        self.assertEqual(controller.limit('key', 500), 500)
+        # slow responses shrink the limit by at most a half
+        self.assertEqual(controller.record('key', 500, 4.0, 500), 250)
+        self.assertEqual(controller.record('key', 250, 100.0, 500), 125)
+        self.assertEqual(controller.limit('key', 500), 125)
+        self.assertEqual(controller.limit('key', 50), 50)
+        # fast responses grow it up to the maximum
+        self.assertEqual(controller.record('key', 125, 1.0, 500), 250)
+        self.assertEqual(controller.record('key', 250, 0.1, 300), 300)
+        # a fast small request does not shrink the limit
+        self.assertEqual(controller.record('key', 10, 0.1, 300), 300)
+        self.assertEqual(controller.limit('other', 50), 50)
+
+    def test_reduce(self):
+        """Test recording a reduced limit after an invalid response."""
+        controller = LimitController(2)
+        controller.reduce('key', 100)
+        self.assertEqual(controller.limit('key', 500), 100)
+        controller.reduce('key', 200)
+        self.assertEqual(controller.limit('key', 500), 100)
+
+    def test_persistence(self):
+        """Test saving and loading learned limits."""
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, LimitController.filename)
+            controller = LimitController(2, path)
+            controller.record('key', 500, 4.0, 500)
+            controller.save()
+            self.assertEqual(LimitController(2, path).limit('key', 500), 250)
+            with open(path, 'w') as f:
+                f.write('invalid')
+            self.assertEqual(LimitController(2, path).limit('key', 500), 500)
+        finally:
+            shutil.rmtree(directory)
+
+
 class MimeTests(DefaultDrySiteTestCase):
 
     """Test MIME request handling with a real site."""
@@ -425,5 +539,76 @@ class QueryGenTests(DefaultDrySiteTestCase):
         self.assertCountEqual(qGen1.request._params.items(), qGen2.request._params.items())
 
 
+class DummyPropertyGenerator(object):
+
+    """Dummy PropertyGenerator returning pages without properties."""
+
+    queries = []
+
+    def __init__(self, prop, site, titles, **kwargs):
+        """Record the query."""
+        self.props = prop.split('|')
+        self.titles = titles.split('|')
+        self.queries.append((prop, titles, kwargs))
+
+    def __iter__(self):
+        """Yield existing pages without coordinates or page props."""
+        for pageid, title in enumerate(self.titles, 1):
+            yield {'title': title, 'pageid': pageid, 'ns': 0}
+
+
+class PropertyBatcherTests(DefaultDrySiteTestCase):
+
+    """Test PropertyBatcher and the APISite methods using it."""
+
+    def setUp(self):
+        """Replace PropertyGenerator."""
+        super(PropertyBatcherTests, self).setUp()
+        self._generator = api.PropertyGenerator
+        api.PropertyGenerator = DummyPropertyGenerator
+        DummyPropertyGenerator.queries = []
+
+    def tearDown(self):
+        """Restore PropertyGenerator."""
+        api.PropertyGenerator = self._generator
+        super(PropertyBatcherTests, self).tearDown()
+
+    def test_loadcoordinfo(self):
+        """Test that a page without coordinates is not loaded again."""
+        page = pywikibot.Page(self.get_site(), 'Foo')
+        self.get_site().loadcoordinfo(page)
+        self.assertEqual(page._coords, [])
+        self.assertEqual(page.coordinates(), [])
+        self.assertEqual(len(DummyPropertyGenerator.queries), 1)
+        prop, titles, kwargs = DummyPropertyGenerator.queries[0]
+        self.assertEqual(prop, 'coordinates')
+        self.assertEqual(titles, 'Foo')
+        self.assertEqual(kwargs['coprimary'], 'all')
+
+    def test_loadpageinfo(self):
+        """Test loadpageinfo with preload."""
+        page = pywikibot.Page(self.get_site(), 'Foo')
+        self.get_site().loadpageinfo(page, preload=True)
+        self.assertEqual(page._pageid, 1)
+        self.assertEqual(DummyPropertyGenerator.queries,
+                         [('info', 'Foo', {'inprop': 'protection|preload'})])
+
+    def test_preloadproperties(self):
+        """Test loading properties of several pages with one query."""
+        site = self.get_site()
+        pages = [pywikibot.Page(site, title) for title in ('A', 'B', 'C')]
+        loaded = list(site.preloadproperties(
+            pages, props=['pageprops', 'coordinates'], groupsize=2))
+        self.assertEqual(loaded, pages)
+        self.assertEqual([(prop, titles) for prop, titles, kwargs
+                          in DummyPropertyGenerator.queries],
+                         [('coordinates|pageprops', 'A|B'),
+                          ('coordinates|pageprops', 'C')])
+        for page in pages:
+            self.assertEqual(page.properties(), {})
+            self.assertEqual(page.coordinates(), [])
+        self.assertEqual(len(DummyPropertyGenerator.queries), 2)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -10,9 +10,16 @@ from __future__ import unicode_literals
 __version__ = '$Id$'
 #
 
+import datetime
+import shutil
+import tempfile
+
 import pywikibot
 from pywikibot.tools import deprecated
-from pywikibot.site import must_be, need_version
+from pywikibot.data import api
+from pywikibot.data.api import ParamInfo
+from pywikibot.data.snapshot import SiteSnapshot
+from pywikibot.site import must_be, need_version, Siteinfo
 from pywikibot.comms.http import user_agent
 from pywikibot.exceptions import UnknownSite
 
@@ -21,6 +28,7 @@ from tests.aspects import (
     DefaultDrySiteTestCase,
     DebugOnlyTestCase,
     DeprecationTestCase,
+    TestCase,
 )
 
 
@@ -48,6 +56,26 @@ class TestDrySite(DefaultDrySiteTestCase):
         self.assertTrue(x.logged_in(True))
         self.assertFalse(x.logged_in(False))
 
+    def test_ns_index(self):
+        """Test that ns_index finds the same namespaces as lookup_name."""
+        x = self.get_site()
+        for name in ('', 'Talk', 'talk', ':User:', 'Image', 'FILE', 'Foo',
+                     'Project talk', 'a:b:c'):
+            self.assertEqual(
+                x.ns_index(name),
+                pywikibot.site.Namespace.lookup_name(name, x.namespaces))
+        self.assertEqual(x.ns_index('Help'), 12)
+
+        namespaces = x._namespaces
+        try:
+            x._namespaces = {0: pywikibot.site.Namespace(0),
+                             12: pywikibot.site.Namespace(12, 'Help', 'Hilfe')}
+            self.assertEqual(x.ns_index('hilfe'), 12)
+            self.assertIsNone(x.ns_index('Talk'))
+        finally:
+            x._namespaces = namespaces
+        self.assertEqual(x.ns_index('Talk'), 1)
+
     def test_user_agent(self):
         x = self.get_site()
 
@@ -99,6 +127,126 @@ class TestDrySite(DefaultDrySiteTestCase):
                          user_agent(x, format_string='Foo ({script_comments})'))
 
 
+class SnapshotDummySite(object):
+
+    """Site which only has empty siteinfo and paraminfo."""
+
+    def __init__(self):
+        """Constructor."""
+        self.family = pywikibot.family.Family()
+        self.family.name = 'snapshot'
+        self.code = 'test'
+        self._siteinfo = Siteinfo(self)
+        self._paraminfo = ParamInfo(self)
+
+    def version(self):
+        """Return the MediaWiki version."""
+        return '1.25'
+
+
+class SnapshotDummyRequest(object):
+
+    """CachedRequest which returns the paraminfo of the requested modules."""
+
+    requests = []
+
+    def __init__(self, **kwargs):
+        """Constructor."""
+        self.params = kwargs
+        self.requests.append(kwargs)
+
+    def submit(self):
+        """Return a module without parameters for each requested module."""
+        modules = []
+        for path in self.params['modules']:
+            name = path.split('+')[-1]
+            modules.append({'name': name, 'path': path, 'prefix': '',
+                            'parameters': []})
+        return {'paraminfo': {'modules': modules}}
+
+
+class TestSiteSnapshot(TestCase):
+
+    """Test saving and loading site snapshots."""
+
+    net = False
+
+    def setUp(self):
+        """Create a directory for the snapshots."""
+        super(TestSiteSnapshot, self).setUp()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the snapshots."""
+        shutil.rmtree(self.directory)
+        super(TestSiteSnapshot, self).tearDown()
+
+    def test_save_load(self):
+        """Test that a loaded snapshot contains the saved data."""
+        cache_time = datetime.datetime.utcnow()
+        site = SnapshotDummySite()
+        site._siteinfo._cache['general'] = ({'lang': 'test'}, cache_time)
+        site._paraminfo._paraminfo['main'] = {'name': 'main', 'prefix': ''}
+        snapshot = SiteSnapshot(site, self.directory)
+        self.assertFalse(snapshot.load())
+        self.assertTrue(snapshot.is_stale(1))
+        snapshot.save()
+        self.assertFalse(snapshot.is_stale(1))
+
+        other = SnapshotDummySite()
+        other._siteinfo._cache['case'] = ('first-letter', cache_time)
+        other._siteinfo._cache['general'] = ({'lang': 'new'}, cache_time)
+        snapshot = SiteSnapshot(other, self.directory)
+        self.assertTrue(snapshot.load())
+        self.assertEqual(other._paraminfo._paraminfo,
+                         {'main': {'name': 'main', 'prefix': ''}})
+        # data already cached is kept
+        self.assertEqual(other._siteinfo._cache['general'][0],
+                         {'lang': 'new'})
+        self.assertEqual(other._siteinfo._cache['case'][0], 'first-letter')
+        self.assertTrue(snapshot.is_stale(datetime.timedelta(0)))
+
+    def test_fetch_after_load(self):
+        """Test fetching a module which is not in the loaded snapshot."""
+        site = SnapshotDummySite()
+        site._paraminfo._paraminfo.update({
+            'main': {'name': 'main', 'path': 'main', 'prefix': '',
+                     'parameters': [{'name': 'action',
+                                     'type': ['query', 'paraminfo']}]},
+            'paraminfo': {'name': 'paraminfo', 'path': 'paraminfo',
+                          'prefix': '',
+                          'parameters': [{'name': 'querymodules',
+                                          'type': ['allpages', 'info'],
+                                          'limit': 50}]},
+        })
+        SiteSnapshot(site, self.directory).save()
+
+        other = SnapshotDummySite()
+        self.assertTrue(SiteSnapshot(other, self.directory).load())
+        # the fetch of Request.submit for list=allpages
+        original = api.CachedRequest
+        api.CachedRequest = SnapshotDummyRequest
+        try:
+            other._paraminfo.fetch(set(['allpages']))
+        finally:
+            api.CachedRequest = original
+        self.assertEqual([request['modules']
+                          for request in SnapshotDummyRequest.requests],
+                         [['query+allpages']])
+        self.assertIn('query+allpages', other._paraminfo._paraminfo)
+        self.assertEqual(other._paraminfo.query_modules,
+                         frozenset(['allpages', 'info']))
+
+    def test_invalid(self):
+        """Test that an invalid snapshot is ignored."""
+        site = SnapshotDummySite()
+        snapshot = SiteSnapshot(site, self.directory)
+        with open(snapshot.path, 'wb') as f:
+            f.write(b'invalid')
+        self.assertFalse(snapshot.load())
+        self.assertEqual(site._siteinfo._cache, {})
+
+
 class TestMustBe(DebugOnlyTestCase):
 
     """Test cases for the must_be decorator."""
@@ -11,6 +11,7 @@ __version__ = '$Id$'
 
 import os
 import sys
+import threading
 
 import httplib2
 
@@ -295,6 +296,106 @@ class ThreadedHttpRequestQueueTestCase(TestCase):
         queue.put(None)  # Stop the http processor thread
 
 
+class ConnectionPoolSlotTestCase(TestCase):
+
+    """Tests for the per host request limit of the connection pool."""
+
+    net = False
+
+    def test_unlimited(self):
+        """Test that a pool without limit never defers requests."""
+        pool = threadedhttp.ConnectionPool()
+        for i in range(10):
+            self.assertTrue(pool.acquire_slot('host', i))
+        self.assertEqual(pool.inflight['host'], 10)
+
+    def test_deferred(self):
+        """Test that requests exceeding the limit are handed back."""
+        pool = threadedhttp.ConnectionPool(max_inflight=2)
+        self.assertTrue(pool.acquire_slot('host', 1))
+        self.assertTrue(pool.acquire_slot('host', 2))
+        self.assertFalse(pool.acquire_slot('host', 3))
+        self.assertFalse(pool.acquire_slot('host', 4))
+        self.assertTrue(pool.acquire_slot('other', 5))
+        self.assertEqual(pool.release_slot('host'), 3)
+        self.assertTrue(pool.acquire_slot('host', 3))
+        self.assertEqual(pool.release_slot('host'), 4)
+        self.assertTrue(pool.acquire_slot('host', 4))
+        for i in range(2):
+            self.assertIsNone(pool.release_slot('host'))
+        self.assertIsNone(pool.release_slot('other'))
+        self.assertNotIn('host', pool.inflight)
+        self.assertNotIn('host', pool.deferred)
+
+    def test_processor(self):
+        """Test that deferred requests are processed by the HttpProcessor."""
+        queue = Queue.Queue()
+        cookiejar = threadedhttp.LockableCookieJar()
+        connection_pool = threadedhttp.ConnectionPool(max_inflight=1)
+        statistics = threadedhttp.QueueStatistics()
+        threads = []
+        for i in range(3):
+            proc = threadedhttp.HttpProcessor(queue, cookiejar,
+                                              connection_pool, statistics)
+            proc.setDaemon(True)
+            proc.start()
+            threads.append(proc)
+        requests = [threadedhttp.HttpRequest('https://hostname.invalid/')
+                    for i in range(5)]
+        for request in requests:
+            statistics.record_enqueue(request, queue.qsize())
+            queue.put(request)
+        for request in requests:
+            self.assertIsInstance(request.exception,
+                                  httplib2.ServerNotFoundError)
+        for proc in threads:
+            queue.put(None)
+        counters = statistics.as_dict()
+        self.assertEqual(counters['enqueued'], 5)
+        self.assertEqual(counters['started'], 5)
+        self.assertGreaterEqual(counters['max_wait'], counters['mean_wait'])
+        self.assertNotIn('hostname.invalid', connection_pool.inflight)
+
+    def test_shutdown(self):
+        """Test that deferred requests are processed after a shutdown."""
+        class WaitingHttp(object):
+
+            """Http object which waits until the test continues."""
+
+            def request(self, *args, **kwargs):
+                continued.wait()
+                return ({'status': '200'}, b'')
+
+        continued = threading.Event()
+        queue = Queue.Queue()
+        connection_pool = threadedhttp.ConnectionPool(max_inflight=1)
+        threads = []
+        for i in range(2):
+            proc = threadedhttp.HttpProcessor(
+                queue, threadedhttp.LockableCookieJar(), connection_pool)
+            proc.http = WaitingHttp()
+            proc.setDaemon(True)
+            threads.append(proc)
+        requests = [threadedhttp.HttpRequest('https://hostname.invalid/')
+                    for i in range(3)]
+        # like http._flush, shut down the threads while a request is
+        # processed and the others are deferred
+        for request in requests:
+            queue.put(request)
+        for proc in threads:
+            queue.put(None)
+        for proc in threads:
+            proc.start()
+        while len(connection_pool.deferred['hostname.invalid']) < 2:
+            threads[0].join(0.01)
+        continued.set()
+        for proc in threads:
+            proc.join(10)
+            self.assertFalse(proc.isAlive())
+        for request in requests:
+            self.assertEqual(request._data, ({'status': '200'}, b''))
+
+
 class UserAgentTestCase(TestCase):
 
     """User agent formatting tests using a format string."""
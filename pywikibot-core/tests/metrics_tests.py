@@ -0,0 +1,135 @@
+# -*- coding: utf-8  -*-
+"""Tests for the metrics module."""
+#
+# (C) Pywikibot team, 2015
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import unicode_literals
+
+__version__ = '$Id$'
+
+import json
+import os
+import shutil
+import signal
+import tempfile
+import time
+
+from pywikibot import config, metrics
+
+from tests.aspects import unittest, TestCase
+
+
+class MetricsRegistryTestCase(TestCase):
+
+    """Test the counters and histograms of the registry."""
+
+    net = False
+
+    def setUp(self):
+        super(MetricsRegistryTestCase, self).setUp()
+        self.registry = metrics.MetricsRegistry()
+
+    def test_counters(self):
+        """Test counters and their rate."""
+        self.registry.increment('api.requests')
+        self.registry.increment('api.requests', 2)
+        self.registry.increment('http.bytes_sent', 100)
+        self.registry.start -= 120
+        data = self.registry.as_dict()
+        self.assertEqual(data['counters'],
+                         {'api.requests': 3, 'http.bytes_sent': 100})
+        self.assertAlmostEqual(data['per_minute']['api.requests'], 1.5, 2)
+        self.assertGreaterEqual(data['elapsed'], 120)
+
+        self.registry.reset()
+        self.assertEqual(self.registry.as_dict()['counters'], {})
+
+    def test_histogram(self):
+        """Test the buckets and summary of a histogram."""
+        for value in (0.005, 0.2, 0.2, 100):
+            self.registry.observe('bot.treat', value)
+        histogram = self.registry.as_dict()['histograms']['bot.treat']
+        self.assertEqual(histogram['count'], 4)
+        self.assertAlmostEqual(histogram['total'], 100.405)
+        self.assertEqual(histogram['max'], 100)
+        self.assertEqual(histogram['buckets']['<=0.01'], 1)
+        self.assertEqual(histogram['buckets']['<=0.25'], 2)
+        self.assertEqual(histogram['buckets']['>60'], 1)
+        self.assertEqual(histogram['buckets']['<=1'], 0)
+
+    def test_source(self):
+        """Test that statistics of sources are included."""
+        self.registry.add_source('queue', lambda: {'depth': 3})
+        self.assertEqual(self.registry.as_dict()['queue'], {'depth': 3})
+
+    def test_dump(self):
+        """Test that the snapshot is written as JSON."""
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'metrics.json')
+            self.registry.increment('page.saves')
+            self.registry.dump(filename)
+            with open(filename) as f:
+                data = json.load(f)
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(data['counters'], {'page.saves': 1})
+
+    def test_signal_handler(self):
+        """Test that the signal handler doesn't wait for the registry."""
+        if not hasattr(signal, 'SIGUSR1'):
+            raise unittest.SkipTest('SIGUSR1 is not available')
+        directory = tempfile.mkdtemp()
+        original_handler = signal.getsignal(signal.SIGUSR1)
+        original_file = config.metrics_file
+        try:
+            config.metrics_file = os.path.join(directory, 'metrics.json')
+            metrics.install_signal_handler()
+            with metrics.registry.lock:
+                os.kill(os.getpid(), signal.SIGUSR1)
+            for i in range(50):
+                if os.path.exists(config.metrics_file):
+                    break
+                time.sleep(0.1)
+            self.assertTrue(os.path.exists(config.metrics_file))
+        finally:
+            signal.signal(signal.SIGUSR1, original_handler)
+            config.metrics_file = original_file
+            time.sleep(0.1)
+            shutil.rmtree(directory)
+
+    def test_timer(self):
+        """Test that the timer adds to the global registry."""
+        before = metrics.registry.as_dict()['histograms'].get(
+            'test.timer', {'count': 0})['count']
+        with metrics.Timer('test.timer'):
+            pass
+        histogram = metrics.registry.as_dict()['histograms']['test.timer']
+        self.assertEqual(histogram['count'], before + 1)
+
+
+class SamplerTestCase(TestCase):
+
+    """Test the sampling profiler."""
+
+    net = False
+
+    def test_sampler(self):
+        """Test that the sampler finds the sleeping function."""
+        sampler = metrics.Sampler(0.001)
+        sampler.start()
+        time.sleep(0.2)
+        sampler.stop()
+        data = sampler.as_dict()
+        self.assertGreater(data['samples'], 0)
+        self.assertTrue(any('test_sampler' in name
+                            for name in data['functions']))
+
+
+if __name__ == '__main__':
+    try:
+        unittest.main()
+    except SystemExit:
+        pass
@@ -15,7 +15,9 @@ from pywikibot import config
 from pywikibot import InvalidTitle
 import pywikibot.page
 
-from tests.aspects import unittest, TestCase, DefaultSiteTestCase
+from tests.aspects import (
+    unittest, TestCase, DefaultSiteTestCase, DefaultDrySiteTestCase,
+)
 from tests.utils import allowed_failure, expected_failure_if
 
 if sys.version_info[0] > 2:
@@ -884,6 +886,42 @@ class HtmlEntity(TestCase):
         self.assertEqual(pywikibot.page.html2unicode('&#x70&#x79;'), '&#x70y')
 
 
+class TestPageHash(DefaultDrySiteTestCase):
+
+    """Test hashing of Page and PageRef objects."""
+
+    def test_page_hash(self):
+        """Test that equal pages have the same hash."""
+        site = self.get_site()
+        page = pywikibot.Page(site, 'Help:Foo bar')
+        self.assertEqual(hash(page), hash(pywikibot.Page(site, 'Help:Foo_bar')))
+        self.assertEqual(page._hash, hash(page))
+        self.assertEqual(len(set([page, pywikibot.Page(site, 'Help:Foo bar'),
+                                  pywikibot.Page(site, 'Foo bar')])), 2)
+
+    def test_copy(self):
+        """Test that a copy with a new title does not keep the hash."""
+        site = self.get_site()
+        page = pywikibot.Page(site, 'Foo')
+        hash(page)
+        moved = pywikibot.Page(page, 'Bar')
+        self.assertEqual(hash(moved), hash(pywikibot.Page(site, 'Bar')))
+        self.assertEqual(hash(pywikibot.Page(page)), hash(page))
+
+    def test_page_ref(self):
+        """Test that a PageRef is equal to its page."""
+        site = self.get_site()
+        page = pywikibot.Page(site, 'Help:Foo')
+        ref = pywikibot.page.PageRef.fromPage(page)
+        self.assertFalse(hasattr(ref, '__dict__'))
+        self.assertEqual(ref, page)
+        self.assertEqual(page, ref)
+        self.assertEqual(hash(ref), hash(page))
+        self.assertIn(page, set([ref]))
+        self.assertEqual(ref.page(), page)
+        self.assertNotEqual(pywikibot.page.PageRef(site, 'Help:Foo', 0), page)
+
+
 if __name__ == '__main__':
     try:
         unittest.main()
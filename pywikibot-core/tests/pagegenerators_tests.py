@@ -372,6 +372,20 @@ class TestPreloadingGenerator(DefaultSiteTestCase):
             count += 1
         self.assertEqual(len(links), count)
 
+    def test_prefetch(self):
+        """Test PreloadingGenerator retrieving groups in the background."""
+        mainpage = self.get_mainpage()
+        links = list(self.site.pagelinks(mainpage, total=20))
+        count = 0
+        for page in PreloadingGenerator(links, step=5, prefetch=2):
+            self.assertIsInstance(page, pywikibot.Page)
+            self.assertIsInstance(page.exists(), bool)
+            if page.exists():
+                self.assertTrue(hasattr(page, "_text"))
+                self.assertEqual(len(page._revisions), 1)
+            count += 1
+        self.assertEqual(len(links), count)
+
 
 class TestDequePreloadingGenerator(DefaultSiteTestCase):
 
@@ -0,0 +1,160 @@
+# -*- coding: utf-8  -*-
+"""Tests for the savequeue module."""
+#
+# (C) Pywikibot team, 2015
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import unicode_literals
+
+__version__ = '$Id$'
+
+import threading
+import time
+import warnings
+
+import pywikibot
+
+from pywikibot import config
+from pywikibot.savequeue import SaveExecutor, _PutQueue
+
+from tests.aspects import unittest, TestCase
+
+
+class DummyPage(object):
+
+    """A page whose saves are recorded."""
+
+    def __init__(self, site, title, log, delay=0):
+        """Constructor."""
+        self.site = site
+        self.title = title
+        self.log = log
+        self.delay = delay
+
+    def _save(self, revision):
+        time.sleep(self.delay)
+        self.log.append((self.title, revision))
+        return revision
+
+    def _fail(self):
+        raise ValueError(self.title)
+
+
+class SaveExecutorTestCase(TestCase):
+
+    """Test the lanes and futures of SaveExecutor."""
+
+    net = False
+
+    def setUp(self):
+        super(SaveExecutorTestCase, self).setUp()
+        self.executor = SaveExecutor()
+        self.log = []
+
+    def tearDown(self):
+        self.executor.shutdown()
+        self.executor.join(10)
+        super(SaveExecutorTestCase, self).tearDown()
+
+    def test_order(self):
+        """Test that the requests of a site are executed in order."""
+        pages = [DummyPage('en', title, self.log) for title in 'ABC']
+        futures = [self.executor.submit(pages[i % 3]._save, i)
+                   for i in range(30)]
+        self.assertEqual([future.result(10) for future in futures],
+                         list(range(30)))
+        self.assertEqual(self.log, [('ABC'[i % 3], i) for i in range(30)])
+        self.assertEqual(self.executor.pending(), 0)
+
+    def test_sites_in_parallel(self):
+        """Test that the lanes of the sites don't wait for each other."""
+        slow = DummyPage('en', 'Slow', self.log, delay=0.5)
+        fast = DummyPage('de', 'Fast', self.log)
+        slow_future = self.executor.submit(slow._save, 1)
+        fast_future = self.executor.submit(fast._save, 2)
+        fast_future.result(10)
+        self.assertFalse(slow_future.done())
+        self.assertEqual(self.executor.pending(), 1)
+        self.assertEqual(self.executor.pending('en'), 1)
+        self.assertEqual(self.executor.pending('de'), 0)
+        slow_future.result(10)
+        self.assertEqual(self.log, [('Fast', 2), ('Slow', 1)])
+
+    def test_exception(self):
+        """Test that exceptions are stored in the future."""
+        page = DummyPage('en', 'Failing', self.log)
+        future = self.executor.submit(page._fail)
+        self.assertIsInstance(future.exception(10), ValueError)
+        self.assertRaises(ValueError, future.result)
+        # the lane continues with the next request
+        self.assertEqual(self.executor.submit(page._save, 1).result(10), 1)
+
+    def test_callback(self):
+        """Test the callbacks of a future."""
+        page = DummyPage('en', 'Page', self.log, delay=0.2)
+        results = []
+        future = self.executor.submit(page._save, 1)
+        future.add_done_callback(lambda f: results.append(f.result()))
+        self.assertRaises(RuntimeError, future.result, 0)
+        future.result(10)
+        future.add_done_callback(lambda f: results.append(f.result()))
+        self.assertEqual(results, [1, 1])
+
+    def test_backpressure(self):
+        """Test that a full lane is reported."""
+        executor = SaveExecutor(maxsize=1)
+        event = threading.Event()
+        page = DummyPage('en', 'Page', self.log)
+        first = executor.submit(event.wait, 10)
+        second = executor.submit(event.wait, 10)
+        self.assertTrue(executor.full())
+        self.assertFalse(executor.full('en'))
+        executor.submit(page._save, 1).result(10)
+        event.set()
+        first.result(10)
+        second.result(10)
+        self.assertFalse(executor.full())
+        executor.shutdown()
+        self.assertTrue(executor.join(10))
+
+    def test_eta(self):
+        """Test the estimate from the latencies."""
+        self.assertEqual(self.executor.eta(), 0)
+        event = threading.Event()
+        page = DummyPage('en', 'Page', self.log, delay=0.2)
+        self.executor.submit(page._save, 1).result(10)
+        self.executor.submit(event.wait, 10)
+        self.executor.submit(event.wait, 10)
+        # the lane without a site has no latencies yet
+        self.assertEqual(self.executor.eta(), 2 * config.put_throttle)
+        self.assertEqual(self.executor.eta('de'), 0)
+        self.executor.submit(page._save, 2)
+        self.assertGreater(self.executor.eta('en'), 0.1)
+        event.set()
+
+    def test_put_queue(self):
+        """Test the deprecated page_put_queue interface."""
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            self.assertIsInstance(pywikibot.page_put_queue, _PutQueue)
+        self.assertEqual(len(caught), 1)
+        self.assertIn('pywikibot.async_request', str(caught[0].message))
+        queue = _PutQueue(self.executor)
+        page = DummyPage('en', 'Page', self.log, delay=0.5)
+        self.assertTrue(queue.empty())
+        queue.put((page._save, [1], {}))
+        queue.put((page._save, [2], {}))
+        queue.put((None, [], {}))
+        self.assertEqual(queue.qsize(), 2)
+        self.assertFalse(queue.full())
+        self.executor.submit(page._save, 3).result(10)
+        self.assertEqual(self.log, [('Page', 1), ('Page', 2), ('Page', 3)])
+        self.assertTrue(queue.empty())
+
+
+if __name__ == '__main__':
+    try:
+        unittest.main()
+    except SystemExit:
+        pass
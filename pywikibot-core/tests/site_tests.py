@@ -1962,6 +1962,45 @@ class TestPagePreloading(DefaultSiteTestCase):
             count += 1
         self.assertEqual(count, link_count)
 
+    def test_preload_prefetch(self):
+        """Test preloading with groups retrieved in background threads."""
+        mysite = self.get_site()
+        mainpage = self.get_mainpage()
+
+        links = list(mysite.pagelinks(mainpage, total=10))
+        if len(links) < 2:
+            raise unittest.SkipTest('insufficient links on main page')
+
+        count = 0
+        for page in mysite.preloadpages(links, groupsize=3, prefetch=2):
+            self.assertIsInstance(page, pywikibot.Page)
+            self.assertIsInstance(page.exists(), bool)
+            if page.exists():
+                self.assertTrue(hasattr(page, "_text"))
+                self.assertEqual(len(page._revisions), 1)
+            count += 1
+        self.assertEqual(count, len(links))
+
+    def test_preloadproperties(self):
+        """Test loading properties of several pages in one request."""
+        mysite = self.get_site()
+        mainpage = self.get_mainpage()
+
+        links = list(mysite.pagelinks(mainpage, total=10))
+        if len(links) < 2:
+            raise unittest.SkipTest('insufficient links on main page')
+        for page in links:
+            del page._pageid
+        pages = list(mysite.preloadproperties(
+            links + [mainpage], props=['info', 'pageprops'], groupsize=4))
+        self.assertEqual(pages, links + [mainpage])
+        for page in pages:
+            self.assertTrue(hasattr(page, '_pageid'))
+            self.assertTrue(hasattr(page, '_isredir'))
+            if page.exists():
+                self.assertTrue(hasattr(page, '_protection'))
+        self.assertTrue(mainpage.exists())
+
     def test_preload_unexpected_titles_using_pageids(self):
         """Test sending pageids with unnormalized titles, causing warnings."""
         mysite = self.get_site()
@@ -11,6 +11,7 @@ __version__ = '$Id$'
 
 import codecs
 import os
+import re
 
 import pywikibot
 import pywikibot.textlib as textlib
@@ -19,6 +20,7 @@ from pywikibot import config
 from pywikibot.tools import OrderedDict
 
 from tests.aspects import unittest, TestCase, DefaultDrySiteTestCase
+from tests.utils import DrySite
 
 files = {}
 dirname = os.path.join(os.path.dirname(__file__), "pages")
@@ -131,6 +133,47 @@ class TestFormatCategory(DefaultDrySiteTestCase):
                          textlib.categoryFormat(data, self.site))
 
 
+class TestLanguageLinks(TestCase):
+
+    """Test the language links found without creating pages."""
+
+    family = 'wikipedia'
+    code = 'de'
+
+    dry = True
+
+    def setUp(self):
+        super(TestLanguageLinks, self).setUp()
+        # create the linked sites without connecting to them
+        self.old_interface = config.site_interface
+        config.site_interface = DrySite
+        textlib._language_link_sites.clear()
+
+    def tearDown(self):
+        config.site_interface = self.old_interface
+        textlib._language_link_sites.clear()
+        super(TestLanguageLinks, self).tearDown()
+
+    def test_language_codes(self):
+        """Test that obsolete codes are mapped to the current codes."""
+        codes = textlib._language_codes(self.site.family)
+        self.assertEqual(codes['en'], 'en')
+        self.assertEqual(codes['dk'], 'da')
+        self.assertNotIn('aa', codes)
+        self.assertNotIn('category', codes)
+
+    def test_iter_language_links(self):
+        """Test the sites and titles of the links."""
+        text = ('[[en:Foo|bar]] [[DK:Bar]] [[aa:Baz]] [[Kategorie:Foo]]'
+                '<!-- [[fr:Baz]] -->[[en:Other]]\n[[fr : Baz]]')
+        links = list(textlib.iter_language_links(text, self.site))
+        self.assertEqual([(site.code, title) for site, title in links],
+                         [('en', 'Foo'), ('da', 'Bar'), ('en', 'Other'),
+                          ('fr', ' Baz')])
+        self.assertIs(links[0][0], links[2][0])
+        self.assertEqual(links[0][0], pywikibot.Site('en', 'wikipedia'))
+
+
 class TestCategoryRearrangement(DefaultDrySiteTestCase):
 
     """
@@ -272,11 +315,275 @@ class TestTemplateParams(TestCase):
 
         self.assertEqual(func('{{a|b=<!--{{{1}}}-->}}'), [('a', OrderedDict((('b', ''), )))])
 
+    def test_extract_templates_params_scan(self):
+        func = textlib.extract_templates_and_params_scan
+        self._extract_templates_params(func)
+
+        self.assertEqual(func('{{a|}}'), [('a', OrderedDict((('1', ''), )))])
+        self.assertEqual(func('{{a}}{{a}}'), [('a', OrderedDict()), ('a', OrderedDict())])
+        self.assertEqual(func('{{msg:a}}'), [('a', OrderedDict())])
+        self.assertEqual(func('{{#if:a|b}}'), [])
+
+        self.assertEqual(func('{{a| b=c}}'), [('a', OrderedDict((('b', 'c'), )))])
+        self.assertEqual(func('{{a|b =c}}'), [('a', OrderedDict((('b', 'c'), )))])
+        self.assertEqual(func('{{a|b= c}}'), [('a', OrderedDict((('b', 'c'), )))])
+        self.assertEqual(func('{{a|b=c }}'), [('a', OrderedDict((('b', 'c'), )))])
+
+        self.assertEqual(func('{{a| b={{c}}}}'), [('c', OrderedDict()), ('a', OrderedDict((('b', '{{c}}'), )))])
+        self.assertEqual(func('{{a|b={{c}}}}'), [('c', OrderedDict()), ('a', OrderedDict((('b', '{{c}}'), )))])
+        self.assertEqual(func('{{a|b= {{c}}}}'), [('c', OrderedDict()), ('a', OrderedDict((('b', '{{c}}'), )))])
+        self.assertEqual(func('{{a|b={{c}} }}'), [('c', OrderedDict()), ('a', OrderedDict((('b', '{{c}}'), )))])
+        self.assertEqual(func('{{a|{{b|{{c}}}}}} {{d}}'),
+                         [('c', OrderedDict()), ('d', OrderedDict()),
+                          ('b', OrderedDict((('1', '{{c}}'), ))),
+                          ('a', OrderedDict((('1', '{{b|{{c}}}}'), )))])
+
+        self.assertEqual(func('{{a|b=<!--{{{1}}}-->}}'), [('a', OrderedDict((('b', ''), )))])
+        self.assertEqual(func('{{a|b=<!--}}-->c}}'), [('a', OrderedDict((('b', 'c'), )))])
+        self.assertEqual(func('{{a|[[b|c]]|d=[[e|f=g]]}}'),
+                         [('a', OrderedDict((('1', '[[b|c]]'), ('d', '[[e|f=g]]'))))])
+        self.assertEqual(func('{{a|<math>b|c=d</math>}}'),
+                         [('a', OrderedDict((('1', '<math>b|c=d</math>'), )))])
+        self.assertEqual(func('{{a|b={{{1|c}}}|d}}'),
+                         [('a', OrderedDict((('b', '{{{1|c}}}'), ('1', 'd'))))])
+        self.assertEqual(func('{{{{{a}}}|b}}'), [])
+        self.assertEqual(func('{{ {{a}} }}'), [('a', OrderedDict())])
+        self.assertEqual(func('{{a|{{b}}'), [('b', OrderedDict())])
+        self.assertEqual(func('{{a|[[b}}'), [('a', OrderedDict((('1', '[[b'), )))])
+
+    def test_extract_templates_with_spans(self):
+        text = 'x{{a|b={{c}}}} {{d|[[e|f]]}}y'
+        templates = textlib.extract_templates_with_spans(text)
+        self.assertEqual([(name, start, end)
+                          for name, params, start, end in templates],
+                         [('a', 1, 14), ('c', 7, 12), ('d', 15, 28)])
+        self.assertEqual(text[1:14], '{{a|b={{c}}}}')
+        self.assertEqual(templates[2][1], OrderedDict((('1', '[[e|f]]'), )))
+
+    def test_extract_templates_params_batch(self):
+        texts = ['{{a|b}}', '', '{{c|{{d}}}}']
+        expected = [textlib.extract_templates_and_params(text)
+                    for text in texts]
+        self.assertEqual(textlib.extract_templates_and_params_batch(texts),
+                         expected)
+        self.assertEqual(
+            textlib.extract_templates_and_params_batch(iter(texts), 2),
+            expected)
+
     def test_extract_templates_params(self):
         self._extract_templates_params(
             textlib.extract_templates_and_params)
 
 
+class TestReplaceExcept(DefaultDrySiteTestCase):
+
+    """Test replaceExcept."""
+
+    dry = True
+
+    def _replace(self, text, old, new, exceptions=[], **kwargs):
+        return textlib.replaceExcept(text, old, new, exceptions,
+                                     site=self.site, **kwargs)
+
+    def test_no_exceptions(self):
+        self.assertEqual(self._replace('abcabc', 'b', 'x'), 'axcaxc')
+        self.assertEqual(self._replace('abc', 'd', 'x'), 'abc')
+        self.assertEqual(self._replace('ABab', 'b', 'x',
+                                       caseInsensitive=True), 'Axax')
+
+    def test_exceptions(self):
+        self.assertEqual(self._replace('a<!--a-->a', 'a', 'b', ['comment']),
+                         'b<!--a-->b')
+        self.assertEqual(self._replace('a<nowiki>a</nowiki>a', 'a', 'b',
+                                       ['nowiki']),
+                         'b<nowiki>a</nowiki>b')
+        self.assertEqual(self._replace('a{{a|a}}a', 'a', 'b', ['template']),
+                         'b{{a|a}}b')
+        self.assertEqual(self._replace('a<source a></source>a', 'a', 'b',
+                                       ['source']),
+                         'b<source a></source>b')
+        self.assertEqual(self._replace('a<syntaxhighlight a>a'
+                                       '</syntaxhighlight>', 'a', 'b',
+                                       ['source']),
+                         'b<syntaxhighlight a>a</syntaxhighlight>')
+        self.assertEqual(self._replace('axbxa', 'x', 'y',
+                                       [re.compile('b.*')]),
+                         'aybxa')
+
+    def test_group_references(self):
+        self.assertEqual(self._replace('a1b2', r'(\w)(\d)', r'\2\1'),
+                         '1a2b')
+        self.assertEqual(self._replace('a1b2', r'(?P<l>\w)(?P<d>\d)',
+                                       r'\g<d>\g<l>'),
+                         '1a2b')
+        self.assertEqual(self._replace('ab', r'(a)(x)?', r'\1\2-'), 'a-b')
+        self.assertEqual(self._replace('ab', 'a', r'x\ny'), 'x\nyb')
+        self.assertEqual(self._replace('ab', 'a',
+                                       lambda match: match.group() * 2),
+                         'aab')
+
+    def test_marker(self):
+        self.assertEqual(self._replace('abab', 'a', 'x', marker='@'),
+                         'xbx@b')
+        self.assertEqual(self._replace('bb', 'a', 'x', marker='@'), 'bb@')
+
+    def test_replaced_context(self):
+        """Test regexes which depend on the replaced text before them."""
+        self.assertEqual(self._replace('baa', '(?<=b)a', 'b'), 'bbb')
+        self.assertEqual(self._replace('aaa', r'\Ba', 'b'), 'abb')
+        self.assertEqual(self._replace('ab ab', r'\bb', 'x'), 'ab ab')
+        self.assertEqual(self._replace('x a', '[xa]', '\n', ['startspace']),
+                         '\n a')
+        self.assertEqual(self._replace('a\na', r'(?m)^a', 'b'), 'b\nb')
+        self.assertEqual(self._replace('xa', 'x', '', marker='@'), '@a')
+        self.assertEqual(self._replace('xa', 'x', '',
+                                       [re.compile('^a')]), 'a')
+        self.assertEqual(self._replace('xaxa', 'x', '',
+                                       [re.compile('(?<=a)a')]), 'aa')
+
+    def test_overlap(self):
+        self.assertEqual(self._replace('aaa', 'aa', 'b'), 'ba')
+        self.assertEqual(self._replace('aaaa', 'aa', 'a', allowoverlap=True),
+                         'aa')
+        self.assertEqual(self._replace('1223', r'2(?=3)|2(?=2)', '3',
+                                       allowoverlap=True), '1333')
+
+    def test_context_width(self):
+        self.assertEqual(textlib._context_width(re.compile('a+b')), 0)
+        self.assertEqual(textlib._context_width(re.compile(r'(a|\bc)')), 1)
+        self.assertEqual(textlib._context_width(re.compile('(?m)^a')), 1)
+        self.assertEqual(textlib._context_width(re.compile('a(?<=bca)')), 3)
+        self.assertEqual(textlib._context_width(re.compile('a(?!b)')), 0)
+
+
+class TestWikitextIndex(DefaultDrySiteTestCase):
+
+    """Test the WikitextIndex and the functions accepting it."""
+
+    dry = True
+
+    text = ('== A ==\n{{a|[[b|c]]}}<!-- [[Category:Hidden]] -->\n'
+            '[[Category:Foo|bar]] [[de:Seite]]\n'
+            '<nowiki>[[fr:Seite]]</nowiki>\n=== B ===\n[[en:Page]]')
+
+    def setUp(self):
+        super(TestWikitextIndex, self).setUp()
+        self.index = textlib.WikitextIndex(self.text)
+
+    def test_disabled_parts(self):
+        """Test the recorded disabled parts."""
+        self.assertEqual(self.index.disabled_parts(),
+                         [(21, 49, 'comments'), (84, 113, 'nowiki')])
+        self.assertEqual(self.index.disabled_parts(['nowiki']),
+                         [(84, 113, 'nowiki')])
+        self.assertEqual(textlib.removeDisabledParts(self.index),
+                         textlib.removeDisabledParts(self.text))
+        self.assertEqual(textlib.removeDisabledParts(self.index,
+                                                     include=['nowiki']),
+                         textlib.removeDisabledParts(self.text,
+                                                     include=['nowiki']))
+        self.assertFalse(textlib.isDisabled(self.index, 20))
+        self.assertTrue(textlib.isDisabled(self.index, 30))
+        self.assertTrue(textlib.isDisabled(self.index, 46))
+        # like for the text, the closing tag itself is not disabled
+        self.assertFalse(textlib.isDisabled(self.index, 48))
+        self.assertFalse(textlib.isDisabled(self.index, 49))
+        self.assertFalse(textlib.isDisabled(self.index, 30, ['nowiki']))
+
+    def test_is_disabled(self):
+        """Test that isDisabled returns the same for the text and index."""
+        texts = [self.text,
+                 'abc <!-- x --> def <nowiki>[[a]]</nowiki> ghi',
+                 '<!-- a <nowiki> b --> c </nowiki> <!-- d --> -->',
+                 '<pre>a</pre b</pre>@<!-- c -->@']
+        for text in texts:
+            index = textlib.WikitextIndex(text)
+            for tags in (['*'], ['nowiki'], ['comments', 'pre']):
+                for i in range(len(text) + 1):
+                    self.assertEqual(textlib.isDisabled(index, i, tags),
+                                     textlib.isDisabled(text, i, tags),
+                                     '%r %d %r' % (text, i, tags))
+
+    def test_structure(self):
+        """Test the recorded links, templates and sections."""
+        self.assertEqual(self.index.links,
+                         [(12, 19, 'b', 'c'),
+                          (50, 70, 'Category:Foo', 'bar'),
+                          (71, 83, 'de:Seite', None),
+                          (124, 135, 'en:Page', None)])
+        self.assertEqual(self.index.category_links(self.site),
+                         [(50, 70, 'Category', 'Foo|bar')])
+        self.assertEqual(self.index.category_links(self.site, ['comments']),
+                         [(26, 45, 'Category', 'Hidden'),
+                          (50, 70, 'Category', 'Foo|bar')])
+        self.assertEqual(self.index.language_links(),
+                         [(50, 70, 'Category', 'Foo|bar'),
+                          (71, 83, 'de', 'Seite'),
+                          (124, 135, 'en', 'Page')])
+        self.assertEqual(self.index.templates,
+                         [('a', {'1': '[[b|c]]'}, 8, 21)])
+        self.assertEqual(self.index.sections,
+                         [(0, 7, 2, 'A'), (114, 123, 3, 'B')])
+        # a disabled part within a link
+        index = textlib.WikitextIndex('a [[Category:B<!-- c -->|d]] e')
+        self.assertEqual(index.category_links(self.site),
+                         [(2, 28, 'Category', 'B|d')])
+
+    def test_parity(self):
+        """Test that the functions return the same for the text and index."""
+        texts = [self.text,
+                 '[[Category:A<!-- ]] -->|b]] <nowiki>[[Category:C]]'
+                 '</nowiki>]] {{d|{{e}}|f=<!-- g -->h}}',
+                 '<includeonly>[[de:A]]</includeonly>[[fr:<pre>B</pre>]]'
+                 '[[en:C]] <source>[[Category:D]]</source>']
+        for text in texts:
+            index = textlib.WikitextIndex(text)
+            for include in ([], ['nowiki'], ['includeonly', 'source']):
+                self.assertEqual(
+                    textlib.getCategoryLinks(index, self.site, include),
+                    textlib.getCategoryLinks(text, self.site, include))
+            for template_subpage in (False, True):
+                tags = textlib._language_link_tags(template_subpage)
+                self.assertEqual(
+                    [link[2:] for link
+                     in index.language_links(template_subpage)],
+                    textlib._INTERWIKI_REGEX.findall(
+                        textlib.removeDisabledParts(text, tags)))
+            self.assertEqual(textlib.extract_templates_and_params(index),
+                             textlib.extract_templates_and_params(text))
+            self.assertEqual(textlib.extract_templates_with_spans(index),
+                             textlib.extract_templates_with_spans(text))
+
+    def test_page(self):
+        """Test that a page keeps the index of its text."""
+        page = pywikibot.Page(self.site, 'Foo')
+        page.text = self.text
+        index = page._text_index()
+        self.assertIs(page._text_index(), index)
+        page.text = '[[Category:Bar]]'
+        self.assertIsNot(page._text_index(), index)
+        self.assertEqual(page._text_index().text, page.text)
+
+    def test_cached_functions(self):
+        """Test that the functions return the same result from the cache."""
+        categories = textlib.getCategoryLinks(self.index, self.site)
+        self.assertEqual(categories,
+                         textlib.getCategoryLinks(self.text, self.site))
+        cached = len(self.index._cache)
+        categories.append(None)
+        self.assertEqual(textlib.getCategoryLinks(self.index, self.site),
+                         categories[:-1])
+        self.assertEqual(len(self.index._cache), cached)
+        templates = textlib.extract_templates_and_params(self.index)
+        self.assertEqual(templates,
+                         textlib.extract_templates_and_params(self.text))
+        templates[0][1]['1'] = 'changed'
+        self.assertEqual(textlib.extract_templates_and_params(self.index),
+                         textlib.extract_templates_and_params(self.text))
+        self.assertEqual(textlib.removeCategoryLinks(self.index, self.site),
+                         textlib.removeCategoryLinks(self.text, self.site))
+
+
 class TestLocalDigits(TestCase):
 
     """Test to verify that local digits are correctly being handled."""
@@ -10,7 +10,12 @@ from __future__ import unicode_literals
 __version__ = '$Id$'
 
 from tests.aspects import unittest, TestCase
-from pywikibot.tools import ThreadedGenerator, intersect_generators
+import threading
+import time
+
+from pywikibot.tools import (
+    ThreadedGenerator, intersect_generators, prefetch_map,
+)
 
 
 class BasicThreadedGeneratorTestCase(TestCase):
@@ -37,6 +42,77 @@ class BasicThreadedGeneratorTestCase(TestCase):
         self.assertEqual(list(thd_gen), list(iterable))
 
 
+class PrefetchMapTestCase(TestCase):
+
+    """prefetch_map test cases."""
+
+    net = False
+
+    def test_ordered(self):
+        """Test that results are returned in order of the items."""
+        def slow_first(x):
+            if x == 0:
+                time.sleep(0.2)
+            return x * 2
+
+        self.assertEqual(list(prefetch_map(slow_first, range(6), 3)),
+                         [0, 2, 4, 6, 8, 10])
+
+    def test_unordered(self):
+        """Test that all results are returned when unordered."""
+        def slow_first(x):
+            if x == 0:
+                time.sleep(0.2)
+            return x * 2
+
+        result = list(prefetch_map(slow_first, range(6), 3, ordered=False))
+        self.assertCountEqual(result, [0, 2, 4, 6, 8, 10])
+        self.assertNotEqual(result[0], 0)
+
+    def test_bounded(self):
+        """Test that no more than size items are processed ahead."""
+        lock = threading.Lock()
+        active = [0, 0]
+
+        def work(x):
+            with lock:
+                active[0] += 1
+                active[1] = max(active)
+            time.sleep(0.01)
+            with lock:
+                active[0] -= 1
+            return x
+
+        self.assertEqual(list(prefetch_map(work, range(20), 3)),
+                         list(range(20)))
+        self.assertLessEqual(active[1], 3)
+
+    def test_overlap(self):
+        """Test that items are processed while a result is handled."""
+        started = [threading.Event() for i in range(3)]
+
+        def work(x):
+            started[x].set()
+            return x
+
+        for x in prefetch_map(work, range(3), 1):
+            if x < 2:
+                started[x + 1].wait(5)
+                self.assertTrue(started[x + 1].is_set())
+
+    def test_exception(self):
+        """Test that an exception in the function is raised again."""
+        def fail(x):
+            if x == 2:
+                raise ValueError(x)
+            return x
+
+        gen = prefetch_map(fail, range(5), 2)
+        self.assertEqual(next(gen), 0)
+        self.assertEqual(next(gen), 1)
+        self.assertRaises(ValueError, next, gen)
+
+
 class GeneratorIntersectTestCase(TestCase):
 
     """Base class for intersect_generators test cases."""
@@ -0,0 +1,143 @@
+# -*- coding: utf-8  -*-
+"""Tests for the throttle module."""
+#
+# (C) Pywikibot team, 2015
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import unicode_literals
+
+__version__ = '$Id$'
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from pywikibot import throttle
+
+from tests.aspects import unittest, TestCase
+
+
+class ThrottleStoreTestCase(TestCase):
+
+    """Test the store shared by the processes."""
+
+    net = False
+
+    def setUp(self):
+        super(ThrottleStoreTestCase, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.store = throttle.ThrottleStore(
+            os.path.join(self.directory, throttle.ThrottleStore.filename))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+        super(ThrottleStoreTestCase, self).tearDown()
+
+    def test_register(self):
+        self.assertEqual(self.store.register(0, 'wikipedia:en', 1200, 1000),
+                         1)
+        self.assertEqual(self.store.register(0, 'wikipedia:en', 1200, 1000),
+                         2)
+        self.assertEqual(self.store.register(0, 'wikipedia:de', 1200, 1000),
+                         3)
+        self.assertEqual(self.store.register(1, 'wikipedia:en', 1200, 1500),
+                         1)
+        self.assertEqual(self.store.count('wikipedia:en', 900), 2)
+        self.assertEqual(self.store.count('wikipedia:en', 1100), 1)
+        self.assertEqual(self.store.count('wikipedia:fr', 900), 0)
+
+        self.store.drop(1)
+        self.assertEqual(self.store.count('wikipedia:en', 900), 1)
+
+        # the ids of expired processes are free again
+        self.assertEqual(self.store.register(0, 'wikipedia:en', 1200, 3000),
+                         1)
+        self.assertEqual(self.store.count('wikipedia:en', 0), 1)
+
+    def test_take_token(self):
+        site = 'wikipedia:en'
+        # two requests may be made at once
+        self.assertEqual(self.store.take_token(site, 2, now=1000), 0)
+        self.assertEqual(self.store.take_token(site, 2, now=1000), 0)
+        # then one every half second
+        self.assertEqual(self.store.take_token(site, 2, now=1000), 0.5)
+        self.assertEqual(self.store.take_token(site, 2, now=1000), 1)
+        self.assertEqual(self.store.take_token(site, 2, now=1001), 0.5)
+        # the bucket is refilled up to its size
+        self.assertEqual(self.store.take_token(site, 2, now=1100), 0)
+        self.assertEqual(self.store.take_token(site, 2, now=1100), 0)
+        self.assertEqual(self.store.take_token(site, 2, now=1100), 0.5)
+        # sites have their own bucket
+        self.assertEqual(self.store.take_token('wikipedia:de', 0.5,
+                                               now=1100), 0)
+        self.assertEqual(self.store.take_token('wikipedia:de', 0.5,
+                                               now=1100), 2)
+
+
+class ThrottleTestCase(TestCase):
+
+    """Test the scheduling of reads and writes."""
+
+    net = False
+
+    def setUp(self):
+        super(ThrottleTestCase, self).setUp()
+        self.throttle = throttle.Throttle('test:test', mindelay=0,
+                                          maxdelay=10, multiplydelay=False)
+        self.throttle.setDelays(0, writedelay=2)
+
+    def test_reserve(self):
+        self.assertAlmostEqual(self.throttle.reserve(write=True), 2,
+                               delta=0.1)
+        # reads don't wait for writes
+        self.assertEqual(self.throttle.reserve(), 0)
+        # the next write is scheduled after the reserved one
+        self.assertAlmostEqual(self.throttle.reserve(write=True), 4,
+                               delta=0.1)
+
+    def test_lag(self):
+        self.throttle.lag_until = time.time() + 3
+        self.assertAlmostEqual(self.throttle.waittime(), 3, delta=0.1)
+        self.assertAlmostEqual(self.throttle.waittime(write=True), 3,
+                               delta=0.1)
+
+    def test_read_while_writing(self):
+        """Test that a thread waiting to write doesn't block reads."""
+        self.throttle.setDelays(0, writedelay=0.5)
+        writer = threading.Thread(target=self.throttle,
+                                  kwargs={'write': True})
+        writer.start()
+        time.sleep(0.1)
+        started = time.time()
+        self.throttle()
+        self.assertLess(time.time() - started, 0.2)
+        writer.join()
+
+    @unittest.skipIf(sys.version_info < (3, 4), 'asyncio is not available')
+    def test_wait_async(self):
+        import asyncio
+        self.throttle.setDelays(0, writedelay=0.2)
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            started = time.time()
+            loop.run_until_complete(asyncio.gather(
+                self.throttle.wait_async(write=True),
+                self.throttle.wait_async(write=True),
+                self.throttle.wait_async()))
+            self.assertAlmostEqual(time.time() - started, 0.4, delta=0.1)
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+
+if __name__ == '__main__':
+    try:
+        unittest.main()
+    except SystemExit:
+        pass
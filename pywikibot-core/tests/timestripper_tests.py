@@ -126,6 +126,58 @@ class TestTimeStripperWithDigitsAsMonths(TestCase):
                          )
 
 
+class TestTimeStripText(TestCase):
+
+    """Test finding the latest timestamp of a text."""
+
+    family = 'wikipedia'
+    code = 'en'
+
+    dry = True
+
+    def setUp(self):
+        """Set up the month names and time zone of the dry site."""
+        super(TestTimeStripText, self).setUp()
+        site = self.get_site()
+        site._months_names = [(name, name[:3]) for name in (
+            'January', 'February', 'March', 'April', 'May', 'June', 'July',
+            'August', 'September', 'October', 'November', 'December')]
+        site._siteinfo._cache['timeoffset'] = (0, True)
+        site._siteinfo._cache['timezone'] = ('UTC', True)
+        self.ts = TimeStripper(site)
+        self.tzone = tzoneFixedOffset(0, 'UTC')
+
+    def test_timestrip_text(self):
+        """Test that the latest timestamp of the lines is found."""
+        text = ('Question. [[User:A|A]] 19:48, 7 February 2010 (UTC)\n'
+                ':Answer. [[User:B|B]] 08:15, 12 March 2011 (UTC)\n'
+                '::Quote of 23:59, 31 December 2012 (UTC) from '
+                'http://example.org/2013/01/01/00:00_(UTC)\n'
+                ':::Thanks. 10:00, 9 February 2010 (UTC) '
+                '11:00, 9 February 2010 (UTC)\n'
+                'No timestamp (UTC)\n')
+        self.assertEqual(
+            self.ts.timestrip_text(text),
+            datetime.datetime(2012, 12, 31, 23, 59, tzinfo=self.tzone))
+        self.assertEqual(
+            self.ts.timestrip_text(text),
+            max(filter(None, map(self.ts.timestripper, text.split('\n')))))
+        self.assertIsNone(self.ts.timestrip_text('No timestamp (UTC)'))
+        self.assertIsNone(self.ts.timestrip_text(''))
+
+    def test_disabled_parts(self):
+        """Test that comments spanning several lines are ignored."""
+        text = ('A 19:48, 7 February 2010 (UTC)\n<!--\n'
+                'B 19:48, 7 February 2015 (UTC)\n-->')
+        self.assertEqual(
+            self.ts.timestrip_text(text),
+            datetime.datetime(2010, 2, 7, 19, 48, tzinfo=self.tzone))
+
+    def test_fix_digits(self):
+        """Test that non-latin digits are converted."""
+        self.assertEqual(self.ts.fix_digits('۱۹:۴۸ ٣ ௧'), '19:48 3 ௧')
+
+
 class TestTimeStripperLanguage(TestCase):
 
     """Test cases for English language."""
@@ -283,6 +283,40 @@ class TestTerminalOutput(UITestCase):
         self.assertEqual(newstdout.getvalue(), '')
         self.assertEqual(newstderr.getvalue(), '')
 
+    def test_output_args(self):
+        pywikibot.output('%s: %d', args=('output', 1))
+        pywikibot.warning('%(text)s', args={'text': 'warning'})
+        self.assertEqual(newstdout.getvalue(), '')
+        self.assertEqual(newstderr.getvalue(),
+                         'output: 1\nWARNING: warning\n')
+
+    def test_debug_args(self):
+        class Formatted(object):
+
+            """Count how often the object is formatted."""
+
+            count = 0
+
+            def __str__(self):
+                Formatted.count += 1
+                return 'formatted'
+
+            __unicode__ = __str__
+
+        debug_logger = logging.getLogger('pywiki.test.lazy')
+        self.assertFalse(pywikibot.debug_enabled('test.lazy'))
+        pywikibot.debug('debug %s', 'test.lazy', args=(Formatted(),))
+        self.assertEqual(Formatted.count, 0)
+
+        debug_logger.setLevel(DEBUG)
+        try:
+            self.assertTrue(pywikibot.debug_enabled('test.lazy'))
+            pywikibot.debug('debug %s', 'test.lazy', args=(Formatted(),))
+        finally:
+            debug_logger.setLevel(logging.NOTSET)
+        self.assertEqual(Formatted.count, 1)
+        self.assertEqual(newstdout.getvalue(), '')
+
     def test_exception(self):
         class TestException(Exception):
 
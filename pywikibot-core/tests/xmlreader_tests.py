@@ -10,6 +10,10 @@ from __future__ import unicode_literals
 __version__ = '$Id$'
 
 import os.path
+import pickle
+import re
+import shutil
+import tempfile
 
 from pywikibot import xmlreader
 
@@ -31,6 +35,11 @@ class XmlReaderTestCase(TestCase):
                                      **kwargs).parse()]
         return entries
 
+    @staticmethod
+    def _fields(entry):
+        return dict((name.lstrip('_'), getattr(entry, name.lstrip('_')))
+                    for name in xmlreader.XmlEntry.__slots__)
+
 
 class ExportDotThreeTestCase(XmlReaderTestCase):
 
@@ -65,7 +74,7 @@ class ExportDotThreeTestCase(XmlReaderTestCase):
     def _compare(self, previous, variant, all_revisions):
         entries = self._get_entries('article-pyrus' + variant,
                                     allrevisions=all_revisions)
-        result = [entry.__dict__ for entry in entries]
+        result = [self._fields(entry) for entry in entries]
         if previous:
             self.assertEqual(previous, result)
         return result
@@ -123,6 +132,220 @@ class ExportDotTenTestCase(XmlReaderTestCase):
                          u'moved [[Çullu, Agdam]] to [[Çullu, Quzanlı]]:&#32;dab')
 
 
+class MultistreamTestCase(XmlReaderTestCase):
+
+    """Multistream bz2 dump tests."""
+
+    dump = 'pair-0.10-multistream.xml.bz2'
+
+    def _compare_streams(self, all_revisions, **kwargs):
+        expected = [self._fields(entry) for entry in
+                    self._get_entries('pair-0.10.xml',
+                                      allrevisions=all_revisions)]
+        entries = self._get_entries(self.dump, allrevisions=all_revisions,
+                                    index=True, **kwargs)
+        return expected, [self._fields(entry) for entry in entries]
+
+    def test_offsets(self):
+        index = os.path.join(_xml_data_dir,
+                             'pair-0.10-multistream-index.txt.bz2')
+        self.assertEqual(xmlreader.read_multistream_offsets(index),
+                         [590, 1213])
+
+    def test_index(self):
+        dump = xmlreader.XmlDump(os.path.join(_xml_data_dir, self.dump),
+                                 index=True)
+        self.assertEqual(dump.index,
+                         os.path.join(_xml_data_dir,
+                                      'pair-0.10-multistream-index.txt.bz2'))
+        # the processes are only used if the index is given
+        dump = xmlreader.XmlDump(os.path.join(_xml_data_dir, self.dump))
+        self.assertIsNone(dump.index)
+        dump = xmlreader.XmlDump(os.path.join(_xml_data_dir,
+                                              'pair-0.10.xml'), index=True)
+        self.assertIsNone(dump.index)
+
+    def test_single_process(self):
+        expected, result = self._compare_streams(True, processes=1)
+        self.assertEqual(expected, result)
+        expected, result = self._compare_streams(False, processes=1)
+        self.assertEqual(expected, result)
+
+    def test_processes(self):
+        expected, result = self._compare_streams(True, processes=2)
+        self.assertEqual(expected, result)
+        expected, result = self._compare_streams(False, processes=2)
+        self.assertEqual(expected, result)
+
+    def test_unordered(self):
+        expected, result = self._compare_streams(False, processes=2,
+                                                 ordered=False)
+        self.assertEqual(len(expected), len(result))
+        for entry in expected:
+            self.assertIn(entry, result)
+
+    def test_close(self):
+        """Test that the processes stop when the generator is closed."""
+        dump = xmlreader.XmlDump(os.path.join(_xml_data_dir, self.dump),
+                                 allrevisions=True, index=True, processes=2)
+        entries = dump.parse()
+        self.assertEqual(next(entries).title, 'Çullu, Agdam')
+        entries.close()
+
+
+class PageIndexTestCase(XmlReaderTestCase):
+
+    """Page index tests."""
+
+    def setUp(self):
+        super(PageIndexTestCase, self).setUp()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super(PageIndexTestCase, self).tearDown()
+
+    def _get_dump(self, *filenames, **kwargs):
+        for filename in filenames:
+            shutil.copy(os.path.join(_xml_data_dir, filename), self.directory)
+        dump = xmlreader.XmlDump(os.path.join(self.directory, filenames[0]),
+                                 **kwargs)
+        dump.build_index()
+        return dump
+
+    def _test_dump(self, dump):
+        self.assertEqual(len(dump.page_index), 2)
+        entries = list(dump.seek('Talk:Çullu, Agdam'))
+        self.assertEqual(len(entries), 2)
+        self.assertTrue(all(entry.title == 'Talk:Çullu, Agdam'
+                            for entry in entries))
+        self.assertEqual(entries[1].text, '{{DisambigProject}}')
+        entries = list(dump.seek(19252820, 19252824))
+        self.assertEqual([entry.revisionid for entry in entries],
+                         ['237382899', '237383099'])
+        self.assertEqual(dump.get(19252824).title, 'Talk:Çullu, Agdam')
+        self.assertRaises(KeyError, dump.get, 'Missing')
+
+    def test_uncompressed(self):
+        dump = self._get_dump('pair-0.10.xml', allrevisions=True)
+        self.assertEqual(
+            dump.page_index.lookup('Talk:Çullu, Agdam'),
+            (3960, 'Talk:Çullu, Agdam', 1, 19252824))
+        self._test_dump(dump)
+        # the index is found by a new dump object
+        dump = xmlreader.XmlDump(dump.filename)
+        self.assertEqual(len(dump.page_index), 2)
+        self.assertEqual(dump.get('Çullu, Agdam').revisionid, '237382899')
+
+    def test_multistream(self):
+        dump = self._get_dump('pair-0.10-multistream.xml.bz2',
+                              'pair-0.10-multistream-index.txt.bz2',
+                              allrevisions=True, index=True, processes=1)
+        self.assertEqual(dump.page_index.lookup(19252824),
+                         (1213, 'Talk:Çullu, Agdam', 1, 19252824))
+        self._test_dump(dump)
+        # without the index of the streams, they are read in this process
+        self._test_dump(xmlreader.XmlDump(dump.filename, allrevisions=True))
+
+    def test_multistream_lookup(self):
+        """Test that lookups neither use processes nor the last filter."""
+        dump = self._get_dump('pair-0.10-multistream.xml.bz2',
+                              'pair-0.10-multistream-index.txt.bz2',
+                              allrevisions=True, index=True, processes=2,
+                              ordered=False)
+        self.assertEqual(set(entry.ns for entry in
+                             dump.parse(namespaces=[0])), set(['0']))
+
+        def pool(processes):
+            raise AssertionError('A lookup started a pool of processes')
+
+        original = xmlreader.multiprocessing.Pool
+        xmlreader.multiprocessing.Pool = pool
+        try:
+            self._test_dump(dump)
+        finally:
+            xmlreader.multiprocessing.Pool = original
+
+    def test_seek_unordered(self):
+        """Test seek without page index on a dump parsed unordered."""
+        dump = xmlreader.XmlDump(
+            os.path.join(_xml_data_dir, 'pair-0.10-multistream.xml.bz2'),
+            allrevisions=True, index=True, processes=2, ordered=False)
+        list(dump.parse(namespaces=[0]))
+        self.assertIsNone(dump.page_index)
+        self.assertEqual([entry.revisionid for entry
+                          in dump.seek(19252820, 19252824)],
+                         ['237382899', '237383099'])
+        self.assertEqual(len(list(dump.seek('Talk:Çullu, Agdam'))), 2)
+
+    def test_compressed(self):
+        dump = xmlreader.XmlDump(os.path.join(_xml_data_dir,
+                                              'article-pyrus.xml.bz2'))
+        self.assertRaises(ValueError, dump.build_index)
+
+    def test_seek_without_index(self):
+        dump = xmlreader.XmlDump(os.path.join(_xml_data_dir,
+                                              'pair-0.10.xml'))
+        self.assertIsNone(dump.page_index)
+        self.assertEqual(dump.get('Talk:Çullu, Agdam').id, '19252824')
+        self.assertEqual(list(dump.seek('Missing')), [])
+
+
+class XmlEntryTestCase(XmlReaderTestCase):
+
+    """XmlEntry and parse filter tests."""
+
+    def _parse(self, filename, **kwargs):
+        dump = xmlreader.XmlDump(os.path.join(_xml_data_dir, filename),
+                                 allrevisions=True)
+        return [(entry.title, entry.revisionid)
+                for entry in dump.parse(**kwargs)]
+
+    def test_lazy_text(self):
+        entry = xmlreader.XmlEntry('Çullu', '0', '1', 'Çullu'.encode('utf-8'),
+                                   'user', False, None, None, None, '2',
+                                   None, False)
+        self.assertEqual(entry._text, b'\xc3\x87ullu')
+        self.assertEqual(entry.text, 'Çullu')
+        self.assertEqual(entry._text, 'Çullu')
+        self.assertFalse(hasattr(entry, '__dict__'))
+
+    def test_pickle(self):
+        entry = self._get_entries('pair-0.10.xml')[0]
+        copy = pickle.loads(pickle.dumps(entry, 2))
+        self.assertIsInstance(copy._text, bytes)
+        self.assertEqual(self._fields(entry), self._fields(copy))
+
+    def test_namespaces(self):
+        self.assertEqual(self._parse('pair-0.10.xml', namespaces=[1]),
+                         [('Talk:Çullu, Agdam', '237382916'),
+                          ('Talk:Çullu, Agdam', '237383127')])
+        self.assertEqual(self._parse('pair-0.10.xml', namespaces=['0', 1]),
+                         self._parse('pair-0.10.xml'))
+        self.assertEqual(self._parse('pair-0.10.xml', namespaces=[2]), [])
+
+    def test_redirect(self):
+        self.assertEqual(self._parse('article-pyrus.xml', redirect=True),
+                         self._parse('article-pyrus.xml'))
+        self.assertEqual(self._parse('article-pyrus.xml', redirect=False), [])
+        self.assertEqual(len(self._parse('pair-0.10.xml', redirect=False)), 4)
+
+    def test_title(self):
+        self.assertEqual(self._parse('pair-0.10.xml', title='^Talk:'),
+                         self._parse('pair-0.10.xml', namespaces=[1]))
+        self.assertEqual(self._parse('pair-0.10.xml',
+                                     title=re.compile('agdam', re.I)),
+                         self._parse('pair-0.10.xml'))
+
+    def test_length(self):
+        self.assertEqual(self._parse('pair-0.10.xml', maxlength=19),
+                         [('Talk:Çullu, Agdam', '237383127')])
+        self.assertEqual(self._parse('pair-0.10.xml', minlength=20,
+                                     maxlength=40),
+                         [('Çullu, Agdam', '237382899'),
+                          ('Talk:Çullu, Agdam', '237382916')])
+
+
 if __name__ == '__main__':
     try:
         unittest.main()